@@ -12,35 +12,45 @@ startup_progress.show_step("Importing python modules")
 import asyncio
 import traceback
 from services.ChatFetch.Chatfetch import ChatFetch
-from services.Input.Input import VoiceInput
-from services.Input.VisionInput import VisionInput
-from services.TTS.TTS import TTS
-from services.Memory.Memory import Memory
 from services.Memory.HistoryStore import HistoryStore
 from services.Character.characterManager import CharacterManager
+from services.Pipeline.ConversationPipeline import ConversationPipeline
+from services.Input.ScreenCapture import (ScreenCapture, ScreenStream, validate_frame_options, MEDIA_TYPES,
+                                          DEFAULT_FORMAT, DEFAULT_MAX_DIMENSION, DEFAULT_QUALITY)
 from services.lib.LAV_logger import logger
 from services.lib.port_forward import create_proxy_middleware
 from services.lib.process_manager import process_manager
+from services.lib.inference_executor import inference_executor
+from services.lib.asset_cache import AssetCache
+from services.lib.broadcast_hub import broadcast_hub, AUDIO_CHANNEL, STREAM_CHAT_CHANNEL
+from services.lib.scheduler import request_scheduler, Ticket, LLM_RESOURCE, TTS_RESOURCE
+from services.lib.client_sessions import client_sessions, ClientSession, CLIENT_ID_HEADER, CLIENT_ID_PARAM
+from services.lib.upload_manager import upload_manager, UploadError
+from services.lib.download_manager import download_manager, COMPLETED
+from services.lib.metrics import metrics
+from services.lib.tracing import tracer, create_turn_middleware
+from services.lib.service_registry import service_registry, ERROR
+from services.lib.settings_engine import SettingsEngine, SettingsTask
 import os
-import aiofiles
-import aiohttp
-from fastapi import FastAPI, Request, Response, WebSocket, HTTPException, File, UploadFile, Form
+from fastapi import FastAPI, Request, Response, WebSocket, HTTPException
+from starlette.requests import HTTPConnection
 from fastapi.responses import StreamingResponse, FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.background import BackgroundTask
 import uvicorn
-from services.LLM.LLM import LLM
 from pydantic import BaseModel
 from datetime import datetime
-import json
-from typing import Any, Dict, List
+import base64
+import tempfile
+import shutil
+import zipfile
+from urllib.parse import urlparse, unquote
+from typing import Any, Dict, List, Optional
 import mss
 import traceback
 import threading
 import queue
 
-# Download progress tracking
-download_progress = {}
-
 # Show import completion immediately after imports
 import_time = time.time() - start_time
 startup_progress.complete_step(f"Imports completed in {import_time:.2f}s")
@@ -48,21 +58,22 @@ startup_progress.complete_step(f"Imports completed in {import_time:.2f}s")
 # Initialize RVC server
 rvc_server_port = 8001  # Different port from main server
 
-# Start RVC server during initialization
+# RVC server is started by the startup graph once the app is serving
 rvc_dir = os.path.join(os.path.dirname(__file__), "plugins", "rvc")
 rvc_runtime_python = os.path.join(rvc_dir, "runtime", "python.exe")
 rvc_server_script = os.path.join(rvc_dir, "rvc_server.py")
 
-success, message = process_manager.start_server_process(
-    name="RVC",
-    python_path=rvc_runtime_python,
-    script_path=rvc_server_script,
-    port=rvc_server_port,
-    cwd=rvc_dir
-)
+def start_rvc_server():
+    success, message = process_manager.start_server_process(
+        name="RVC",
+        python_path=rvc_runtime_python,
+        script_path=rvc_server_script,
+        port=rvc_server_port,
+        cwd=rvc_dir
+    )
 
-if not success:
-    logger.error(f"Failed to start RVC server: {message}")
+    if not success:
+        raise RuntimeError(f"Failed to start RVC server: {message}")
 
 app = FastAPI()
 static_files_path = os.path.abspath("../frontend/dist")
@@ -70,22 +81,60 @@ app.mount("/assets", StaticFiles(directory="../frontend/dist/assets"), name="ass
 app.mount("/resource", StaticFiles(directory="../frontend/dist/resource"), name="resource")
 
 # Initialize Services
+# Model-backed services are registered as lazy handles; their modules are only
+# imported and their models only loaded on first use or by the background warm-up.
 start_time = time.time()
-startup_progress.show_step("Loading AI Services")
-voice_input:VoiceInput = VoiceInput()
-llm:LLM = LLM()
-memory:Memory = Memory()
+startup_progress.show_step("Registering AI Services")
+
+def create_voice_input():
+    from services.Input.Input import VoiceInput
+    return VoiceInput()
+
+def create_vision_input():
+    from services.Input.VisionInput import VisionInput
+    return VisionInput()
+
+def create_llm():
+    from services.LLM.LLM import LLM
+    return LLM()
+
+def create_memory():
+    from services.Memory.Memory import Memory
+    return Memory()
+
+def create_tts():
+    from services.TTS.TTS import TTS
+    return TTS()
+
+def warm_up_llm(llm_instance):
+    # Loads the configured model in the background, the first request waits for it instead of loading it
+    llm_instance.preload()
+
+def warm_up_tts(tts_instance):
+    # Reduces first request latency
+    tts_instance.synthesize("Hi")
+
+# Services warmed in the background after the server starts listening,
+# overridable with the "services.warmup" setting
+DEFAULT_WARMUP_SERVICES = ["llm", "memory", "tts"]
+# Seconds an endpoint waits for a cold service before answering with a "warming" status,
+# overridable with the "services.wait_timeout" setting
+DEFAULT_SERVICE_WAIT_TIMEOUT = 60
+
+voice_input = service_registry.register("voice_input", create_voice_input)
+vision_input = service_registry.register("vision_input", create_vision_input)
+llm = service_registry.register("llm", create_llm, warmup=warm_up_llm)
+memory = service_registry.register("memory", create_memory)
+tts = service_registry.register("tts", create_tts, warmup=warm_up_tts)
 history_store:HistoryStore = HistoryStore()
-tts:TTS = TTS()
-vision_input:VisionInput = VisionInput()
 character_manager:CharacterManager = CharacterManager()
-startup_progress.complete_step(f"AI Services loaded in {time.time() - start_time:.2f}s")
-
-clients = set()
+conversation_pipeline:ConversationPipeline = ConversationPipeline(llm, tts, memory, request_scheduler)
+screen_capture:ScreenCapture = ScreenCapture()
+screen_stream:ScreenStream = ScreenStream(screen_capture, vision_input)
+startup_progress.complete_step(f"AI Services registered in {time.time() - start_time:.2f}s")
 
 # Initialize ChatFetch service
 chat_fetch = ChatFetch()
-chat_clients = set()
 
 # *******************************
 # WebUI
@@ -95,41 +144,150 @@ chat_clients = set()
 async def serve_webui():
     return FileResponse("../frontend/dist/index.html")
 
+# *******************************
+# Services
+# *******************************
+
+async def wait_for_service(name: str):
+    """Wait for a lazily loaded service, returns a 503 response if it is not ready in time"""
+    timeout = settings_manager.settings.get("services.wait_timeout", DEFAULT_SERVICE_WAIT_TIMEOUT)
+    if await service_registry.wait_ready(name, timeout):
+        return None
+
+    status = service_registry[name].status()
+    if status["state"] == ERROR:
+        return JSONResponse(status_code=503, content={"status": "error", "service": name, "error": status["error"]})
+    return JSONResponse(status_code=503, content={"status": "warming", "service": name})
+
+def get_client_session(connection: HTTPConnection) -> ClientSession:
+    """Get the session of the client making a request, from the X-Client-ID header or client_id query parameter"""
+    client_id = connection.headers.get(CLIENT_ID_HEADER) or connection.query_params.get(CLIENT_ID_PARAM)
+    host = connection.client.host if connection.client else ""
+    return client_sessions.get_or_create(client_id, host)
+
+# Seconds between checks for a client that disconnected while its request was queued
+DISCONNECT_POLL_INTERVAL = 0.5
+# Status returned to a client that disconnected while queued, nginx's "client closed request"
+CLIENT_CLOSED_REQUEST = 499
+
+async def acquire_for_request(request: Request, resource: str, session: ClientSession) -> Optional[Ticket]:
+    """
+    Wait for a slot of a shared model on behalf of an HTTP request.
+
+    Returns:
+        The granted ticket, None if the client disconnected while its request was queued
+    """
+    acquire = asyncio.create_task(request_scheduler.acquire(resource, session.id, session.priority))
+    while True:
+        done, _ = await asyncio.wait({acquire}, timeout=DISCONNECT_POLL_INTERVAL)
+        if done:
+            return acquire.result()
+        if await request.is_disconnected():
+            break
+    # Leaving the queue lets the requests behind it move up
+    acquire.cancel()
+    try:
+        (await acquire).release()
+    except asyncio.CancelledError:
+        pass
+    logger.info(f"Client of session {session.id} disconnected while queued for {resource}")
+    return None
+
+def client_closed_response():
+    return JSONResponse(status_code=CLIENT_CLOSED_REQUEST, content={"error": "Client disconnected while queued"})
+
+# Machine readable startup timeline, written once all startup steps have finished
+STARTUP_TIMELINE_FILE = "startup_timeline.json"
+
+@app.on_event("startup")
+async def run_startup_graph():
+    # Independent steps (RVC spawn, LLM service, Qdrant open, GPT-SoVITS load) run concurrently,
+    # the configured GGUF starts loading in the background as soon as the LLM service exists
+    startup_progress.add_step("rvc", start_rvc_server, description="Starting RVC server")
+    warmup_services = settings_manager.settings.get("services.warmup", DEFAULT_WARMUP_SERVICES)
+    for name in warmup_services:
+        if name not in service_registry:
+            logger.warning(f"Unknown service in warm-up list: {name}")
+            continue
+        startup_progress.add_step(name, service_registry[name].get, description=f"Loading {name} service")
+    if "llm" in warmup_services:
+        startup_progress.add_step("llm_warmup", llm.run_warmup, depends_on=["llm"], description="Preloading LLM model")
+    if "tts" in warmup_services:
+        startup_progress.add_step("tts_warmup", tts.run_warmup, depends_on=["tts"], description="Warming up TTS")
+    startup_progress.run_graph_in_background(timeline_path=STARTUP_TIMELINE_FILE)
+
+@app.get("/api/startup/timeline")
+async def get_startup_timeline():
+    return JSONResponse(content=startup_progress.timeline())
+
+@app.get("/api/metrics")
+async def get_metrics():
+    # Prometheus text exposition format
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/traces")
+async def get_traces(format: str = "chrome"):
+    """Export all recorded turns, as Chrome trace JSON (default) or OTLP JSON with format=otlp"""
+    if format == "otlp":
+        return JSONResponse(content=tracer.otlp_trace())
+    return JSONResponse(content=tracer.chrome_trace())
+
+@app.get("/api/traces/turns")
+async def get_traced_turns():
+    return JSONResponse(content={"turns": tracer.turns()})
+
+@app.get("/api/traces/{turn_id}")
+async def get_turn_trace(turn_id: str, format: str = "chrome"):
+    if not tracer.has_turn(turn_id):
+        return JSONResponse(status_code=404, content={"error": "Turn not found"})
+    if format == "otlp":
+        return JSONResponse(content=tracer.otlp_trace([turn_id]))
+    return JSONResponse(content=tracer.chrome_trace([turn_id]))
+
+@app.get("/api/services/status")
+async def get_services_status():
+    return JSONResponse(content={"services": service_registry.status()})
+
+@app.post("/api/services/{name}/warm")
+async def warm_service(name: str):
+    if name not in service_registry:
+        return JSONResponse(status_code=404, content={"error": "Service not found"})
+    service_registry[name].warm()
+    return JSONResponse(content=service_registry[name].status())
+
 # *******************************
 # Input
 # *******************************
 
 @app.post("/api/record/start")
 async def start_recording():
-    asyncio.create_task(voice_input.start_streaming(clients))
+    not_ready = await wait_for_service("voice_input")
+    if not_ready:
+        return not_ready
+
+    asyncio.create_task(voice_input.start_streaming())
     return Response(status_code=200)
 
 @app.post("/api/record/stop")
 async def stop_recording():
-    voice_input.stop_streaming()
+    # Nothing can be recording before VoiceInput is built, don't load Whisper just to stop it
+    if voice_input.is_ready():
+        voice_input.stop_streaming()
     return Response(status_code=200)
 
 @app.websocket("/ws/audio")
 async def websocket_audio(websocket: WebSocket):
-    await websocket.accept()
-    clients.add(websocket)
-    try:
-        while True:
-            await websocket.receive_text()
-    except Exception:
-        pass
-    finally:
-        clients.remove(websocket)
-        try:
-            await websocket.close()
-        except RuntimeError:
-            pass  # Already closed
+    await broadcast_hub.serve(websocket, AUDIO_CHANNEL)
 
 @app.get("/api/monitors")
 async def get_monitor_info():
     """
     Get information about available monitors.
     """
+    not_ready = await wait_for_service("vision_input")
+    if not_ready:
+        return not_ready
+
     try:
         monitors = vision_input.get_monitors()
         logger.info(f"Monitors Server: {monitors}")
@@ -168,33 +326,89 @@ async def process_screenshot_async(monitor_index: int, ocr_scale_factor: float,
     """
     Async wrapper for screenshot processing to avoid blocking the event loop.
     """
-    import asyncio
-    loop = asyncio.get_event_loop()
-    
-    # Run the synchronous screenshot processing in a thread pool
-    result = await loop.run_in_executor(
-        None,
-        lambda: vision_input.process_screen(
-            monitor_index=monitor_index,
-            save_screenshot=False,
-            confidence_threshold=0.5,
-            ocr_scale_factor=ocr_scale_factor,
-            skip_ocr=skip_ocr
-        )
+    # Run the synchronous screenshot processing on the vision worker
+    result = await inference_executor.run(
+        vision_input.process_screen,
+        monitor_index=monitor_index,
+        save_screenshot=False,
+        confidence_threshold=0.5,
+        ocr_scale_factor=ocr_scale_factor,
+        skip_ocr=skip_ocr,
+        pool="vision"
     )
     
     return result
 
+@app.get("/api/screenshot/image")
+async def get_screenshot_image(request: Request, monitor_index: int = 1, max_dimension: int = DEFAULT_MAX_DIMENSION,
+                               quality: int = DEFAULT_QUALITY, format: str = DEFAULT_FORMAT):
+    """
+    Capture a screenshot and return it as a binary image, without OCR or caption.
+
+    The ETag is the content hash of the frame and its encoding options, a request with a
+    matching If-None-Match header gets a 304 without an image when neither changed.
+
+    Args:
+        monitor_index: Index of the monitor to capture
+        max_dimension: Maximum width or height of the image, 0 keeps the original size
+        quality: Encoder quality for JPEG and WebP (1-100)
+        format: "jpeg", "webp" or "png"
+    """
+    error = validate_frame_options(format, max_dimension, quality)
+    if error:
+        return JSONResponse(status_code=400, content={"error": error})
+
+    last_hash = request.headers.get("if-none-match", "").strip('"') or None
+    try:
+        frame = await inference_executor.run(
+            screen_capture.grab_frame, monitor_index, max_dimension, format, quality, last_hash, pool="capture")
+    except Exception as e:
+        logger.error(f"Error capturing screenshot: {e}", exc_info=True)
+        return JSONResponse(status_code=500, content={"error": f"Failed to capture screenshot: {str(e)}"})
+
+    headers = {"ETag": f'"{frame.hash}"', "Cache-Control": "no-cache"}
+    if not frame.changed:
+        return Response(status_code=304, headers=headers)
+    return Response(content=frame.data, media_type=frame.media_type,
+                    headers={**headers, "X-Frame-Width": str(frame.width), "X-Frame-Height": str(frame.height)})
+
+@app.websocket("/ws/screenshot")
+async def websocket_screenshot(websocket: WebSocket):
+    """Screen frames at a target FPS, see ScreenStream.serve for the protocol"""
+    await websocket.accept()
+    try:
+        await screen_stream.serve(websocket)
+    finally:
+        try:
+            await websocket.close()
+        except RuntimeError:
+            pass  # Already closed
+
 @app.get("/api/screenshot")
-async def get_screenshot(monitor_index: int = 1, ocr_scale_factor: float = 0.5, skip_ocr: bool = False):
+async def get_screenshot(monitor_index: int = 1, ocr_scale_factor: float = 0.5, skip_ocr: bool = False,
+                         max_dimension: int = 0, quality: int = DEFAULT_QUALITY, format: str = "png"):
     """
     Capture a screenshot and return the image, caption, and extracted text.
+
+    Prefer /api/screenshot/image or /ws/screenshot for the image alone, this
+    endpoint base64 encodes it into JSON.
     
     Args:
         monitor_index: Index of the monitor to capture
         ocr_scale_factor: Factor to scale down image for OCR processing (0.1 to 1.0)
         skip_ocr: Whether to skip OCR processing and only generate caption
+        max_dimension: Maximum width or height of the returned image, 0 keeps the original size
+        quality: Encoder quality for JPEG and WebP (1-100)
+        format: "png" (default), "jpeg" or "webp"
     """
+    error = validate_frame_options(format, max_dimension, quality)
+    if error:
+        return JSONResponse(status_code=400, content={"error": error})
+
+    not_ready = await wait_for_service("vision_input")
+    if not_ready:
+        return not_ready
+
     try:
         logger.info(f"Screenshot request for monitor index: {monitor_index}, scale factor: {ocr_scale_factor}, skip OCR: {skip_ocr}")
         
@@ -215,13 +429,11 @@ async def get_screenshot(monitor_index: int = 1, ocr_scale_factor: float = 0.5,
                 content={"error": "Failed to capture screenshot"}
             )
         
-        # Convert screenshot to base64 for JSON response
-        import io
-        import base64
-        img_byte_arr = io.BytesIO()
-        result['screenshot'].save(img_byte_arr, format='PNG')
-        img_byte_arr.seek(0)
-        image_base64 = base64.b64encode(img_byte_arr.getvalue()).decode('utf-8')
+        # Convert screenshot to base64 for JSON response, encoded off the event loop
+        image_bytes = await inference_executor.run(
+            lambda: screen_capture.encode(screen_capture.resize(result['screenshot'], max_dimension), format, quality),
+            pool="capture")
+        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
         
         # Extract all detected text
         detected_text = vision_input.get_detected_text(result['ocr_results'])
@@ -245,6 +457,7 @@ async def get_screenshot(monitor_index: int = 1, ocr_scale_factor: float = 0.5,
             content={
                 "success": True,
                 "image": image_base64,
+                "media_type": MEDIA_TYPES[format],
                 "caption": result['caption'] or "",
                 "extracted_text": detected_text,
                 "ocr_count": len(result['ocr_results']),
@@ -266,23 +479,11 @@ async def get_screenshot(monitor_index: int = 1, ocr_scale_factor: float = 0.5,
 
 @app.websocket("/ws/streamChat")
 async def websocket_chat(websocket: WebSocket):
-    await websocket.accept()
-    chat_clients.add(websocket)
-    try:
-        while True:
-            await websocket.receive_text()
-    except Exception:
-        pass
-    finally:
-        chat_clients.remove(websocket)
-        try:
-            await websocket.close()
-        except RuntimeError:
-            pass 
+    await broadcast_hub.serve(websocket, STREAM_CHAT_CHANNEL)
 
 @app.post("/api/streamChat/yt/start")
 async def start_fetch_youtube():
-    asyncio.create_task(chat_fetch.start_fetching(chat_clients))
+    asyncio.create_task(chat_fetch.start_fetching())
     return JSONResponse(status_code=200, content={"message": "Chat fetch started"})
 
 @app.post("/api/streamChat/yt/stop")
@@ -291,6 +492,62 @@ async def stop_fetch_youtube():
     return JSONResponse(status_code=200, content={"message": "Chat fetch stopped"})
 
 
+# *******************************
+# Client Sessions
+# *******************************
+
+class UpdateClientSessionRequest(BaseModel):
+    voice: str | None = None
+    sampling_params: Dict[str, Any] | None = None
+
+@app.post("/api/client/session")
+async def create_client_session(request: Request):
+    """Start or resume the session of a client, the returned ID is sent back as X-Client-ID"""
+    return JSONResponse(content=get_client_session(request).to_dict())
+
+@app.get("/api/client/sessions")
+async def get_client_sessions():
+    return JSONResponse(content={"sessions": client_sessions.all()})
+
+@app.post("/api/client/session/update")
+async def update_client_session(request: UpdateClientSessionRequest, fastapi_request: Request):
+    session = get_client_session(fastapi_request)
+
+    sampling_params = None
+    if request.sampling_params is not None:
+        try:
+            sampling_params = {name: LLM_SAMPLING_PARAMS[name](value) for name, value in request.sampling_params.items()}
+        except KeyError as e:
+            return JSONResponse(status_code=400, content={"error": f"Unknown sampling parameter: {e.args[0]}"})
+        except (ValueError, TypeError) as e:
+            return JSONResponse(status_code=400, content={"error": f"Invalid sampling parameter: {e}"})
+
+    if request.voice is not None:
+        not_ready = await wait_for_service("tts")
+        if not_ready:
+            return not_ready
+        voices = await inference_executor.run(tts.get_available_voices)
+        if request.voice not in voices:
+            return JSONResponse(status_code=400, content={"error": f"Voice '{request.voice}' not found"})
+
+    client_sessions.update(session.id, voice=request.voice, sampling_params=sampling_params)
+    return JSONResponse(content=session.to_dict())
+
+@app.delete("/api/client/session")
+async def end_client_session(request: Request):
+    client_id = request.headers.get(CLIENT_ID_HEADER) or request.query_params.get(CLIENT_ID_PARAM)
+    if not client_id or not client_sessions.end(client_id):
+        return JSONResponse(status_code=404, content={"error": "Client session not found"})
+    return JSONResponse(content={"message": "Client session ended"})
+
+@app.get("/api/client/queue")
+async def get_client_queue(request: Request):
+    """Running and waiting model requests of the calling client, with their queue positions"""
+    session = get_client_session(request)
+    return JSONResponse(content={"session_id": session.id, "queue": request_scheduler.status(session.id)})
+
+client_sessions.add_end_listener(request_scheduler.forget)
+
 # *******************************
 # LLM
 # *******************************
@@ -307,64 +564,133 @@ class CompleteResponseRequest(BaseModel):
 
 @app.post("/api/completion")
 async def get_completion(request: LLMRequest, fastapi_request: Request):
+    not_ready = await wait_for_service("llm")
+    if not_ready:
+        return not_ready
+
+    session = get_client_session(fastapi_request)
+    # Held until the stream ends, other clients queue fairly behind it
+    ticket = await acquire_for_request(fastapi_request, LLM_RESOURCE, session)
+    if ticket is None:
+        return client_closed_response()
     try:
-        response = llm.get_completion(request.text, request.history, request.systemPrompt, request.screenshot)
+        response = await inference_executor.run(
+            llm.get_completion, request.text, request.history, request.systemPrompt, request.screenshot,
+            session.sampling_params, session.id, pool="llm")
         if response is None:
+            ticket.release()
             return {"error": "No response from LLM service"}
         
         async def stream_response():
             try:
-                # Wrap the generator in an asynchronous generator
-                async for chunk in async_generator_wrapper(response):
+                # Generation runs on the LLM worker thread, tokens arrive through a bounded queue
+                async for chunk in inference_executor.stream(response, pool="llm"):
                     # Check if the client has disconnected
                     if await fastapi_request.is_disconnected():
                         logger.info("Client disconnected, stopping response stream.")
                         break
                     yield chunk
             finally:
-                pass
-                # llm.unload_model()  # Ensure the model is unloaded when the stream ends or is interrupted
+                ticket.release()
 
-        return StreamingResponse(stream_response(), media_type="text/plain")
+        # The background task also releases the slot if the stream never started
+        return StreamingResponse(stream_response(), media_type="text/plain", background=BackgroundTask(ticket.release))
     except Exception as e:
+        ticket.release()
         logger.error(f"Error during completion: {e}", exc_info=True)
         return {"error": "Internal server error"}
 
 @app.post("/api/completion/complete")
 async def complete_current_response(request: CompleteResponseRequest, fastapi_request: Request):
+    not_ready = await wait_for_service("llm")
+    if not_ready:
+        return not_ready
+
+    session = get_client_session(fastapi_request)
+    ticket = await acquire_for_request(fastapi_request, LLM_RESOURCE, session)
+    if ticket is None:
+        return client_closed_response()
     try:
-        if not llm.llm:
-            llm.load_model(llm.current_model_data)
-            
-        response = llm.complete_current_response(request.history, request.systemPrompt)
+        response = await inference_executor.run(
+            llm.complete_current_response, request.history, request.systemPrompt, session.sampling_params, session.id,
+            pool="llm")
         if response is None:
+            ticket.release()
             return {"error": "No response from LLM service"}
         
         async def stream_response():
             try:
-                async for chunk in async_generator_wrapper(response):
+                async for chunk in inference_executor.stream(response, pool="llm"):
                     if await fastapi_request.is_disconnected():
                         logger.info("Client disconnected, stopping response stream.")
                         break
                     yield chunk
             finally:
-                pass
+                ticket.release()
 
-        return StreamingResponse(stream_response(), media_type="text/plain")
+        return StreamingResponse(stream_response(), media_type="text/plain", background=BackgroundTask(ticket.release))
     except Exception as e:
+        ticket.release()
         logger.error(f"Error during completion: {e}", exc_info=True)
         return {"error": "Internal server error"}
 
-# Utility function to wrap a regular generator as an async generator
-async def async_generator_wrapper(generator):
-    for item in generator:
-        yield item
-
 @app.get("/api/llm/models")
 async def get_llm_models():
+    not_ready = await wait_for_service("llm")
+    if not_ready:
+        return not_ready
+
     llm._load_available_models()
     return JSONResponse(content={"models": llm.all_model_data, "currentModel": llm.current_model_data})
 
+@app.get("/api/llm/residency")
+async def get_llm_residency():
+    """Loaded and loading models with their idle time, plus the idle timeout and memory budget"""
+    not_ready = await wait_for_service("llm")
+    if not_ready:
+        return not_ready
+
+    return JSONResponse(content=llm.residency.status())
+
+@app.get("/api/llm/speculative")
+async def get_llm_speculative_stats():
+    """Speculative decoding draft acceptance rate and tokens/s per resident text model"""
+    not_ready = await wait_for_service("llm")
+    if not_ready:
+        return not_ready
+
+    return JSONResponse(content={"enabled": llm.speculative_decoding, "models": llm.speculative_stats()})
+
+@app.get("/api/llm/slots")
+async def get_llm_slots():
+    """Context slots of the resident models and the requests queued for them"""
+    not_ready = await wait_for_service("llm")
+    if not_ready:
+        return not_ready
+
+    return JSONResponse(content={"models": llm.slot_status(), "queue": request_scheduler.status()[LLM_RESOURCE]})
+
+# *******************************
+# Conversation Pipeline
+# *******************************
+
+@app.websocket("/ws/pipeline")
+async def websocket_pipeline(websocket: WebSocket):
+    """Run user turns end-to-end (LLM -> sentences -> TTS audio) over one WebSocket"""
+    await websocket.accept()
+    # Without a client ID the connection gets a session of its own that ends with it
+    ephemeral = not websocket.query_params.get(CLIENT_ID_PARAM)
+    session = get_client_session(websocket)
+    try:
+        await conversation_pipeline.serve(websocket, session)
+    finally:
+        if ephemeral:
+            client_sessions.end(session.id)
+        try:
+            await websocket.close()
+        except RuntimeError:
+            pass  # Already closed
+
 # *******************************
 # Model Download
 # *******************************
@@ -375,6 +701,10 @@ class DownloadModelRequest(BaseModel):
 @app.post("/api/llm/models/download")
 async def download_model(request: DownloadModelRequest):
     """Download a model to the appropriate folder"""
+    not_ready = await wait_for_service("llm")
+    if not_ready:
+        return not_ready
+
     try:
         # Find the model in the available models
         target_model = None
@@ -413,24 +743,28 @@ async def download_model(request: DownloadModelRequest):
                 "message": "Delete the model first before downloading again"
             })
         
-        # Start the download in the background
+        # GGUF first, then the mmproj projector for vision models whose metadata links one
+        files = [(download_url, target_file_path, target_model.get('sha256'))]
+        mmproj_path = target_model.get('mmproj_path')
+        if target_model.get('type') == 'vision' and mmproj_path and target_model.get('mmproj_link'):
+            mmproj_file_path = os.path.join(target_folder, mmproj_path)
+            if not os.path.exists(mmproj_file_path):
+                files.append((target_model['mmproj_link'], mmproj_file_path, target_model.get('mmproj_sha256')))
+
+        # Start the download in the background, an interrupted earlier attempt is resumed
         download_id = f"{model_name}_{int(time.time())}"
-        download_progress[download_id] = {
-            'model_name': model_name,
-            'status': 'starting',
-            'progress': 0,
-            'total_size': 0,
-            'downloaded_size': 0,
-            'error': None,
-            'start_time': time.time()
-        }
-        
-        # Start background download task
-        asyncio.create_task(download_model_file(download_id, download_url, target_file_path))
+        job = download_manager.start(
+            model_name,
+            files,
+            download_id=download_id,
+            # Refresh model list to update file existence status
+            on_complete=lambda job: llm._load_available_models()
+        )
         
+        # A repeated request (double click, another client) follows the download already running
         return JSONResponse(content={
-            "message": "Download started",
-            "download_id": download_id,
+            "message": "Download started" if job.id == download_id else "Download already in progress",
+            "download_id": job.id,
             "target_path": target_file_path
         })
         
@@ -438,94 +772,42 @@ async def download_model(request: DownloadModelRequest):
         logger.error(f"Error starting model download: {e}", exc_info=True)
         return JSONResponse(status_code=500, content={"error": "Failed to start download"})
 
-async def download_model_file(download_id: str, url: str, target_path: str):
-    """Download a model file with progress tracking"""
-    try:
-        download_progress[download_id]['status'] = 'downloading'
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    raise Exception(f"HTTP {response.status}: {await response.text()}")
-                
-                total_size = int(response.headers.get('Content-Length', 0))
-                download_progress[download_id]['total_size'] = total_size
-                
-                downloaded_size = 0
-                
-                # Create a temporary file first
-                temp_path = target_path + '.tmp'
-                
-                async with aiofiles.open(temp_path, 'wb') as file:
-                    async for chunk in response.content.iter_chunked(8192):
-                        await file.write(chunk)
-                        downloaded_size += len(chunk)
-                        
-                        # Update progress
-                        progress = (downloaded_size / total_size * 100) if total_size > 0 else 0
-                        download_progress[download_id].update({
-                            'progress': progress,
-                            'downloaded_size': downloaded_size
-                        })
-                
-                # Move temp file to final location
-                if os.path.exists(target_path):
-                    os.remove(target_path)
-                os.rename(temp_path, target_path)
-                
-                # Mark as completed
-                download_progress[download_id]['status'] = 'completed'
-                download_progress[download_id]['progress'] = 100
-                
-                logger.info(f"Model download completed: {target_path}")
-                
-                # Refresh model list to update file existence status
-                llm._load_available_models()
-                
-    except Exception as e:
-        logger.error(f"Model download failed for {download_id}: {e}")
-        download_progress[download_id]['status'] = 'error'
-        download_progress[download_id]['error'] = str(e)
-        
-        # Clean up temp file if it exists
-        temp_path = target_path + '.tmp'
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-
 @app.get("/api/llm/models/download/{download_id}/progress")
 async def get_download_progress(download_id: str):
     """Get the progress of a model download"""
-    if download_id not in download_progress:
+    not_ready = await wait_for_service("llm")
+    if not_ready:
+        return not_ready
+
+    job = download_manager.get(download_id)
+    if not job:
         return JSONResponse(status_code=404, content={"error": "Download ID not found"})
     
-    progress_info = download_progress[download_id].copy()
-    
-    # Add elapsed time
-    progress_info['elapsed_time'] = time.time() - progress_info['start_time']
+    progress_info = job.to_dict()
     
-    # Calculate download speed if downloading
-    if progress_info['status'] == 'downloading' and progress_info['elapsed_time'] > 0:
-        speed = progress_info['downloaded_size'] / progress_info['elapsed_time']
-        progress_info['download_speed'] = f"{llm._format_file_size(speed)}/s"
+    # Add formatted download speed if downloading
+    if progress_info['status'] == 'downloading':
+        progress_info['download_speed'] = f"{llm._format_file_size(progress_info['download_speed_bytes'])}/s"
     
     return JSONResponse(content=progress_info)
 
 @app.delete("/api/llm/models/download/{download_id}")
-async def cancel_download(download_id: str):
-    """Cancel a model download"""
-    if download_id not in download_progress:
+async def cancel_download(download_id: str, discard: bool = False):
+    """Cancel a model download, partial data is kept for resuming unless discard is set"""
+    job = download_manager.get(download_id)
+    if not job:
         return JSONResponse(status_code=404, content={"error": "Download ID not found"})
     
-    if download_progress[download_id]['status'] in ['completed', 'error']:
+    if not download_manager.cancel(download_id, discard=discard):
         return JSONResponse(status_code=400, content={"error": "Download cannot be cancelled"})
     
-    download_progress[download_id]['status'] = 'cancelled'
+    await job.wait()
     return JSONResponse(content={"message": "Download cancelled"})
 
 @app.get("/api/llm/models/downloads")
 async def get_all_downloads():
     """Get status of all downloads"""
-    return JSONResponse(content={"downloads": download_progress})
+    return JSONResponse(content={"downloads": {download_id: job.to_dict() for download_id, job in download_manager.jobs.items()}})
 
 class DeleteModelRequest(BaseModel):
     model_id: str  # This could be displayName or fileName
@@ -533,6 +815,10 @@ class DeleteModelRequest(BaseModel):
 @app.delete("/api/llm/models/delete")
 async def delete_model(request: DeleteModelRequest):
     """Delete a downloaded model file"""
+    not_ready = await wait_for_service("llm")
+    if not_ready:
+        return not_ready
+
     try:
         # Find the model in the available models
         target_model = None
@@ -562,9 +848,7 @@ async def delete_model(request: DeleteModelRequest):
             return JSONResponse(status_code=404, content={"error": "Model file not found"})
         
         # Check if this is the currently loaded model
-        if llm.current_model_data and llm.current_model_data.get('fileName') == model_name:
-            if llm.llm:
-                llm.unload_model()
+        llm.unload_model(model_name)
         
         # Delete the model file
         os.remove(target_file_path)
@@ -606,6 +890,10 @@ class DeleteVoiceRequest(BaseModel):
 
 @app.get("/api/tts/voices")
 async def get_available_voices():
+    not_ready = await wait_for_service("tts")
+    if not_ready:
+        return not_ready
+
     try:
         voices = tts.get_available_voices()
         return JSONResponse(content={
@@ -618,9 +906,14 @@ async def get_available_voices():
 
 @app.post("/api/tts/change-voice")
 async def change_voice(request: ChangeVoiceRequest):
+    not_ready = await wait_for_service("tts")
+    if not_ready:
+        return not_ready
+
     try:
         result = tts.change_voice(request.voice_name)
-        settings_manager.update_settings({"tts.voice": request.voice_name})
+        # Already applied above, only record it
+        settings_manager.update_settings({"tts.voice": request.voice_name}, apply=False)
         return JSONResponse(content=result)
     except ValueError as ve:
         return JSONResponse(status_code=400, content={"error": str(ve)})
@@ -629,36 +922,82 @@ async def change_voice(request: ChangeVoiceRequest):
         return JSONResponse(status_code=500, content={"error": "Failed to change voice"})
 
 @app.post("/api/tts")
-async def get_audio(request: TTSRequest):
-    response = tts.synthesize(request.text)
+async def get_audio(request: TTSRequest, fastapi_request: Request):
+    not_ready = await wait_for_service("tts")
+    if not_ready:
+        return not_ready
+
+    session = get_client_session(fastapi_request)
+    ticket = await acquire_for_request(fastapi_request, TTS_RESOURCE, session)
+    if ticket is None:
+        return client_closed_response()
+    try:
+        response = await inference_executor.run(tts.synthesize, request.text, session.voice, pool="tts")
+    except ValueError as e:
+        # Unknown or deleted voice, or no voice uploaded yet
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    finally:
+        ticket.release()
     return Response(response, media_type="audio/wav")
 
+# Reference audio is only read once to convert it, so it is received into the system temp directory
+VOICE_UPLOAD_TEMP_DIR = os.path.join(tempfile.gettempdir(), "lav_voice_uploads")
+
 @app.post("/api/tts/upload")
-async def upload_voice(
-    name: str = Form(...),
-    reference_text: str = Form(...),
-    reference_language: str = Form(...),
-    reference_audio: UploadFile = File(...)
-):
+async def upload_voice(request: Request):
+    """
+    Upload a voice, streamed to disk. Progress is reported under the X-Upload-ID header.
+
+    Form fields: name, reference_text, reference_language and the reference_audio file.
+    """
+    not_ready = await wait_for_service("tts")
+    if not_ready:
+        return not_ready
+
+    upload = None
     try:
-        # Read the file content
-        audio_data = await reference_audio.read()
-        
-        result = tts.upload_voice(
-            name=name,
-            reference_audio=audio_data,
-            reference_text=reference_text,
-            reference_language=reference_language
+        upload = await upload_manager.receive(
+            request, VOICE_UPLOAD_TEMP_DIR,
+            max_size=settings_manager.settings.get("uploads.max_voice_size", DEFAULT_MAX_VOICE_UPLOAD_SIZE))
+        reference_audio = upload.file("reference_audio")
+        missing = [name for name in ("name", "reference_text", "reference_language") if not upload.fields.get(name)]
+        if reference_audio is None or missing:
+            error = f"Missing form fields: {', '.join(missing or ['reference_audio'])}"
+            upload_manager.finish(upload, error)
+            return JSONResponse(status_code=400, content={"error": error})
+        
+        result = await inference_executor.run(
+            tts.upload_voice,
+            name=upload.fields["name"],
+            reference_audio=reference_audio.path,
+            reference_text=upload.fields["reference_text"],
+            reference_language=upload.fields["reference_language"],
+            pool="tts"
         )
+        upload_manager.finish(upload)
         return JSONResponse(content=result)
+    except UploadError as e:
+        return JSONResponse(status_code=e.status_code, content={"error": str(e)})
     except Exception as e:
         logger.error(f"Error uploading voice: {e}", exc_info=True)
+        if upload:
+            upload_manager.finish(upload, str(e))
         return JSONResponse(status_code=500, content={"error": f"Failed to upload voice: {str(e)}"})
+    finally:
+        if upload:
+            upload.cleanup()
     
 @app.delete("/api/tts/delete")
 async def delete_voice(request: DeleteVoiceRequest):
+    not_ready = await wait_for_service("tts")
+    if not_ready:
+        return not_ready
+
     try:
         result = tts.delete_voice(request.name)
+        cleared = client_sessions.clear_voice(request.name)
+        if cleared:
+            logger.info(f"Voice {request.name} cleared from {cleared} client sessions")
         return JSONResponse(content=result)
     except Exception as e:
         logger.error(f"Error deleting voice: {e}", exc_info=True)
@@ -688,7 +1027,12 @@ async def get_vrm_models():
         logger.error(f"Error getting VRM models: {e}", exc_info=True)
         return JSONResponse(status_code=500, content={"error": "Failed to get VRM models"})
 
-@app.get("/api/character/files/{file_path:path}")
+# Precompressed copies of character assets, keyed by content hash
+CHARACTER_ASSET_CACHE_DIR = os.path.join("cache", "character_assets")
+character_assets = AssetCache(CHARACTER_ASSET_CACHE_DIR, hash_provider=character_manager.get_file_hash)
+character_manager.add_change_listener(lambda path: character_assets.invalidate(str(path)))
+
+@app.api_route("/api/character/files/{file_path:path}", methods=["GET", "HEAD"])
 async def serve_character_files(file_path: str, request: Request):
     """Serve character model files from backend"""
     try:
@@ -698,10 +1042,11 @@ async def serve_character_files(file_path: str, request: Request):
         # Get the absolute file path using CharacterManager
         absolute_path = character_manager.get_file_path(full_path)
         
-        if absolute_path is None:
+        if absolute_path is None or not absolute_path.is_file():
             raise HTTPException(status_code=404, detail="File not found")
         
-        return FileResponse(str(absolute_path))
+        # Content hash ETags, 304s, byte ranges and precompressed JSON
+        return await character_assets.serve(request, str(absolute_path))
         
     except HTTPException:
         raise
@@ -709,46 +1054,84 @@ async def serve_character_files(file_path: str, request: Request):
         logger.error(f"Error serving character file: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
 
+# Upload size caps in bytes, overridable with the "uploads.max_model_size" and "uploads.max_voice_size" settings
+DEFAULT_MAX_MODEL_UPLOAD_SIZE = 1024 * 1024 * 1024
+DEFAULT_MAX_VOICE_UPLOAD_SIZE = 100 * 1024 * 1024
+
 @app.post("/api/character/vrm/upload")
-async def upload_vrm_model(file: UploadFile = File(...)):
-    """Upload a VRM model file"""
+async def upload_vrm_model(request: Request):
+    """Upload a VRM model file, streamed to disk. Progress is reported under the X-Upload-ID header"""
+    upload = None
     try:
-        # Read file content
-        file_data = await file.read()
+        upload = await upload_manager.receive(
+            request, str(character_manager.get_upload_temp_dir("vrm")),
+            max_size=settings_manager.settings.get("uploads.max_model_size", DEFAULT_MAX_MODEL_UPLOAD_SIZE))
+        file = upload.file("file")
+        if file is None:
+            upload_manager.finish(upload, "No file provided")
+            return JSONResponse(status_code=400, content={"error": "No file provided"})
         
         # Upload using character manager
-        success, message = character_manager.upload_vrm_model(file_data, file.filename)
+        success, message = await inference_executor.run(character_manager.upload_vrm_model, file.path, file.filename, file.sha256)
+        upload_manager.finish(upload, None if success else message)
         
         if success:
-            return JSONResponse(status_code=200, content={"message": message})
+            return JSONResponse(status_code=200, content={"message": message, "upload_id": upload.progress.id})
         else:
             return JSONResponse(status_code=400, content={"error": message})
-            
+
+    except UploadError as e:
+        return JSONResponse(status_code=e.status_code, content={"error": str(e)})
     except Exception as e:
         logger.error(f"Error uploading VRM model: {e}", exc_info=True)
+        if upload:
+            upload_manager.finish(upload, str(e))
         return JSONResponse(status_code=500, content={"error": "Failed to upload model"})
+    finally:
+        if upload:
+            upload.cleanup()
 
 @app.post("/api/character/live2d/upload-folder")
-async def upload_live2d_folder(files: List[UploadFile] = File(...)):
-    """Upload a Live2D model folder"""
+async def upload_live2d_folder(request: Request):
+    """Upload a Live2D model folder, streamed to disk. Progress is reported under the X-Upload-ID header"""
+    upload = None
     try:
-        # Read all files and their relative paths
-        file_data = []
-        for file in files:
-            content = await file.read()
-            file_data.append((file.filename, content))
+        upload = await upload_manager.receive(
+            request, str(character_manager.get_upload_temp_dir("live2d")),
+            max_size=settings_manager.settings.get("uploads.max_model_size", DEFAULT_MAX_MODEL_UPLOAD_SIZE))
+        # Relative paths of the files, where they were written and their hashes
+        file_data = [(file.filename, file.path, file.sha256) for file in upload.files if file.field_name == "files"]
         
         # Upload using character manager
-        success, message = character_manager.upload_live2d_folder(file_data)
+        success, message = await inference_executor.run(character_manager.upload_live2d_folder, file_data)
+        upload_manager.finish(upload, None if success else message)
         
         if success:
-            return JSONResponse(status_code=200, content={"message": message})
+            return JSONResponse(status_code=200, content={"message": message, "upload_id": upload.progress.id})
         else:
             return JSONResponse(status_code=400, content={"error": message})
-            
+
+    except UploadError as e:
+        return JSONResponse(status_code=e.status_code, content={"error": str(e)})
     except Exception as e:
         logger.error(f"Error uploading Live2D model folder: {e}", exc_info=True)
+        if upload:
+            upload_manager.finish(upload, str(e))
         return JSONResponse(status_code=500, content={"error": "Failed to upload model folder"})
+    finally:
+        if upload:
+            upload.cleanup()
+
+@app.get("/api/uploads")
+async def get_uploads():
+    return JSONResponse(content={"uploads": upload_manager.all()})
+
+@app.get("/api/uploads/{upload_id}")
+async def get_upload_progress(upload_id: str):
+    progress = upload_manager.get(upload_id)
+    if progress is None:
+        return JSONResponse(status_code=404, content={"error": "Upload not found"})
+    return JSONResponse(content=progress.to_dict())
 
 class DeleteModelRequest(BaseModel):
     path: str
@@ -787,66 +1170,123 @@ async def delete_live2d_model(request: DeleteModelRequest):
 # Settings
 # *******************************
 
-class SettingsManager:
+# Inference-time LLM parameters, applied without reloading the model
+LLM_SAMPLING_PARAMS = {
+    "top_k": int,
+    "top_p": float,
+    "min_p": float,
+    "repeat_penalty": float,
+    "temperature": float,
+    "seed": int
+}
+
+class SettingsManager(SettingsEngine):
+    """Application settings, each change is applied only to the services it affects"""
     def __init__(self, settings_file: str):
-        self.settings_file = settings_file
-        self.settings = self.load_settings()
+        super().__init__(settings_file)
+        # The model is applied before keep_model_loaded so the right model is kept or unloaded
+        self.register("llm.model", ["llm.model_filename", "llm.keep_model_loaded"],
+                      self._apply_llm_model, background=True)
+        self.register("llm.sampling", [f"llm.{name}" for name in LLM_SAMPLING_PARAMS], self._apply_sampling_params)
+        self.register("llm.residency", ["llm.idle_timeout", "llm.memory_budget_mb"], self._apply_llm_residency)
+        self.register("llm.slots", ["llm.slots"], self._apply_llm_slots)
+        self.register("llm.speculative", ["llm.speculative_decoding", "llm.speculative_num_pred_tokens"],
+                      self._apply_speculative_decoding)
+        self.register("tts.voice", ["tts.voice"], self._apply_voice_setting)
+        self.register("stream.yt.videoid", ["stream.yt.videoid"], self._apply_video_id)
+        self.register("server.control_hosts", ["server.control_hosts"], self._apply_control_hosts)
+
+    def _apply_llm_model(self, changes: Dict[str, Any], task: SettingsTask):
+        if not llm.is_ready():
+            task.report("LLM service not loaded yet, applied when it loads")
+
+        if "llm.model_filename" in changes:
+            model_filename = changes["llm.model_filename"]
+            if llm.is_ready():
+                task.report(f"Loading model {model_filename}", 0.0)
+            llm.when_ready(lambda instance: instance.load_model_by_filename(model_filename))
+
+        if "llm.keep_model_loaded" in changes:
+            keep_model_loaded = changes["llm.keep_model_loaded"]
+            if llm.is_ready():
+                task.report("Loading model" if keep_model_loaded else "Unloading model", 0.5)
+            llm.when_ready(lambda instance: instance.set_keep_model_loaded(keep_model_loaded))
+
+        if llm.is_ready():
+            task.report("Model settings applied", 1.0)
+
+    def _apply_sampling_params(self, changes: Dict[str, Any]):
+        llm_sampling_params = {}
+        for key, value in changes.items():
+            param_name = key.split(".", 1)[1]
+            try:
+                # Convert to appropriate type
+                llm_sampling_params[param_name] = LLM_SAMPLING_PARAMS[param_name](value)
+            except (ValueError, TypeError):
+                logger.warning(f"Invalid value for {key}: {value}, using default")
 
-    def load_settings(self) -> Dict[str, Any]:
-        if not os.path.exists(self.settings_file):
-            return {}
-        with open(self.settings_file, "r") as file:
-            return json.load(file)
+        if llm_sampling_params:
+            llm.when_ready(lambda instance: instance.update_sampling_params(llm_sampling_params))
 
-    def save_settings(self, settings: Dict[str, Any]):
-        with open(self.settings_file, "w") as file:
-            json.dump(settings, file, indent=4)
+    def _apply_llm_residency(self, changes: Dict[str, Any]):
+        # Seconds a model stays loaded without requests (0 unloads after each request)
+        # and megabytes of models kept loaded together before the least recently used is evicted
+        residency = {}
+        try:
+            if "llm.idle_timeout" in changes:
+                residency["idle_timeout"] = float(changes["llm.idle_timeout"])
+            if "llm.memory_budget_mb" in changes:
+                residency["memory_budget"] = int(float(changes["llm.memory_budget_mb"]) * 1024 * 1024)
+        except (ValueError, TypeError):
+            logger.warning(f"Invalid LLM residency settings: {changes}")
+            return
+        llm.when_ready(lambda instance: instance.configure_residency(**residency))
+
+    def _apply_llm_slots(self, changes: Dict[str, Any]):
+        try:
+            slot_count = max(1, int(changes["llm.slots"]))
+        except (ValueError, TypeError):
+            logger.warning(f"Invalid value for llm.slots: {changes['llm.slots']}, keeping {request_scheduler.slots[LLM_RESOURCE]}")
+            return
+        # One worker thread and one scheduler slot per context, so that many completions run at once
+        inference_executor.set_pool_size("llm", slot_count)
+        request_scheduler.set_slots(LLM_RESOURCE, slot_count)
+        llm.when_ready(lambda instance: instance.set_slot_count(slot_count))
+
+    def _apply_speculative_decoding(self, changes: Dict[str, Any]):
+        enabled = bool(self.settings.get("llm.speculative_decoding", False))
+        num_pred_tokens = self.settings.get("llm.speculative_num_pred_tokens")
+        try:
+            num_pred_tokens = int(num_pred_tokens) if num_pred_tokens else None
+        except (ValueError, TypeError):
+            logger.warning(f"Invalid value for llm.speculative_num_pred_tokens: {num_pred_tokens}, using default")
+            num_pred_tokens = None
+        llm.when_ready(lambda instance: instance.set_speculative_decoding(enabled, num_pred_tokens))
+
+    def _apply_voice_setting(self, changes: Dict[str, Any]):
+        voice_name = changes["tts.voice"]
+        tts.when_ready(lambda instance: self._apply_voice(instance, voice_name))
+
+    def _apply_voice(self, tts_instance, voice_name: str):
+        try:
+            tts_instance.change_voice(voice_name)
+        except ValueError:
+            # If saved voice is not available, remove it from settings
+            logger.warning(f"Saved voice '{voice_name}' not found, removing from settings")
+            self.remove("tts.voice")
+
+    def _apply_video_id(self, changes: Dict[str, Any]):
+        chat_fetch.video_id = changes["stream.yt.videoid"]
+
+    def _apply_control_hosts(self, changes: Dict[str, Any]):
+        # LAN addresses whose clients are scheduled like the host machine's, e.g. the streaming PC
+        client_sessions.set_control_hosts(changes["server.control_hosts"])
 
     def apply_settings(self):
-        # Create a copy of items to avoid modification during iteration
-        settings_items = list(self.settings.items())
-        
-        for key, value in settings_items:
-            if key == "llm.model_filename":
-                llm.load_model_by_filename(value)
-        
-        for key, value in settings_items:
-            if key == "llm.keep_model_loaded":
-                llm.set_keep_model_loaded(value)
-            if key == "stream.yt.videoid":
-                chat_fetch.video_id = value
-            if key == "tts.voice":
-                try:
-                    tts.change_voice(value)
-                except ValueError:
-                    # If saved voice is not available, remove it from settings
-                    logger.warning(f"Saved voice '{value}' not found, removing from settings")
-                    self.settings.pop("tts.voice")
-                    self.save_settings(self.settings)
-        
-        # Apply LLM sampling parameters
-        llm_sampling_params = {}
-        for key, value in settings_items:
-            if key.startswith("llm.") and key.split(".", 1)[1] in ["top_k", "top_p", "min_p", "repeat_penalty", "temperature", "seed"]:
-                param_name = key.split(".", 1)[1]
-                try:
-                    # Convert to appropriate type
-                    if param_name == "seed":
-                        llm_sampling_params[param_name] = int(value)
-                    elif param_name in ["top_k"]:
-                        llm_sampling_params[param_name] = int(value)
-                    else:
-                        llm_sampling_params[param_name] = float(value)
-                except (ValueError, TypeError):
-                    logger.warning(f"Invalid value for {key}: {value}, using default")
-        
-        if llm_sampling_params:
-            llm.update_sampling_params(llm_sampling_params)
+        return self.apply_all()
 
-    def update_settings(self, updated_settings: Dict[str, Any]):
-        self.settings.update(updated_settings)
-        self.save_settings(self.settings)
-        self.apply_settings()
+    def update_settings(self, updated_settings: Dict[str, Any], apply: bool = True) -> Dict[str, Any]:
+        return self.update(updated_settings, apply)
 
 # Initialize the SettingsManager
 SETTINGS_FILE = "settings.json"
@@ -858,16 +1298,6 @@ startup_progress.show_step("Applying Settings")
 settings_manager.apply_settings()
 startup_progress.complete_step(f"Settings applied in {time.time() - start_time:.2f}s")
 
-# Warm up TTS to reduce first request latency
-start_time = time.time()
-startup_progress.show_step("Warming up TTS")
-try:
-    tts.synthesize("Hi")
-    startup_progress.complete_step(f"TTS warmed up successfully in {time.time() - start_time:.2f}s")
-except Exception as e:
-    startup_progress.complete_step(f"TTS warm-up failed (non-critical) in {time.time() - start_time:.2f}s")
-    logger.warning(f"TTS warm-up failed (non-critical): {e}")
-
 # Log startup time
 startup_time = time.time() - total_start_time
 startup_progress.complete_step(f"✅ Server Ready in {startup_time:.2f}s at {datetime.now().strftime('%H:%M:%S')}")
@@ -882,8 +1312,9 @@ class UpdateSettingsRequest(BaseModel):
 @app.post("/api/settings/update")
 async def update_settings(request: UpdateSettingsRequest):
     try:
-        settings_manager.update_settings(request.settings)
-        return JSONResponse(content={"status": "ok", "message": "Settings updated successfully"})
+        # Heavy changes such as a model switch continue in the background, see /api/settings/tasks
+        result = settings_manager.update_settings(request.settings)
+        return JSONResponse(content={"status": "ok", "message": "Settings updated successfully", **result})
     except ValueError as ve:
         logger.error(f"Validation error: {ve}, traceback: {traceback.format_exc()}")
         return JSONResponse(status_code=400, content={"error": str(ve)})
@@ -897,6 +1328,22 @@ async def get_settings():
         "settings": settings_manager.settings
     })
 
+@app.on_event("shutdown")
+async def flush_settings():
+    # Write changes still waiting out the save delay
+    settings_manager.flush()
+
+@app.get("/api/settings/tasks")
+async def get_settings_tasks():
+    return JSONResponse(content={"tasks": settings_manager.tasks()})
+
+@app.get("/api/settings/tasks/{task_id}")
+async def get_settings_task(task_id: str):
+    task = settings_manager.task(task_id)
+    if task is None:
+        return JSONResponse(status_code=404, content={"error": "Task not found"})
+    return JSONResponse(content=task)
+
 # *******************************
 # Chat History API
 # *******************************
@@ -986,6 +1433,10 @@ class IndexSessionRequest(BaseModel):
 
 @app.post("/api/chat/session/{session_id}/index")
 async def index_chat_session(session_id: str, request: IndexSessionRequest):
+    not_ready = await wait_for_service("memory")
+    if not_ready:
+        return not_ready
+
     try:
         # Get the session history
         session = history_store.get_session_history(session_id)
@@ -996,8 +1447,9 @@ async def index_chat_session(session_id: str, request: IndexSessionRequest):
         if not history:
             return JSONResponse(status_code=400, content={"error": "Session has no history to index"})
         
-        # Insert the history into memory using the new chunking functionality
-        response = memory.insert_history(
+        # Insert the history into memory using the new chunking functionality, embedding runs off the event loop
+        response = await inference_executor.run(
+            memory.insert_history,
             history=history,
             session_id=session_id,
             window_size=request.window_size,
@@ -1022,6 +1474,10 @@ async def index_chat_session(session_id: str, request: IndexSessionRequest):
 
 @app.delete("/api/chat/session/{session_id}/index")
 async def remove_session_index(session_id: str):
+    not_ready = await wait_for_service("memory")
+    if not_ready:
+        return not_ready
+
     try:
         # Check if session exists
         session = history_store.get_session_history(session_id)
@@ -1029,7 +1485,7 @@ async def remove_session_index(session_id: str):
             return JSONResponse(status_code=404, content={"error": "Session not found"})
         
         # Remove all messages for this session from memory
-        success = memory.delete_session_messages(session_id)
+        success = await inference_executor.run(memory.delete_session_messages, session_id)
         
         if not success:
             return JSONResponse(status_code=500, content={"error": "Failed to remove session from memory"})
@@ -1063,9 +1519,13 @@ async def get_session_index_status(session_id: str):
 
 @app.get("/api/chat/session/{session_id}/indexed")
 async def get_indexed_chunks(session_id: str):
+    not_ready = await wait_for_service("memory")
+    if not_ready:
+        return not_ready
+
     try:
         # Fetch all indexed chunks for the session
-        chunks = memory.query_by_session(session_id, limit=1000)
+        chunks = await inference_executor.run(memory.query_by_session, session_id, limit=1000)
         return JSONResponse(status_code=200, content={"chunks": chunks})
     except Exception as e:
         logger.error(f"Error getting indexed chunks for session {session_id}: {e}", exc_info=True)
@@ -1073,6 +1533,10 @@ async def get_indexed_chunks(session_id: str):
 
 @app.post("/api/chat/reindex-all")
 async def reindex_all_sessions():
+    not_ready = await wait_for_service("memory")
+    if not_ready:
+        return not_ready
+
     try:
         # Get all sessions
         sessions = history_store.get_session_list()
@@ -1080,7 +1544,7 @@ async def reindex_all_sessions():
             return JSONResponse(status_code=200, content={"message": "No sessions to reindex"})
         
         # Delete all existing indexes
-        success = memory.delete_all_messages()
+        success = await inference_executor.run(memory.delete_all_messages)
         if not success:
             return JSONResponse(status_code=500, content={"error": "Failed to delete existing indexes"})
         
@@ -1097,7 +1561,8 @@ async def reindex_all_sessions():
                 session_data = history_store.get_session_history(session["id"])
                 if session_data and session_data.get("history"):
                     # Insert the history into memory
-                    response = memory.insert_history(
+                    response = await inference_executor.run(
+                        memory.insert_history,
                         history=session_data["history"],
                         session_id=session["id"],
                         window_size=3,
@@ -1138,15 +1603,102 @@ class QueryContextRequest(BaseModel):
 
 @app.post("/api/memory/context")
 async def query_memory_context(request: QueryContextRequest):
+    not_ready = await wait_for_service("memory")
+    if not_ready:
+        return not_ready
+
     try:
-        response = memory.query(text=request.text, limit=request.limit)
+        response = await inference_executor.run(memory.query, text=request.text, limit=request.limit)
         return JSONResponse(status_code=200, content={"context": response})
     except Exception as e:
         logger.error(f"Error querying memory context: {e}", exc_info=True)
         return JSONResponse(status_code=500, content={"error": "Failed to query memory context"})
 
-# Add RVC proxy middleware
-app.middleware("http")(create_proxy_middleware("/api/rvc", rvc_server_port))
+# *******************************
+# RVC Model Download
+# *******************************
+
+# Served here instead of by the RVC server so downloads use the shared download manager
+RVC_DOWNLOAD_PATH = "/api/rvc/download_model"
+rvc_models_dir = os.path.join(rvc_dir, "models")
+
+class RVCModelDownloadRequest(BaseModel):
+    url: str
+
+def extract_rvc_model(zip_path: str, model_dir: str) -> bool:
+    """Extract a downloaded RVC model zip, returns whether it contains an index file"""
+    if not zipfile.is_zipfile(zip_path):
+        raise ValueError("Downloaded file is not a valid zip file")
+
+    # Remove existing model directory if it exists
+    if os.path.exists(model_dir):
+        shutil.rmtree(model_dir)
+    os.makedirs(model_dir)
+
+    logger.info(f"Extracting RVC model to {model_dir}")
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        zip_ref.extractall(model_dir)
+
+    files = [file for _, _, names in os.walk(model_dir) for file in names]
+    if not any(file.endswith('.pth') for file in files):
+        shutil.rmtree(model_dir)
+        raise ValueError("No .pth file found in zip")
+    return any(file.endswith('.index') for file in files)
+
+@app.post(RVC_DOWNLOAD_PATH)
+async def download_rvc_model(request: RVCModelDownloadRequest):
+    """Download and set up an RVC model zip, errors use "detail" like the RVC server"""
+    filename = unquote(os.path.basename(urlparse(request.url).path))
+    if not filename.endswith('.zip'):
+        return JSONResponse(status_code=400, content={"detail": "URL must point to a zip file"})
+
+    model_name = os.path.splitext(filename)[0]
+    zip_path = os.path.join(rvc_models_dir, filename)
+    if download_manager.active_job(zip_path):
+        return JSONResponse(status_code=409, content={"detail": f"Model '{model_name}' is already downloading"})
+    if os.path.exists(zip_path):
+        os.remove(zip_path)  # Left over from an earlier failed extraction
+
+    job = download_manager.start(model_name, [(request.url, zip_path, None)])
+    await job.wait()
+    if job.status != COMPLETED:
+        return JSONResponse(status_code=500, content={"detail": f"Failed to download model: {job.error or job.status}"})
+
+    try:
+        has_index = await inference_executor.run(extract_rvc_model, zip_path, os.path.join(rvc_models_dir, model_name))
+    except (ValueError, zipfile.BadZipFile) as e:
+        return JSONResponse(status_code=400, content={"detail": str(e)})
+    except Exception as e:
+        logger.error(f"Error processing RVC model: {e}", exc_info=True)
+        return JSONResponse(status_code=500, content={"detail": str(e)})
+    finally:
+        if os.path.exists(zip_path):
+            os.remove(zip_path)
+
+    return JSONResponse(content={
+        "message": f"Model '{model_name}' downloaded and extracted successfully",
+        "model_name": model_name,
+        "has_index": has_index
+    })
+
+# Add RVC proxy middleware, timeouts overridable with the "rvc.proxy_timeouts" setting
+rvc_proxy_middleware = create_proxy_middleware("/api/rvc", rvc_server_port,
+                                               timeouts=settings_manager.settings.get("rvc.proxy_timeouts"),
+                                               exclude_paths=[RVC_DOWNLOAD_PATH])
+app.middleware("http")(rvc_proxy_middleware)
+
+@app.on_event("shutdown")
+async def close_rvc_proxy():
+    await rvc_proxy_middleware.proxy.aclose()
+
+@app.on_event("shutdown")
+def close_llm_connections():
+    # Pooled connections to remote LLM servers, only opened once the LLM service is loaded
+    if llm.is_ready():
+        llm.close_connections()
+
+# Attach requests carrying an X-Turn-ID header to that turn's trace, added last so it also wraps the RVC proxy
+app.middleware("http")(create_turn_middleware())
 
 if __name__ == "__main__":
     try:
@@ -1154,4 +1706,5 @@ if __name__ == "__main__":
     finally:
         # Stop all managed processes on shutdown
         process_manager.stop_all_servers()
+        inference_executor.shutdown()
 
@@ -1,25 +1,35 @@
 import os
 import logging
 import shutil
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Callable
 from pathlib import Path
+from .characterManifest import CharacterManifest
 
 logger = logging.getLogger(__name__)
 
+MANIFEST_FILE = "character_manifest.json"
+
 class CharacterModel:
     """Represents a character model with metadata"""
-    def __init__(self, name: str, path: str, display_name: str, model_type: str):
+    def __init__(self, name: str, path: str, display_name: str, model_type: str,
+                 size: Optional[int] = None, content_hash: Optional[str] = None):
         self.name = name
         self.path = path
         self.display_name = display_name
         self.model_type = model_type
+        self.size = size
+        self.content_hash = content_hash
         
     def to_dict(self) -> Dict[str, Any]:
         return {
             "name": self.name,
             "path": self.path,
             "displayName": self.display_name,
-            "type": self.model_type
+            "type": self.model_type,
+            "size": self.size,
+            "hash": self.content_hash,
+            # Versioned URL, served with immutable caching while the content is unchanged
+            "url": f"{self.path}?v={self.content_hash}" if self.content_hash else self.path
         }
 
 class CharacterManager:
@@ -31,13 +41,34 @@ class CharacterManager:
         self.vrm_path = self.base_path / "VRM3D" / "models"
         self._live2d_models: List[CharacterModel] = []
         self._vrm_models: List[CharacterModel] = []
+        self._change_listeners: List[Callable[[Path], None]] = []
+        # Resolved once, _is_safe_path runs for every file served outside the manifest
+        self._base_abs = str(self.base_path.resolve())
         
         # Create directories if they don't exist
         self.live2d_path.mkdir(parents=True, exist_ok=True)
         self.vrm_path.mkdir(parents=True, exist_ok=True)
+        self.manifest = CharacterManifest(self.live2d_path, self.vrm_path, self.base_path / MANIFEST_FILE)
+
+    def add_change_listener(self, callback: Callable[[Path], None]):
+        """Register a callback run with the affected file or folder after an upload or delete"""
+        self._change_listeners.append(callback)
 
-    def upload_vrm_model(self, file_data: bytes, filename: str) -> Tuple[bool, str]:
-        """Upload a VRM model file"""
+    def _notify_change(self, path: Path, hashes: Optional[Dict[str, str]] = None):
+        self.manifest.invalidate(path, hashes)
+        for callback in self._change_listeners:
+            try:
+                callback(path)
+            except Exception as e:
+                logger.error(f"Error in character change listener for {path}: {e}", exc_info=True)
+
+    def upload_vrm_model(self, source_path: str, filename: str, sha256: Optional[str] = None) -> Tuple[bool, str]:
+        """Move an uploaded VRM model file into place
+        Args:
+            source_path: Temporary file holding the upload, on the same filesystem as the models directory
+            filename: Original name of the uploaded file
+            sha256: Hash computed while receiving the upload, saves hashing the file again for the manifest
+        """
         try:
             if not filename.lower().endswith('.vrm'):
                 return False, "File must be a .vrm file"
@@ -46,9 +77,9 @@ class CharacterManager:
             safe_filename = self._sanitize_filename(filename)
             target_path = self.vrm_path / safe_filename
 
-            # Write the file
-            with open(target_path, 'wb') as f:
-                f.write(file_data)
+            # Atomic, a model being replaced is never seen half written
+            os.replace(source_path, target_path)
+            self._notify_change(target_path, {str(target_path): sha256})
 
             logger.info(f"Successfully uploaded VRM model: {safe_filename}")
             return True, "Model uploaded successfully"
@@ -57,11 +88,18 @@ class CharacterManager:
             logger.error(f"Error uploading VRM model: {e}", exc_info=True)
             return False, f"Failed to upload model: {str(e)}"
 
-    def upload_live2d_folder(self, files: List[Tuple[str, bytes]]) -> Tuple[bool, str]:
-        """Upload a Live2D model folder
+    def get_upload_temp_dir(self, model_type: str) -> Path:
+        """Directory for uploads in progress, on the same filesystem as the models so they can be renamed into place"""
+        models_path = self.vrm_path if model_type == "vrm" else self.live2d_path
+        # Hidden, the manifest skips dot directories
+        return models_path / ".uploads"
+
+    def upload_live2d_folder(self, files: List[Tuple[str, str, Optional[str]]]) -> Tuple[bool, str]:
+        """Move an uploaded Live2D model folder into place, replacing an existing folder of the same name
         Args:
-            files: List of tuples containing (relative_path, file_data)
+            files: List of tuples containing (relative_path, temporary file path, sha256 computed while receiving or None)
         """
+        staging_folder = None
         try:
             if not files:
                 return False, "No files provided"
@@ -76,33 +114,48 @@ class CharacterManager:
             safe_folder_name = self._sanitize_filename(folder_name)
             target_folder = self.live2d_path / safe_folder_name
 
-            # Create target folder
-            target_folder.mkdir(parents=True, exist_ok=True)
+            # Assemble the folder next to the models, then swap it in with renames
+            staging_folder = self.get_upload_temp_dir("live2d") / f"{safe_folder_name}.staging"
+            shutil.rmtree(staging_folder, ignore_errors=True)
+            staging_folder.mkdir(parents=True)
+            staging_root = staging_folder.resolve()
+            hashes = {}
 
-            # Write all files
-            for relative_path, file_data in files:
+            for relative_path, source_path, sha256 in files:
                 # Remove the root folder name from path
                 sub_path = '/'.join(relative_path.split('/')[1:])
                 if not sub_path:
                     continue
 
-                # Create full target path
-                full_target_path = target_folder / sub_path
+                # Create full target path, rejecting paths that escape the folder
+                full_target_path = staging_folder / sub_path
+                if not full_target_path.resolve().is_relative_to(staging_root):
+                    return False, f"Invalid file path: {relative_path}"
                 full_target_path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(source_path, full_target_path)
+                hashes[str(target_folder / sub_path)] = sha256
 
-                # Write file
-                with open(full_target_path, 'wb') as f:
-                    f.write(file_data)
+            previous_folder = None
+            if target_folder.exists():
+                previous_folder = staging_folder.with_name(f"{safe_folder_name}.previous")
+                shutil.rmtree(previous_folder, ignore_errors=True)
+                os.replace(target_folder, previous_folder)
+            os.replace(staging_folder, target_folder)
+            staging_folder = None
+            if previous_folder:
+                shutil.rmtree(previous_folder, ignore_errors=True)
+            self._notify_change(target_folder, hashes)
 
             logger.info(f"Successfully uploaded Live2D model folder: {safe_folder_name}")
             return True, "Model folder uploaded successfully"
 
         except Exception as e:
             logger.error(f"Error uploading Live2D model folder: {e}", exc_info=True)
-            # Clean up on failure
-            if 'target_folder' in locals():
-                shutil.rmtree(target_folder, ignore_errors=True)
             return False, f"Failed to upload model folder: {str(e)}"
+        finally:
+            # Clean up on failure
+            if staging_folder is not None:
+                shutil.rmtree(staging_folder, ignore_errors=True)
 
     def delete_vrm_model(self, model_path: str) -> Tuple[bool, str]:
         """Delete a VRM model file"""
@@ -117,6 +170,7 @@ class CharacterManager:
 
             # Delete the file
             absolute_path.unlink()
+            self._notify_change(absolute_path)
             logger.info(f"Successfully deleted VRM model: {absolute_path}")
             return True, "Model deleted successfully"
 
@@ -142,6 +196,7 @@ class CharacterManager:
 
             # Delete the entire folder
             shutil.rmtree(folder_path)
+            self._notify_change(folder_path)
             logger.info(f"Successfully deleted Live2D model folder: {folder_path}")
             return True, "Model folder deleted successfully"
 
@@ -160,31 +215,31 @@ class CharacterManager:
     def get_live2d_models(self) -> List[Dict[str, Any]]:
         """Get all available Live2D models"""
         try:
-            models = []
-            
             if not self.live2d_path.exists():
                 logger.warning(f"Live2D models directory does not exist: {self.live2d_path}")
                 return []
-                
-            for model_dir in self.live2d_path.iterdir():
-                if model_dir.is_dir():
-                    # Look for .model3.json files
-                    for file in model_dir.iterdir():
-                        if file.suffix == '.json' and 'model3' in file.name:
-                            # Create relative path for API serving
-                            relative_path = f"/api/character/files/live2D/models/{model_dir.name}/{file.name}"
-                            display_name = model_dir.name.replace('_', ' ').replace('-', ' ').title()
-                            
-                            model = CharacterModel(
-                                name=model_dir.name,
-                                path=relative_path,
-                                display_name=display_name,
-                                model_type="live2d"
-                            )
-                            models.append(model.to_dict())
-                            break
-                            
-            logger.info(f"Found {len(models)} Live2D models")
+
+            self.manifest.refresh()
+            models = []
+            for folder_name, folder in sorted(self.manifest.live2d_folders().items()):
+                if not folder["model_file"]:
+                    continue
+                # Create relative path for API serving
+                relative_path = f"/api/character/files/live2D/models/{folder_name}/{folder['model_file']}"
+                display_name = folder_name.replace('_', ' ').replace('-', ' ').title()
+                model_entry = folder["files"].get(f"live2D/models/{folder_name}/{folder['model_file']}", {})
+
+                model = CharacterModel(
+                    name=folder_name,
+                    path=relative_path,
+                    display_name=display_name,
+                    model_type="live2d",
+                    size=sum(entry["size"] for entry in folder["files"].values()),
+                    content_hash=model_entry.get("sha256")
+                )
+                models.append(model.to_dict())
+
+            logger.debug(f"Found {len(models)} Live2D models")
             return models
             
         except Exception as e:
@@ -194,27 +249,29 @@ class CharacterManager:
     def get_vrm_models(self) -> List[Dict[str, Any]]:
         """Get all available VRM models"""
         try:
-            models = []
-            
             if not self.vrm_path.exists():
                 logger.warning(f"VRM models directory does not exist: {self.vrm_path}")
                 return []
-                
-            for file in self.vrm_path.iterdir():
-                if file.is_file() and file.suffix.lower() == '.vrm':
-                    # Create relative path for API serving
-                    relative_path = f"/api/character/files/VRM3D/models/{file.name}"
-                    display_name = file.stem.replace('_', ' ').replace('-', ' ')
-                    
-                    model = CharacterModel(
-                        name=file.name,
-                        path=relative_path,
-                        display_name=display_name,
-                        model_type="vrm"
-                    )
-                    models.append(model.to_dict())
-                    
-            logger.info(f"Found {len(models)} VRM models")
+
+            self.manifest.refresh()
+            models = []
+            for key, entry in sorted(self.manifest.vrm_files().items()):
+                file_name = key.rsplit("/", 1)[1]
+                # Create relative path for API serving
+                relative_path = f"/api/character/files/{key}"
+                display_name = Path(file_name).stem.replace('_', ' ').replace('-', ' ')
+
+                model = CharacterModel(
+                    name=file_name,
+                    path=relative_path,
+                    display_name=display_name,
+                    model_type="vrm",
+                    size=entry["size"],
+                    content_hash=entry.get("sha256")
+                )
+                models.append(model.to_dict())
+
+            logger.debug(f"Found {len(models)} VRM models")
             return models
             
         except Exception as e:
@@ -229,6 +286,10 @@ class CharacterManager:
                 relative_path = file_request_path.replace('/api/character/files/', '')
             else:
                 relative_path = file_request_path
+
+            # Indexed model files were found under the model directories, no stat or resolve needed
+            if self.manifest.get(relative_path) is not None:
+                return self.manifest.absolute_path(relative_path)
             
             # Handle Live2D models
             if relative_path.startswith('live2D/models/'):
@@ -265,13 +326,16 @@ class CharacterManager:
         try:
             # Convert to absolute paths for comparison
             path_abs = path.resolve()
-            base_abs = self.base_path.resolve()
             
             # Check if path is within our base directory
-            return str(path_abs).startswith(str(base_abs))
+            return str(path_abs).startswith(self._base_abs)
         except Exception:
             return False
     
+    def get_file_hash(self, absolute_path: str) -> Optional[Tuple[int, int, str]]:
+        """Get (size, mtime_ns, sha256) of a model file from the manifest, None if not known yet"""
+        return self.manifest.file_hash(absolute_path)
+
     def get_animations_path(self) -> Path:
         """Get the VRM animations directory path"""
         return self.base_path / "VRM3D" / "animations"
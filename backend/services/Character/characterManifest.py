@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, Optional, Tuple
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+# Seconds between directory mtime checks, listings in between are served from memory
+MANIFEST_CHECK_INTERVAL = 5.0
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Prefixes of the file keys, the same relative paths the files are served under
+LIVE2D_PREFIX = "live2D/models"
+VRM_PREFIX = "VRM3D/models"
+
+
+def _mtime(path: Path) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class CharacterManifest:
+    """
+    Index of the character model files with their sizes and content hashes.
+
+    Built once, kept in memory and persisted next to the models so a restart
+    does not rescan or rehash the library. Directory mtimes are checked at most
+    every check_interval seconds and only changed folders are rescanned; files
+    whose size and mtime did not change keep their hash. Hashes of new files
+    are computed on a background thread.
+    """
+
+    def __init__(self, live2d_path: Path, vrm_path: Path, manifest_file: Path,
+                 check_interval: float = MANIFEST_CHECK_INTERVAL):
+        self.live2d_path = live2d_path
+        self.vrm_path = vrm_path
+        self.manifest_file = manifest_file
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        # folder name -> {"dirs": {relative dir: mtime_ns}, "model_file": name or None, "files": {key: entry}}
+        self._live2d: Dict[str, Any] = {"mtime_ns": None, "folders": {}}
+        self._vrm: Dict[str, Any] = {"mtime_ns": None, "files": {}}
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._absolute_files: Dict[str, Dict[str, Any]] = {}
+        self._last_check = 0.0
+        self._hash_thread: Optional[threading.Thread] = None
+        # SHA-256 of files computed before they were indexed (while uploading), by absolute path
+        self._known_hashes: Dict[str, str] = {}
+        self._load()
+
+    def _load(self):
+        if not self.manifest_file.exists():
+            return
+        try:
+            with open(self.manifest_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # A manifest from another install location is rebuilt, keys would not match
+            if (data.get("version") != MANIFEST_VERSION or data.get("live2d_path") != str(self.live2d_path)
+                    or data.get("vrm_path") != str(self.vrm_path)):
+                return
+            self._live2d = data["live2d"]
+            self._vrm = data["vrm"]
+            self._rebuild_index()
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable character manifest {self.manifest_file}: {e}")
+
+    def _save(self):
+        with self._lock:
+            data = json.dumps({
+                "version": MANIFEST_VERSION,
+                "live2d_path": str(self.live2d_path),
+                "vrm_path": str(self.vrm_path),
+                "live2d": self._live2d,
+                "vrm": self._vrm
+            })
+        try:
+            temp_file = self.manifest_file.with_name(self.manifest_file.name + ".tmp")
+            with open(temp_file, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(temp_file, self.manifest_file)
+        except OSError as e:
+            logger.warning(f"Could not save character manifest: {e}")
+
+    def _rebuild_index(self):
+        files = dict(self._vrm["files"])
+        for folder in self._live2d["folders"].values():
+            files.update(folder["files"])
+        self._files = files
+        self._absolute_files = {os.path.abspath(self.absolute_path(key)): entry for key, entry in files.items()}
+
+    def refresh(self, force: bool = False):
+        """Rescan folders whose mtime changed, at most every check_interval seconds unless forced"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+
+            live2d_changed = self._refresh_live2d()
+            vrm_changed = self._refresh_vrm()
+            if live2d_changed or vrm_changed:
+                self._rebuild_index()
+                self._save()
+            missing_hashes = any(entry.get("sha256") is None for entry in self._files.values())
+
+        if missing_hashes:
+            self._start_hashing()
+
+    def _refresh_live2d(self) -> bool:
+        changed = False
+        folders = self._live2d["folders"]
+        root_mtime = _mtime(self.live2d_path)
+        if root_mtime != self._live2d["mtime_ns"]:
+            # Dot directories hold uploads in progress
+            names = ({p.name for p in self.live2d_path.iterdir() if p.is_dir() and not p.name.startswith('.')}
+                     if root_mtime else set())
+            for name in set(folders) - names:
+                del folders[name]
+            for name in names - set(folders):
+                folders[name] = self._scan_live2d_folder(name, None)
+            self._live2d["mtime_ns"] = root_mtime
+            changed = True
+
+        for name, folder in list(folders.items()):
+            folder_path = self.live2d_path / name
+            if any(_mtime(folder_path / relative_dir) != mtime for relative_dir, mtime in folder["dirs"].items()):
+                folders[name] = self._scan_live2d_folder(name, folder)
+                changed = True
+        return changed
+
+    def _scan_live2d_folder(self, name: str, previous: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        folder_path = self.live2d_path / name
+        previous_files = previous["files"] if previous else {}
+        dirs = {}
+        files = {}
+        for root, _, file_names in os.walk(folder_path):
+            relative_dir = os.path.relpath(root, folder_path)
+            relative_dir = "" if relative_dir == "." else relative_dir.replace(os.sep, "/")
+            dirs[relative_dir] = _mtime(Path(root))
+            for file_name in file_names:
+                relative_file = f"{relative_dir}/{file_name}" if relative_dir else file_name
+                key = f"{LIVE2D_PREFIX}/{name}/{relative_file}"
+                files[key] = self._file_entry(Path(root) / file_name, previous_files.get(key))
+
+        top_level_files = sorted(key.rsplit("/", 1)[1] for key in files
+                                 if key.count("/") == LIVE2D_PREFIX.count("/") + 2)
+        model_file = next((f for f in top_level_files if f.endswith(".json") and "model3" in f), None)
+        logger.debug(f"Indexed Live2D model folder {name}: {len(files)} files")
+        return {"dirs": dirs, "model_file": model_file, "files": files}
+
+    def _refresh_vrm(self) -> bool:
+        root_mtime = _mtime(self.vrm_path)
+        if root_mtime == self._vrm["mtime_ns"]:
+            return False
+        previous_files = self._vrm["files"]
+        files = {}
+        if root_mtime:
+            for file in self.vrm_path.iterdir():
+                if file.is_file() and file.suffix.lower() == '.vrm':
+                    key = f"{VRM_PREFIX}/{file.name}"
+                    files[key] = self._file_entry(file, previous_files.get(key))
+        self._vrm = {"mtime_ns": root_mtime, "files": files}
+        return True
+
+    def _file_entry(self, path: Path, previous: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        stat_result = os.stat(path)
+        if previous and (previous["size"], previous["mtime_ns"]) == (stat_result.st_size, stat_result.st_mtime_ns):
+            return previous
+        return {"size": stat_result.st_size, "mtime_ns": stat_result.st_mtime_ns,
+                "sha256": self._known_hashes.pop(os.path.abspath(path), None)}
+
+    def _start_hashing(self):
+        with self._lock:
+            if self._hash_thread and self._hash_thread.is_alive():
+                return
+            self._hash_thread = threading.Thread(target=self._hash_missing, name="character-manifest-hash",
+                                                 daemon=True)
+            self._hash_thread.start()
+
+    def _hash_missing(self):
+        with self._lock:
+            pending = [(key, entry) for key, entry in self._files.items() if entry.get("sha256") is None]
+
+        hashed = 0
+        for key, entry in pending:
+            path = self.absolute_path(key)
+            try:
+                sha256 = hashlib.sha256()
+                with open(path, "rb") as f:
+                    while chunk := f.read(HASH_CHUNK_SIZE):
+                        sha256.update(chunk)
+                stat_result = os.stat(path)
+            except OSError:
+                continue  # Deleted meanwhile, the next refresh drops it
+
+            with self._lock:
+                # Only keep the hash if the file was not replaced while it was read
+                if (self._files.get(key) is entry
+                        and (entry["size"], entry["mtime_ns"]) == (stat_result.st_size, stat_result.st_mtime_ns)):
+                    entry["sha256"] = sha256.hexdigest()
+                    hashed += 1
+
+        if hashed:
+            logger.debug(f"Hashed {hashed} character model files")
+            self._save()
+
+    def invalidate(self, path: Path, hashes: Optional[Dict[str, str]] = None):
+        """
+        Rescan the folder (Live2D) or directory (VRM) containing path.
+
+        Called after uploads and deletes, which can replace files without
+        changing any directory mtime. Unchanged files keep their hashes.
+
+        Args:
+            path: Changed file or folder
+            hashes: SHA-256 of new files by path, already computed while uploading so they are not read again
+        """
+        with self._lock:
+            self._known_hashes.update({os.path.abspath(p): sha256 for p, sha256 in (hashes or {}).items() if sha256})
+            try:
+                name = path.relative_to(self.live2d_path).parts[0]
+                folder = self._live2d["folders"].get(name)
+                if folder:
+                    folder["dirs"] = {relative_dir: None for relative_dir in folder["dirs"]}
+                self._live2d["mtime_ns"] = None
+            except (ValueError, IndexError):
+                pass
+            try:
+                path.relative_to(self.vrm_path)
+                self._vrm["mtime_ns"] = None
+            except ValueError:
+                pass
+            self.refresh(force=True)
+            self._known_hashes.clear()
+
+    def live2d_folders(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return dict(self._live2d["folders"])
+
+    def vrm_files(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return dict(self._vrm["files"])
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get the entry of a file by its served relative path, e.g. "VRM3D/models/a.vrm" """
+        return self._files.get(key)
+
+    def file_hash(self, absolute_path: str) -> Optional[Tuple[int, int, str]]:
+        """Get (size, mtime_ns, sha256) of an indexed file by absolute path, if its hash is known"""
+        entry = self._absolute_files.get(os.path.abspath(absolute_path))
+        if entry is None or entry.get("sha256") is None:
+            return None
+        return entry["size"], entry["mtime_ns"], entry["sha256"]
+
+    def absolute_path(self, key: str) -> Path:
+        if key.startswith(LIVE2D_PREFIX + "/"):
+            return self.live2d_path / key[len(LIVE2D_PREFIX) + 1:]
+        return self.vrm_path / key[len(VRM_PREFIX) + 1:]
@@ -1,5 +1,6 @@
 import pytchat
 import asyncio
+from ..lib.broadcast_hub import broadcast_hub, STREAM_CHAT_CHANNEL
 
 class ChatFetch:
     def __init__(self):
@@ -7,7 +8,7 @@ class ChatFetch:
         self.running = False
         self.video_id = ""
 
-    async def start_fetching(self, websocket_clients):
+    async def start_fetching(self):
         if self.running:
             print("Terminating the previous chat fetch process.")
             self.stop_fetching()
@@ -22,7 +23,7 @@ class ChatFetch:
                         "author": c.author.name,
                         "message": c.message
                     }
-                    asyncio.create_task(self.broadcast_message(message, websocket_clients))
+                    broadcast_hub.publish(STREAM_CHAT_CHANNEL, message)
                 await asyncio.sleep(2) 
         except Exception as e:
             print(f"Error in ChatFetch: {e}")
@@ -33,10 +34,3 @@ class ChatFetch:
         self.running = False
         if self.chat:
             self.chat.terminate()
-
-    async def broadcast_message(self, message, websocket_clients):
-        for websocket in list(websocket_clients):
-            try:
-                await websocket.send_json(message)
-            except Exception:
-                websocket_clients.remove(websocket)
\ No newline at end of file
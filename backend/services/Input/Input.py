@@ -1,5 +1,6 @@
 import asyncio
 import os
+import time
 import wave
 from fastapi import WebSocket
 import sounddevice as sd
@@ -8,6 +9,10 @@ import torch
 from faster_whisper import WhisperModel
 from silero_vad import load_silero_vad, VADIterator
 from ..lib.LAV_logger import logger
+from ..lib.inference_executor import inference_executor
+from ..lib.metrics import VAD_TO_ASR_SECONDS, ASR_REAL_TIME_FACTOR
+from ..lib.tracing import tracer
+from ..lib.broadcast_hub import broadcast_hub, AUDIO_CHANNEL, COALESCE
 
 
 class VoiceInput:
@@ -25,14 +30,15 @@ class VoiceInput:
     PRE_SPEECH_SAMPLES = 0.5 * SAMPLING_RATE
     POST_SPEECH_SAMPLES = 0.5 * SAMPLING_RATE
 
-    vad_model = load_silero_vad()
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    whisper_model = WhisperModel("medium", device=device)
-
-    vad_iterator = VADIterator(vad_model, sampling_rate=SAMPLING_RATE)
     running = False
 
     def __init__(self):
+        # Models are loaded per instance so importing this module stays cheap
+        self.vad_model = load_silero_vad()
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.whisper_model = WhisperModel("medium", device=self.device)
+        self.vad_iterator = VADIterator(self.vad_model, sampling_rate=self.SAMPLING_RATE)
+
         self._reset_buffers()
         self.last_transcription = None
 
@@ -41,8 +47,11 @@ class VoiceInput:
         self.tmp_audio_buffer = []
         self.silent_samples = 0
         self.started_speaking = False
+        # Wall clock times used for the trace of the utterance
+        self.speech_start_time = None
+        self.last_speech_time = None
 
-    async def start_streaming(self, clients):
+    async def start_streaming(self):
         if self.running:
             return
         self.running = True
@@ -53,7 +62,7 @@ class VoiceInput:
         def audio_callback(indata, frames, time, status):
             audio_np = indata.flatten().astype(np.float32) / 32768.0
             asyncio.run_coroutine_threadsafe(
-                self._process_audio(audio_np, clients), loop
+                self._process_audio(audio_np), loop
             )
 
         with sd.InputStream(samplerate=self.SAMPLING_RATE, channels=1, dtype='int16', callback=audio_callback):
@@ -65,7 +74,7 @@ class VoiceInput:
     def stop_streaming(self):
         self.running = False
 
-    async def _process_audio(self, audio_np, clients):
+    async def _process_audio(self, audio_np):
         self.tmp_audio_buffer.extend(audio_np)
 
         while len(self.tmp_audio_buffer) >= 512:
@@ -74,11 +83,9 @@ class VoiceInput:
 
             speech_prob = self.vad_model(torch.from_numpy(chunk), self.SAMPLING_RATE).item()
 
-            # Broadcast to all connected clients
-            await asyncio.gather(*[
-                client.send_json({"type": "probability", "probability": speech_prob})
-                for client in clients
-            ])
+            # Queued per client and never awaited, a slow client only misses intermediate values
+            broadcast_hub.publish(AUDIO_CHANNEL, {"type": "probability", "probability": speech_prob},
+                                  COALESCE, "probability")
 
             if speech_prob < self.SPEECH_THRESHOLD:
                 if self.silent_samples <= self.SILENCE_WAIT_TIME:
@@ -88,7 +95,9 @@ class VoiceInput:
                 if not self.started_speaking:
                     pre = self.sentence_audio_buffer[-int(self.PRE_SPEECH_SAMPLES):]
                     self.sentence_audio_buffer = list(pre)
+                    self.speech_start_time = time.time()
                 self.started_speaking = True
+                self.last_speech_time = time.time()
 
             if self.started_speaking:
                 self.sentence_audio_buffer.extend(chunk)
@@ -96,18 +105,34 @@ class VoiceInput:
             if self.started_speaking and self.silent_samples > self.SILENCE_WAIT_TIME:
                 post = self.tmp_audio_buffer[:int(self.POST_SPEECH_SAMPLES)]
                 self.sentence_audio_buffer.extend(post)
+                sentence_audio = np.array(self.sentence_audio_buffer)
 
-                transcribed_text = self.process_speech(np.array(self.sentence_audio_buffer))
-                if transcribed_text and transcribed_text not in self.whisper_filter_list:
-                    if transcribed_text != self.last_transcription:
-                        self.last_transcription = transcribed_text  
-                        await asyncio.gather(*[
-                            client.send_json({"type": "transcription", "text": transcribed_text})
-                            for client in clients
-                        ])
+                # The utterance starts a new turn, the client passes its ID on to later requests
+                turn_id = tracer.new_turn_id()
+                speech_end_time = time.time()
+                tracer.add_span("vad.speech", self.speech_start_time, self.last_speech_time, turn_id)
+                tracer.add_span("vad.tail_wait", self.last_speech_time, speech_end_time, turn_id)
 
+                # Reset before handing off so VAD keeps running while Whisper transcribes
                 self.vad_iterator.reset_states()
                 self._reset_buffers()
+                asyncio.create_task(self._transcribe_and_broadcast(sentence_audio, speech_end_time, turn_id))
+
+    async def _transcribe_and_broadcast(self, audio_data, speech_end_time, turn_id):
+        """Transcribe on the ASR worker (FIFO, one at a time) and send the result to clients"""
+        with tracer.turn(turn_id):
+            try:
+                transcribed_text = await inference_executor.run(self.process_speech, audio_data, pool="asr")
+            except Exception as e:
+                logger.error(f"Error transcribing speech: {e}", exc_info=True)
+                return
+        VAD_TO_ASR_SECONDS.observe(time.time() - speech_end_time)
+
+        if transcribed_text and transcribed_text not in self.whisper_filter_list:
+            if transcribed_text != self.last_transcription:
+                self.last_transcription = transcribed_text
+                broadcast_hub.publish(AUDIO_CHANNEL, {"type": "transcription", "text": transcribed_text,
+                                                      "turn_id": turn_id})
 
     def process_speech(self, audio_data):
         with wave.open(self.MIC_OUTPUT_PATH, "wb") as wf:
@@ -117,9 +142,13 @@ class VoiceInput:
             wf.writeframes((audio_data * 32768.0).astype(np.int16).tobytes())
 
         transcribed_text = ''
-        segments, _ = self.whisper_model.transcribe(self.MIC_OUTPUT_PATH, language=self.input_language)
-        for segment in segments:
-            transcribed_text += segment.text
+        start_time = time.perf_counter()
+        with tracer.span("asr.transcribe", audio_seconds=round(len(audio_data) / self.SAMPLING_RATE, 2)):
+            segments, _ = self.whisper_model.transcribe(self.MIC_OUTPUT_PATH, language=self.input_language)
+            for segment in segments:
+                transcribed_text += segment.text
+        if len(audio_data):
+            ASR_REAL_TIME_FACTOR.observe((time.perf_counter() - start_time) / (len(audio_data) / self.SAMPLING_RATE))
 
         if not transcribed_text or transcribed_text.strip().lower() in self.whisper_filter_list:
             return
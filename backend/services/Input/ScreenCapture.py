@@ -0,0 +1,309 @@
+import asyncio
+import hashlib
+import io
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+import mss
+from fastapi import WebSocket, WebSocketDisconnect
+from PIL import Image
+from ..lib.LAV_logger import logger
+from ..lib.inference_executor import inference_executor
+
+# Encodings offered to clients, PNG is kept for the legacy JSON endpoint
+MEDIA_TYPES = {
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+    "png": "image/png",
+}
+DEFAULT_FORMAT = "jpeg"
+DEFAULT_MAX_DIMENSION = 1280
+DEFAULT_QUALITY = 75
+DEFAULT_STREAM_FPS = 2.0
+MAX_STREAM_FPS = 30.0
+
+
+@dataclass
+class Frame:
+    """A captured screen frame, data is None when the content did not change"""
+    hash: str
+    width: int
+    height: int
+    media_type: str
+    data: Optional[bytes]
+    image: Image.Image
+    capture_time: float
+
+    @property
+    def changed(self) -> bool:
+        return self.data is not None
+
+
+def validate_frame_options(format: str, max_dimension: int, quality: int) -> Optional[str]:
+    """Check client supplied encoding options, returns an error message if they are invalid"""
+    if format not in MEDIA_TYPES:
+        return f"Format must be one of {', '.join(MEDIA_TYPES)}"
+    if max_dimension < 0:
+        return "max_dimension must be 0 (original size) or positive"
+    if not 1 <= quality <= 100:
+        return "Quality must be between 1 and 100"
+    return None
+
+
+class ScreenCapture:
+    """
+    Screen capture and encoding for the screenshot endpoints.
+
+    Frames are downscaled to a maximum dimension before they are hashed and
+    encoded, so an unchanged screen costs a capture and a hash but no encode,
+    and a changed one is sent as a compact JPEG/WebP instead of a full
+    resolution PNG.
+    """
+
+    def __init__(self):
+        # mss handles are bound to the thread that created them
+        self._local = threading.local()
+
+    def _sct(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = self._local.sct = mss.mss()
+        return sct
+
+    def capture(self, monitor_index: int = 1) -> Image.Image:
+        """
+        Capture a monitor as an RGB image.
+
+        Args:
+            monitor_index: Index of the monitor to capture, 0 is all monitors combined
+
+        Returns:
+            Image.Image: The captured image
+        """
+        monitors = self._sct().monitors
+        if monitor_index < 0 or monitor_index >= len(monitors):
+            logger.warning(f"Monitor index {monitor_index} not available. Available monitors: 0-{len(monitors)-1}")
+            monitor_index = 1 if len(monitors) > 1 else 0
+        screenshot = self._sct().grab(monitors[monitor_index])
+        return Image.frombytes("RGB", (screenshot.width, screenshot.height), screenshot.rgb)
+
+    def resize(self, image: Image.Image, max_dimension: int) -> Image.Image:
+        """Downscale so the longest side is at most max_dimension, 0 keeps the original size"""
+        if max_dimension <= 0 or max(image.size) <= max_dimension:
+            return image
+        image = image.copy()
+        # reducing_gap does a fast integer reduce first, then a bilinear pass
+        image.thumbnail((max_dimension, max_dimension), Image.Resampling.BILINEAR, reducing_gap=2.0)
+        return image
+
+    def content_hash(self, image: Image.Image) -> str:
+        return hashlib.blake2b(image.tobytes(), digest_size=16).hexdigest()
+
+    def encode(self, image: Image.Image, format: str = DEFAULT_FORMAT, quality: int = DEFAULT_QUALITY) -> bytes:
+        buffer = io.BytesIO()
+        if format == "png":
+            image.save(buffer, format="PNG")
+        elif format == "webp":
+            image.save(buffer, format="WEBP", quality=quality, method=0)
+        else:
+            image.save(buffer, format="JPEG", quality=quality)
+        return buffer.getvalue()
+
+    def grab_frame(self, monitor_index: int = 1, max_dimension: int = DEFAULT_MAX_DIMENSION,
+                   format: str = DEFAULT_FORMAT, quality: int = DEFAULT_QUALITY,
+                   last_hash: Optional[str] = None) -> Frame:
+        """
+        Capture, downscale and encode a frame, skipping the encode if nothing changed.
+
+        Args:
+            monitor_index: Index of the monitor to capture
+            max_dimension: Maximum width or height of the sent image, 0 keeps the original size
+            format: "jpeg", "webp" or "png"
+            quality: Encoder quality for JPEG and WebP (1-100)
+            last_hash: Hash of the frame the client already has
+
+        Returns:
+            Frame: The frame, its data is None when the hash matches last_hash. The hash
+            covers the encoding options, so the same screen in another format is sent again.
+        """
+        capture_time = time.time()
+        image = self.capture(monitor_index)
+        resized = self.resize(image, max_dimension)
+        frame_hash = f"{self.content_hash(resized)}-{format}-{quality}-{max_dimension}"
+        data = None if frame_hash == last_hash else self.encode(resized, format, quality)
+        return Frame(frame_hash, resized.width, resized.height, MEDIA_TYPES[format], data, image, capture_time)
+
+
+class ScreenStream:
+    """
+    WebSocket stream of screen frames at a target FPS.
+
+    Only frames whose content changed since the last delivered one are sent.
+    OCR and captioning run on the vision service in the background for the
+    latest changed frame and are sent as separate small messages, so a slow
+    analysis never holds back frames.
+    """
+
+    def __init__(self, screen_capture: ScreenCapture, vision_input=None):
+        """
+        Initialize the stream handler.
+
+        Args:
+            screen_capture: Capture used for the frames
+            vision_input: Optional VisionInput service handle used for OCR and captions
+        """
+        self.screen_capture = screen_capture
+        self.vision_input = vision_input
+
+    async def serve(self, websocket: WebSocket):
+        """
+        Handle a screen stream WebSocket until the client disconnects.
+
+        Client messages:
+            {"type": "start", "monitor_index": 1, "fps": 2, "max_dimension": 1280, "quality": 75,
+             "format": "jpeg", "ocr": false, "caption": false, "ocr_scale_factor": 0.5}
+                starts streaming, or changes the options of a running stream
+            {"type": "stop"}
+
+        Server messages:
+            {"type": "frame", "index": n, "hash": ..., "width": w, "height": h, "media_type": ..., "size": bytes}
+                followed by one binary frame containing the image
+            {"type": "analysis", "hash": ..., "caption": ..., "extracted_text": ..., "ocr_count": n}
+            {"type": "error", "error": ...}
+        """
+        send_lock = asyncio.Lock()
+        stream_task: Optional[asyncio.Task] = None
+
+        async def send_json(message: Dict[str, Any]):
+            async with send_lock:
+                await websocket.send_json(message)
+
+        async def send_frame(header: Dict[str, Any], data: bytes):
+            # Header and payload must not be interleaved with other messages
+            async with send_lock:
+                await websocket.send_json(header)
+                await websocket.send_bytes(data)
+
+        async def stop_stream():
+            if stream_task and not stream_task.done():
+                stream_task.cancel()
+                try:
+                    await stream_task
+                except (asyncio.CancelledError, Exception):
+                    pass
+
+        try:
+            while True:
+                try:
+                    message = json.loads(await websocket.receive_text())
+                    if not isinstance(message, dict):
+                        raise ValueError("Messages must be JSON objects")
+                    message_type = message.get("type")
+                    if message_type == "start":
+                        options = {
+                            "monitor_index": int(message.get("monitor_index", 1)),
+                            "fps": min(max(float(message.get("fps", DEFAULT_STREAM_FPS)), 0.1), MAX_STREAM_FPS),
+                            "max_dimension": int(message.get("max_dimension", DEFAULT_MAX_DIMENSION)),
+                            "quality": int(message.get("quality", DEFAULT_QUALITY)),
+                            "format": message.get("format", DEFAULT_FORMAT),
+                            "ocr": bool(message.get("ocr", False)),
+                            "caption": bool(message.get("caption", False)),
+                            "ocr_scale_factor": min(max(float(message.get("ocr_scale_factor", 0.5)), 0.1), 1.0),
+                        }
+                        error = validate_frame_options(options["format"], options["max_dimension"], options["quality"])
+                except (ValueError, TypeError, KeyError) as e:
+                    # Malformed messages (binary frames raise KeyError) are answered, a running stream continues
+                    await send_json({"type": "error", "error": f"Invalid message: {e}"})
+                    continue
+
+                if message_type == "stop":
+                    await stop_stream()
+                elif message_type == "start":
+                    if error:
+                        await send_json({"type": "error", "error": error})
+                        continue
+                    await stop_stream()
+                    stream_task = asyncio.create_task(self._stream(options, send_json, send_frame))
+                else:
+                    await send_json({"type": "error", "error": f"Unknown message type: {message_type}"})
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            logger.error(f"Screen stream WebSocket closed by an unexpected error: {e}", exc_info=True)
+        finally:
+            await stop_stream()
+
+    async def _stream(self, options: Dict[str, Any], send_json, send_frame):
+        interval = 1.0 / options["fps"]
+        analyze = options["ocr"] or options["caption"]
+        analysis_task: Optional[asyncio.Task] = None
+        last_hash = None
+        index = 0
+        next_time = time.monotonic()
+
+        try:
+            while True:
+                try:
+                    frame = await inference_executor.run(
+                        self.screen_capture.grab_frame, options["monitor_index"], options["max_dimension"],
+                        options["format"], options["quality"], last_hash, pool="capture")
+                except Exception as e:
+                    logger.error(f"Screen stream capture failed: {e}", exc_info=True)
+                    await send_json({"type": "error", "error": f"Failed to capture screenshot: {e}"})
+                    return
+
+                if frame.changed:
+                    last_hash = frame.hash
+                    await send_frame({"type": "frame", "index": index, "hash": frame.hash,
+                                      "width": frame.width, "height": frame.height,
+                                      "media_type": frame.media_type, "size": len(frame.data)}, frame.data)
+                    index += 1
+                    # Only the latest changed frame is analyzed, frames arriving meanwhile are not queued
+                    if analyze and (analysis_task is None or analysis_task.done()):
+                        analysis_task = asyncio.create_task(self._analyze(frame, options, send_json))
+
+                # Fixed rate schedule, a slow capture delays the next frame instead of queueing frames
+                next_time = max(next_time + interval, time.monotonic())
+                await asyncio.sleep(next_time - time.monotonic())
+        finally:
+            if analysis_task and not analysis_task.done():
+                analysis_task.cancel()
+
+    async def _analyze(self, frame: Frame, options: Dict[str, Any], send_json):
+        if self.vision_input is None:
+            return
+        if not self.vision_input.is_ready():
+            # Load in the background, later frames are analyzed once it is ready
+            self.vision_input.warm()
+            return
+
+        try:
+            ocr_results = []
+            caption = None
+            if options["ocr"]:
+                ocr_results = await inference_executor.run(
+                    self.vision_input.perform_ocr, frame.image, 0.5, options["ocr_scale_factor"], pool="vision")
+            if options["caption"]:
+                caption = await inference_executor.run(self.vision_input.generate_caption, frame.image, pool="vision")
+            await send_json({
+                "type": "analysis",
+                "hash": frame.hash,
+                "caption": caption or "",
+                "extracted_text": self.vision_input.get_detected_text(ocr_results),
+                "ocr_count": len(ocr_results)
+            })
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Screen analysis failed: {e}", exc_info=True)
+
+
+if __name__ == "__main__":
+    screen_capture = ScreenCapture()
+    first = screen_capture.grab_frame(monitor_index=1)
+    logger.info(f"Captured {first.image.size} -> {first.width}x{first.height} {first.media_type}, "
+                f"{len(first.data) / 1024:.1f} KB")
+    second = screen_capture.grab_frame(monitor_index=1, last_hash=first.hash)
+    logger.info(f"Second frame changed: {second.changed}")
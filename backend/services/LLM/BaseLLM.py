@@ -1,7 +1,18 @@
 from abc import ABC, abstractmethod
 from typing import Generator
 
+CHAT_MAX_TOKENS = 1024
+# Continuing a response allows longer completions
+CONTINUE_MAX_TOKENS = 2048
+
 class BaseLLM(ABC):
+    # Implements complete_current_response to continue the last assistant message
+    supports_continuation = False
+    # Cheap enough to create one instance per context slot
+    supports_slots = False
+    # get_chat_completion takes a screenshot flag and answers about the screen
+    supports_screenshots = False
+
     @abstractmethod
     def get_chat_completion(self, text, history, system_prompt) -> Generator[str, None, None]:
-        pass
\ No newline at end of file
+        pass
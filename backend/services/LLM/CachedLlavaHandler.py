@@ -0,0 +1,130 @@
+import ctypes
+import io
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+from PIL import Image
+from llama_cpp.llama_chat_format import Llava16ChatHandler
+from llama_cpp._utils import suppress_stdout_stderr
+from services.lib.LAV_logger import logger
+from services.lib.metrics import VISION_EMBEDDING_CACHE_TOTAL
+
+# CLIP embeddings kept in memory, a LLaVA 1.6 image is up to 2880 positions of 4096 floats (~47 MB)
+DEFAULT_EMBEDDING_CACHE_SIZE = 4
+# Side of the grayscale grid the difference hash is computed on, 16 gives a 256 bit hash
+DEFAULT_HASH_SIZE = 16
+# URL scheme of images registered in memory, they never go through a data URI
+MEMORY_URL_PREFIX = "memory://"
+
+
+def perceptual_hash(image: Image.Image, hash_size: int = DEFAULT_HASH_SIZE) -> str:
+    """
+    Difference hash of an image.
+
+    Compares the brightness of neighbouring pixels on a small grayscale
+    thumbnail, so re-encoding, rescaling and tiny changes such as a blinking
+    cursor give the same hash while a different screen does not.
+    """
+    thumbnail = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = thumbnail.tobytes()
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for column in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + column] > pixels[offset + column + 1])
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+class CachedLlava16ChatHandler(Llava16ChatHandler):
+    """
+    LLaVA 1.6 chat handler that keeps CLIP image embeddings between turns.
+
+    Embeddings are cached in an LRU keyed by the perceptual hash of the
+    image, so asking again about the same screen skips the vision encoder.
+    Images can be registered in memory with add_image() and referenced by
+    the returned URL, which skips the base64 data URI round trip and, on a
+    cache hit, encoding the image at all.
+    """
+
+    def __init__(self, clip_model_path: str, verbose: bool = False,
+                 cache_size: int = DEFAULT_EMBEDDING_CACHE_SIZE, hash_size: int = DEFAULT_HASH_SIZE):
+        super().__init__(clip_model_path=clip_model_path, verbose=verbose)
+        # The newest embedding is in use by the running completion, it is never evicted
+        self.cache_size = max(1, cache_size)
+        self.hash_size = hash_size
+        self._embeddings: "OrderedDict[str, Any]" = OrderedDict()
+        self._images: Dict[str, Tuple[Image.Image, Callable[[Image.Image], bytes]]] = {}
+        self._next_key: Optional[str] = None
+        self._lock = threading.Lock()
+        self._exit_stack.callback(self.clear_cache)
+
+    def add_image(self, image: Image.Image, encode: Callable[[Image.Image], bytes]) -> str:
+        """
+        Register an image for the next chat completion.
+
+        Args:
+            image: Image as it should be seen by the model
+            encode: Called with the image to get its encoded bytes (PNG or JPEG), skipped on a cache hit
+
+        Returns:
+            URL to use as the image_url of a message
+        """
+        key = perceptual_hash(image, self.hash_size)
+        self._images[key] = (image, encode)
+        return MEMORY_URL_PREFIX + key
+
+    def load_image(self, image_url: str) -> bytes:
+        if image_url.startswith(MEMORY_URL_PREFIX):
+            key = image_url[len(MEMORY_URL_PREFIX):]
+            self._next_key = key
+            image, encode = self._images.pop(key)
+            with self._lock:
+                if key in self._embeddings:
+                    return b""
+            return encode(image)
+        self._next_key = None
+        return super().load_image(image_url)
+
+    def _embed_image_bytes(self, image_bytes: bytes, n_threads_batch: int = 1):
+        key, self._next_key = self._next_key, None
+        if key is None:
+            # Images sent as data URIs or links are hashed after decoding
+            key = perceptual_hash(Image.open(io.BytesIO(image_bytes)), self.hash_size)
+
+        with self._lock:
+            embed = self._embeddings.get(key)
+            if embed is not None:
+                self._embeddings.move_to_end(key)
+        if embed is not None:
+            VISION_EMBEDDING_CACHE_TOTAL.inc(result="hit")
+            return embed
+        VISION_EMBEDDING_CACHE_TOTAL.inc(result="miss")
+        start_time = time.time()
+        with suppress_stdout_stderr(disable=self.verbose):
+            embed = self._llava_cpp.llava_image_embed_make_with_bytes(
+                self.clip_ctx,
+                n_threads_batch,
+                (ctypes.c_uint8 * len(image_bytes)).from_buffer(bytearray(image_bytes)),
+                len(image_bytes),
+            )
+        logger.debug(f"CLIP encoded image {key[:8]} in {time.time() - start_time:.2f}s")
+
+        evicted = []
+        with self._lock:
+            self._embeddings[key] = embed
+            while len(self._embeddings) > self.cache_size:
+                evicted.append(self._embeddings.popitem(last=False)[1])
+        self._free(evicted)
+        return embed
+
+    def _free(self, embeds):
+        with suppress_stdout_stderr(disable=self.verbose):
+            for embed in embeds:
+                self._llava_cpp.llava_image_embed_free(embed)
+
+    def clear_cache(self):
+        with self._lock:
+            evicted = list(self._embeddings.values())
+            self._embeddings.clear()
+        self._free(evicted)
@@ -0,0 +1,87 @@
+import random
+import re
+import time
+import zlib
+from typing import Dict, Generator, List
+from services.lib.LAV_logger import logger
+from .BaseLLM import BaseLLM, CHAT_MAX_TOKENS, CONTINUE_MAX_TOKENS
+from .TokenBudget import TokenBudget
+
+# Model "type" of the fake backend, see LLM.register_backend
+FAKE_MODEL_TYPE = "fake"
+# Words, single punctuation marks and ChatML special tokens, close enough to a BPE vocabulary for counting
+TOKEN_PATTERN = re.compile(r"<\|im_(?:start|end)\|>|\w+|[^\w\s]")
+# Reply length when the model would otherwise run to max_tokens
+DEFAULT_REPLY_TOKENS = 48
+
+
+def tokenize(text: str) -> List[int]:
+    """Deterministic token ids, stable across processes unlike hash()"""
+    return [zlib.crc32(token.encode("utf-8")) & 0xFFFF for token in TOKEN_PATTERN.findall(text)]
+
+
+def format_chatml(messages: List[Dict[str, str]], add_generation_prompt: bool = True) -> str:
+    prompt = "".join(f"<|im_start|>{message['role']}\n{message['content']}<|im_end|>\n" for message in messages)
+    return prompt + "<|im_start|>assistant\n" if add_generation_prompt else prompt
+
+
+class FakeLLM(BaseLLM):
+    """
+    Deterministic stand-in for TextLLM that needs no model file.
+
+    It trims and templates the prompt the same way TextLLM does, then streams
+    words picked from the prompt with a generator seeded by the prompt (or by
+    a fixed seed). Prefill and decode can be given a simulated cost per token,
+    zero by default so benchmarks measure only the orchestration around the
+    model: trimming, templating, slots and the streaming wrapper.
+    """
+    supports_continuation = True
+    supports_slots = True
+
+    def __init__(self, n_ctx: int = 4096, reply_tokens: int = DEFAULT_REPLY_TOKENS,
+                 prefill_seconds_per_token: float = 0.0, decode_seconds_per_token: float = 0.0):
+        """
+        Args:
+            n_ctx: Context length the prompt is trimmed to
+            reply_tokens: Tokens streamed per reply, capped by max_tokens
+            prefill_seconds_per_token: Simulated prompt processing time per prompt token
+            decode_seconds_per_token: Simulated generation time per streamed token
+        """
+        self.context_length = n_ctx
+        self.reply_tokens = reply_tokens
+        self.prefill_seconds_per_token = prefill_seconds_per_token
+        self.decode_seconds_per_token = decode_seconds_per_token
+        self.token_budget = TokenBudget(tokenize, n_ctx)
+
+    def generate(self, prompt: str, max_tokens: int, seed: int = -1) -> Generator[str, None, None]:
+        """Stream the reply to a templated prompt"""
+        prompt_tokens = TOKEN_PATTERN.findall(prompt)
+        if self.prefill_seconds_per_token:
+            time.sleep(len(prompt_tokens) * self.prefill_seconds_per_token)
+        words = [token for token in prompt_tokens if token[0].isalnum()] or ["..."]
+        rng = random.Random(seed if seed >= 0 else zlib.crc32(prompt.encode("utf-8")))
+        for index in range(min(self.reply_tokens, max_tokens)):
+            if self.decode_seconds_per_token:
+                time.sleep(self.decode_seconds_per_token)
+            yield (" " if index else "") + rng.choice(words)
+
+    def get_chat_completion(self, text: str, history: list = [], system_prompt: str = "",
+                            top_k: int = 40, top_p: float = 0.95, min_p: float = 0.05,
+                            repeat_penalty: float = 1.1, temperature: float = 0.8, seed: int = -1) -> Generator[str, None, None]:
+        messages = [{"role": "system", "content": system_prompt}, *history, {"role": "user", "content": text}]
+        messages = self.token_budget.trim(messages, max_tokens=CHAT_MAX_TOKENS)
+        prompt = format_chatml(messages)
+        logger.debug(f"Fake completion of {len(messages)} messages, seed {seed}")
+        yield from self.generate(prompt, CHAT_MAX_TOKENS, seed)
+
+    def complete_current_response(self, history: List[Dict[str, str]], system_prompt: str = "",
+                                  top_k: int = 40, top_p: float = 0.95, min_p: float = 0.05,
+                                  repeat_penalty: float = 1.1, temperature: float = 0.8, seed: int = -1) -> Generator[str, None, None]:
+        if not history:
+            logger.warning("No history provided to complete")
+            return
+        messages = [{"role": "system", "content": system_prompt}, *history]
+        messages = self.token_budget.trim(messages, max_tokens=CONTINUE_MAX_TOKENS)
+        # The last message stays open so the reply continues it, as in TextLLM
+        prompt = format_chatml(messages, add_generation_prompt=False)[:-len("<|im_end|>\n")]
+        yield from self.generate(prompt, CONTINUE_MAX_TOKENS, seed)
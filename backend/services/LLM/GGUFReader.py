@@ -0,0 +1,155 @@
+import struct
+from dataclasses import dataclass, asdict
+from typing import Any, BinaryIO, Dict, Optional
+
+GGUF_MAGIC = b"GGUF"
+
+# GGUF metadata value types
+UINT8, INT8, UINT16, INT16, UINT32, INT32, FLOAT32, BOOL, STRING, ARRAY, UINT64, INT64, FLOAT64 = range(13)
+SCALAR_FORMATS = {
+    UINT8: "<B", INT8: "<b", UINT16: "<H", INT16: "<h", UINT32: "<I", INT32: "<i",
+    FLOAT32: "<f", BOOL: "<?", UINT64: "<Q", INT64: "<q", FLOAT64: "<d",
+}
+
+# general.file_type values (llama_ftype) to the names used in GGUF file names
+FILE_TYPES = {
+    0: "F32", 1: "F16", 2: "Q4_0", 3: "Q4_1", 7: "Q8_0", 8: "Q5_0", 9: "Q5_1",
+    10: "Q2_K", 11: "Q3_K_S", 12: "Q3_K_M", 13: "Q3_K_L", 14: "Q4_K_S", 15: "Q4_K_M",
+    16: "Q5_K_S", 17: "Q5_K_M", 18: "Q6_K", 19: "IQ2_XXS", 20: "IQ2_XS", 21: "Q2_K_S",
+    22: "IQ3_XS", 23: "IQ3_XXS", 24: "IQ1_S", 25: "IQ4_NL", 26: "IQ3_S", 27: "IQ3_M",
+    28: "IQ2_S", 29: "IQ2_M", 30: "IQ4_XS", 31: "IQ1_M", 32: "BF16",
+}
+
+
+@dataclass
+class GGUFInfo:
+    """Model facts read from a GGUF header"""
+    architecture: Optional[str] = None
+    name: Optional[str] = None
+    parameter_count: int = 0
+    quantization: Optional[str] = None
+    context_length: Optional[int] = None
+    embedding_length: Optional[int] = None
+    block_count: Optional[int] = None
+    head_count: Optional[int] = None
+    head_count_kv: Optional[int] = None
+    chat_template: Optional[str] = None
+    version: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "GGUFInfo":
+        return cls(**{name: data.get(name) for name in cls.__dataclass_fields__ if name in data})
+
+
+class _Reader:
+    def __init__(self, file: BinaryIO):
+        self.file = file
+
+    def unpack(self, format: str):
+        size = struct.calcsize(format)
+        data = self.file.read(size)
+        if len(data) != size:
+            raise ValueError("Unexpected end of GGUF header")
+        return struct.unpack(format, data)[0]
+
+    def string(self) -> str:
+        length = self.unpack("<Q")
+        return self.file.read(length).decode("utf-8", errors="replace")
+
+    def skip_string(self):
+        self.file.seek(self.unpack("<Q"), 1)
+
+    def value(self, value_type: int, keep: bool = True) -> Any:
+        if value_type in SCALAR_FORMATS:
+            return self.unpack(SCALAR_FORMATS[value_type])
+        if value_type == STRING:
+            if keep:
+                return self.string()
+            self.skip_string()
+            return None
+        if value_type == ARRAY:
+            item_type = self.unpack("<I")
+            count = self.unpack("<Q")
+            # Arrays are tokenizer vocabularies and the like, skipped without decoding
+            if item_type in SCALAR_FORMATS:
+                self.file.seek(count * struct.calcsize(SCALAR_FORMATS[item_type]), 1)
+            else:
+                for _ in range(count):
+                    self.value(item_type, keep=False)
+            return count
+        raise ValueError(f"Unknown GGUF value type {value_type}")
+
+
+def read_gguf_info(path: str) -> GGUFInfo:
+    """
+    Read model facts from the header of a GGUF file without loading its tensors.
+
+    Only the metadata and the tensor index are read, a few megabytes at most
+    (mostly the tokenizer vocabulary, which is skipped).
+
+    Args:
+        path: GGUF file path
+
+    Returns:
+        GGUFInfo: Architecture, parameter count, quantization, trained context length and chat template
+
+    Raises:
+        ValueError: The file is not a GGUF file or its header is truncated
+    """
+    with open(path, "rb") as file:
+        reader = _Reader(file)
+        if file.read(4) != GGUF_MAGIC:
+            raise ValueError(f"{path} is not a GGUF file")
+        version = reader.unpack("<I")
+        if version < 2:
+            raise ValueError(f"GGUF version {version} is not supported")
+        tensor_count = reader.unpack("<Q")
+        metadata_count = reader.unpack("<Q")
+
+        metadata: Dict[str, Any] = {}
+        for _ in range(metadata_count):
+            key = reader.string()
+            value_type = reader.unpack("<I")
+            metadata[key] = reader.value(value_type, keep=not key.startswith("tokenizer.ggml."))
+
+        parameter_count = 0
+        for _ in range(tensor_count):
+            reader.skip_string()
+            n_dimensions = reader.unpack("<I")
+            elements = 1
+            for _ in range(n_dimensions):
+                elements *= reader.unpack("<Q")
+            file.seek(4 + 8, 1)  # Tensor type and data offset
+            parameter_count += elements
+
+    architecture = metadata.get("general.architecture")
+    file_type = metadata.get("general.file_type")
+    return GGUFInfo(
+        architecture=architecture,
+        name=metadata.get("general.name"),
+        parameter_count=parameter_count,
+        quantization=FILE_TYPES.get(file_type, str(file_type)) if file_type is not None else None,
+        context_length=metadata.get(f"{architecture}.context_length"),
+        embedding_length=metadata.get(f"{architecture}.embedding_length"),
+        block_count=metadata.get(f"{architecture}.block_count"),
+        head_count=metadata.get(f"{architecture}.attention.head_count"),
+        head_count_kv=metadata.get(f"{architecture}.attention.head_count_kv", metadata.get(f"{architecture}.attention.head_count")),
+        chat_template=metadata.get("tokenizer.chat_template"),
+        version=version,
+    )
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    for gguf_path in sys.argv[1:]:
+        start_time = time.time()
+        info = read_gguf_info(gguf_path)
+        print(f"{gguf_path} ({(time.time() - start_time) * 1000:.1f} ms)")
+        for field_name, field_value in info.to_dict().items():
+            if field_name == "chat_template" and field_value:
+                field_value = field_value[:80].replace("\n", " ") + "..."
+            print(f"  {field_name}: {field_value}")
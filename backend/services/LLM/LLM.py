@@ -1,11 +1,21 @@
+import gc
 import json
 import os
 import shutil
+import time
+from typing import Callable, Dict, Optional
 from services.lib.LAV_logger import logger
+from services.lib.metrics import LLM_TIME_TO_FIRST_TOKEN_SECONDS, LLM_TOKENS_PER_SECOND, LLM_TOKENS_TOTAL
+from services.lib.tracing import tracer
 
 from .BaseLLM import BaseLLM
-from .TextLLM import TextLLM
-from .VisionLLM import VisionLLM
+from .RemoteLLM import RemoteLLM, REMOTE_MODEL_TYPE, close_clients
+from .PromptStateCache import PromptStateCache
+from .ModelResidency import ModelResidency, DEFAULT_IDLE_TIMEOUT, DEFAULT_MEMORY_BUDGET
+from .SlotPool import SlotPool, DEFAULT_LLM_SLOTS
+from .ModelCatalog import ModelCatalog, format_file_size
+from .ModelSizing import (ModelSizing, MemoryEstimate, auto_size, estimate_memory, check_memory, ModelMemoryError,
+                          free_gpu_memory, free_cpu_memory, DEFAULT_CONTEXT_LENGTH)
 
 
 class LLM:
@@ -13,9 +23,26 @@ class LLM:
         self.current_module_directory = os.path.dirname(__file__)
         self.models_directory = os.path.join(self.current_module_directory, "Models")
         self.current_model_data = None
-        self.llm: BaseLLM | None = None
+        self.catalog = ModelCatalog(self.models_directory)
+        # Model still serving requests while a switch warms up current_model_data
+        self.previous_model_data = None
         self.all_model_data = None
         self.keep_model_loaded = False
+        self.gpu_layers = gpu_layers
+        self.idle_timeout = DEFAULT_IDLE_TIMEOUT
+        # Opt-in, drafts with the model's "draft_model" from metadata.json or by prompt lookup
+        self.speculative_decoding = False
+        self.speculative_num_pred_tokens = None
+        # Contexts per text model, each serves one request at a time
+        self.slot_count = DEFAULT_LLM_SLOTS
+        # Model types created by other backends than llama-cpp, see register_backend
+        self.backends: Dict[str, Callable[[dict, ModelSizing], BaseLLM]] = {REMOTE_MODEL_TYPE: self._create_remote}
+        # KV snapshots outlive the model instance, so turns after an unload still skip the cached prefix
+        self.state_cache = PromptStateCache()
+        # Memory estimate of each model created, by residency key, to know what evicting it would free
+        self.memory_estimates: Dict[str, Optional[MemoryEstimate]] = {}
+        self.residency = ModelResidency(self._create_model, self._model_size, self.idle_timeout,
+                                        DEFAULT_MEMORY_BUDGET, on_unload=self._on_model_unloaded)
         
         # Default sampling parameters
         self.sampling_params = {
@@ -37,57 +64,16 @@ class LLM:
         if self.keep_model_loaded and self.current_model_data:
             self.load_model(self.current_model_data, gpu_layers)
 
+    @property
+    def llm(self) -> SlotPool | None:
+        """Resident slots of the current model, None while it is not loaded"""
+        if not self.current_model_data:
+            return None
+        return self.residency.get(ModelResidency.key_of(self.current_model_data))
+
     def _load_available_models(self):
-        """Load all available models from metadata.json files, regardless of folder names"""
-        self.all_model_data = []
-        
-        # Walk through all directories and subdirectories to find metadata files
-        for root, dirs, files in os.walk(self.models_directory):
-            # Look for metadata files with various naming conventions
-            metadata_files = ['metadata.json']
-            
-            for metadata_file in metadata_files:
-                if metadata_file in files:
-                    metadata_path = os.path.join(root, metadata_file)
-                    try:
-                        with open(metadata_path, 'r', encoding='utf-8') as f:
-                            model_data = json.load(f)
-                        
-                        # Add additional information
-                        model_data['metadata_path'] = metadata_path
-                        model_data['model_folder'] = root
-                        
-                        # Check if model file exists and get its size
-                        model_file_path = os.path.join(root, model_data.get('fileName', ''))
-                        model_data['file_exists'] = os.path.exists(model_file_path)
-                        
-                        if model_data['file_exists']:
-                            try:
-                                file_size = os.path.getsize(model_file_path)
-                                model_data['file_size_bytes'] = file_size
-                                model_data['file_size_readable'] = self._format_file_size(file_size)
-                            except OSError:
-                                model_data['file_size_bytes'] = 0
-                                model_data['file_size_readable'] = "Unknown"
-                        else:
-                            model_data['file_size_bytes'] = 0
-                            model_data['file_size_readable'] = "Not Downloaded"
-                        
-                        # Add vision model support check
-                        if model_data.get('type') == 'vision':
-                            mmproj_path = model_data.get('mmproj_path', '')
-                            if mmproj_path:
-                                full_mmproj_path = os.path.join(root, mmproj_path)
-                                model_data['mmproj_exists'] = os.path.exists(full_mmproj_path)
-                            else:
-                                model_data['mmproj_exists'] = False
-                        
-                        self.all_model_data.append(model_data)
-                        logger.debug(f"Loaded model metadata: {model_data.get('displayName', 'Unknown')} from {metadata_path}")
-                        
-                    except (json.JSONDecodeError, IOError) as e:
-                        logger.warning(f"Could not load metadata from {metadata_path}: {e}")
-                    break  # Only process the first metadata file found in each directory
+        """Load all available models from the catalog, only folders that changed since the last scan are re-read"""
+        self.all_model_data = self.catalog.refresh()
         
         # Set current model if not set
         if not self.current_model_data and self.all_model_data:
@@ -102,15 +88,7 @@ class LLM:
 
     def _format_file_size(self, size_bytes):
         """Format file size in human readable format"""
-        if size_bytes == 0:
-            return "0 B"
-        
-        size_names = ["B", "KB", "MB", "GB", "TB"]
-        import math
-        i = int(math.floor(math.log(size_bytes, 1024)))
-        p = math.pow(1024, i)
-        s = round(size_bytes / p, 2)
-        return f"{s} {size_names[i]}"
+        return format_file_size(size_bytes)
 
     def get_model_download_info(self, model_data):
         """Get download information for a specific model"""
@@ -157,117 +135,438 @@ class LLM:
         os.remove(old_model_data_path)
 
     def load_model_by_filename(self, model_filename: str, gpu_layers=-1):
-        """Load a model by its filename"""
-        self._load_available_models()
+        """
+        Switch to a model by its filename, the models directory is only rescanned for unknown models.
+
+        The new model is loaded in the background, requests keep being served
+        by the previous model until it is ready.
+        """
+        model_data = self._find_model(model_filename)
+        if model_data is None:
+            # Not seen yet, e.g. copied into the models directory since the last scan
+            self._load_available_models()
+            model_data = self._find_model(model_filename)
+        if model_data is None:
+            logger.error(f"Model {model_filename} not found.")
+            return False
+        self.gpu_layers = gpu_layers
+        self._set_current_model(model_data)
+        self.residency.preload(model_data, on_loaded=lambda instance: self._on_switch_loaded(model_data, instance))
+        return True
+
+    def _find_model(self, model_filename: str):
         for model_data in self.all_model_data:
             if model_data.get("fileName") == model_filename:
-                self.load_model(model_data, gpu_layers)
-                return True
-        logger.error(f"Model {model_filename} not found.")
-        return False
-        
+                return model_data
+        return None
+
+    def _set_current_model(self, model_data: dict):
+        key = ModelResidency.key_of(model_data)
+        if self.current_model_data and ModelResidency.key_of(self.current_model_data) != key:
+            if self.residency.is_loaded(ModelResidency.key_of(self.current_model_data)):
+                self.previous_model_data = self.current_model_data
+        self.current_model_data = model_data
+
+    def _on_switch_loaded(self, model_data: dict, instance):
+        if self.current_model_data is not model_data:
+            return
+        if instance is None:
+            previous = self.previous_model_data
+            if previous and self.residency.is_loaded(ModelResidency.key_of(previous)):
+                # Keep serving the old model rather than retrying the failed load on every request
+                logger.error(f"Could not switch to {model_data.get('fileName')}, keeping {previous.get('fileName')}")
+                self.current_model_data = previous
+                self.previous_model_data = None
+            return
+        if self.previous_model_data:
+            # The new model serves from now on, the old one only stays resident if the budget allows
+            self.residency.evict_to_budget(keep=ModelResidency.key_of(model_data))
+            self.previous_model_data = None
+        logger.info(f"Model changed to {model_data.get('fileName')}.")
+
+    def preload(self):
+        """Load the current model in the background, e.g. at startup"""
+        if self.current_model_data and self.current_model_data.get("file_exists", True):
+            self.residency.preload(self.current_model_data)
+
     def load_model(self, model_data: dict, gpu_layers=-1):
-        """Load a model using its metadata"""
+        """Load a model using its metadata and make it the current model, blocks until it is loaded"""
         logger.debug(f"Loading model {model_data}...")
-        if (self.llm and self.current_model_data.get('fileName') == model_data.get('fileName')):
-            logger.debug(f"Same model already loaded, load cancelled...")
-            return
+        self.gpu_layers = gpu_layers
+        self._set_current_model(model_data)
+        if self.residency.load(model_data) is not None:
+            self.previous_model_data = None
 
-        self.current_model_data = model_data
+    def _model_path(self, model_data: dict):
         model_name = model_data.get("fileName")
-        
         # Use the model_folder from metadata if available, otherwise fall back to old method
         if 'model_folder' in model_data:
             model_folder = model_data['model_folder']
         else:
             model_folder = os.path.join(self.models_directory, os.path.splitext(model_name)[0])
-        
-        model_path = os.path.join(model_folder, model_name)
+        return model_folder, os.path.join(model_folder, model_name)
+
+    def _create_model(self, model_data: dict) -> SlotPool | None:
+        """
+        Create the context slots of a model, called by the residency manager.
+
+        Other resident models, like the previous one during a switch, are sized
+        as if they were gone. They are only unloaded first if the new model
+        does not fit next to them.
+        """
+        key = ModelResidency.key_of(model_data)
+        others = [other for other in self.residency.resident_keys() if other != key]
+        reclaimable = [self.memory_estimates.get(other) for other in others]
+        free_gpu, free_cpu = free_gpu_memory(), free_cpu_memory()
+        reclaimable_gpu = None if free_gpu is None else free_gpu + sum(e.gpu for e in reclaimable if e)
+        reclaimable_cpu = None if free_cpu is None else free_cpu + sum(e.cpu for e in reclaimable if e)
+
+        sizing = self._sizing(model_data, reclaimable_gpu)
+        if sizing is None:
+            return None
+        slot_count = self.slot_count if model_data.get("type") == "text" else 1
+        estimate = estimate_memory(ModelCatalog.gguf_info(model_data), model_data.get("file_size_bytes") or 0,
+                                   sizing, slot_count)
+        try:
+            check_memory(estimate, reclaimable_gpu, reclaimable_cpu)
+        except ModelMemoryError as e:
+            logger.error(f"Not loading {model_data.get('fileName')} with {sizing.to_dict()}: it {e}. "
+                         f"Lower n_ctx or use a quantized KV cache in its metadata.json \"context\" block.")
+            return None
+        if others:
+            try:
+                check_memory(estimate, free_gpu, free_cpu)
+            except ModelMemoryError as e:
+                logger.info(f"{model_data.get('fileName')} {e}, unloading {', '.join(others)} first")
+                for other in others:
+                    self.residency.unload(other)
+                if self.previous_model_data and ModelResidency.key_of(self.previous_model_data) in others:
+                    self.previous_model_data = None
+                # llama.cpp frees the memory when the last reference to the instance goes
+                gc.collect()
+        self.memory_estimates[key] = estimate
+        instance = self._create_instance(model_data, sizing)
+        if instance is None:
+            return None
+        instances = [instance]
+        if instance.supports_slots:
+            # Vision models keep a single slot, their CLIP projector is too large to duplicate
+            instances += [self._create_instance(model_data, sizing) for _ in range(self.slot_count - 1)]
+        return SlotPool(instances)
+
+    def _create_instance(self, model_data: dict, sizing: ModelSizing) -> BaseLLM | None:
+        backend = self.backends.get(model_data.get("type"))
+        if backend is not None:
+            return backend(model_data, sizing)
+
+        model_name = model_data.get("fileName")
+        model_folder, model_path = self._model_path(model_data)
 
         if not os.path.exists(model_path):
             logger.error(f"Model {model_name} not found at {model_path}. Please download the model first.")
-            return
-        else:
-            self.unload_model()
-            if model_data.get("type") == "text":
-                self.llm = TextLLM(model_path=model_path, n_ctx=4096, n_gpu_layers=gpu_layers, seed=-1)
-            elif model_data.get("type") == "vision":
-                mmproj_path = model_data.get("mmproj_path")
-                if mmproj_path:
-                    full_mmproj_path = os.path.join(model_folder, mmproj_path)
-                    if os.path.exists(full_mmproj_path):
-                        self.llm = VisionLLM(model_path=model_path, mmproj_path=full_mmproj_path, n_ctx=4096, n_gpu_layers=gpu_layers, seed=-1)
-                    else:
-                        logger.error(f"Vision model mmproj file not found: {full_mmproj_path}")
-                        return
+            return None
+        # Imported here so fake and remote backends run without llama-cpp and the screen capture libraries
+        if model_data.get("type") == "text":
+            from .TextLLM import TextLLM
+            return TextLLM(model_path=model_path, seed=-1, state_cache=self.state_cache,
+                           speculative=self._speculative_config(model_data), **sizing.llama_kwargs())
+        elif model_data.get("type") == "vision":
+            mmproj_path = model_data.get("mmproj_path")
+            if mmproj_path:
+                full_mmproj_path = os.path.join(model_folder, mmproj_path)
+                if os.path.exists(full_mmproj_path):
+                    from .VisionLLM import VisionLLM
+                    return VisionLLM(model_path=model_path, mmproj_path=full_mmproj_path, seed=-1,
+                                     **sizing.llama_kwargs())
                 else:
-                    logger.error(f"Vision model missing mmproj_path in metadata")
-                    return
+                    logger.error(f"Vision model mmproj file not found: {full_mmproj_path}")
+            else:
+                logger.error(f"Vision model missing mmproj_path in metadata")
+        return None
+
+    def register_backend(self, model_type: str, factory: Callable[[dict, ModelSizing], BaseLLM]):
+        """
+        Create models whose metadata "type" is model_type with factory instead of llama-cpp.
+
+        Args:
+            model_type: Value of "type" in the model's metadata
+            factory: Called with the model metadata and its sizing, returns the model instance
+        """
+        self.backends[model_type] = factory
+
+    def _create_remote(self, model_data: dict, sizing: ModelSizing) -> BaseLLM | None:
+        """Model served by another machine over an OpenAI-compatible API, see RemoteLLM"""
+        if not model_data.get("base_url"):
+            logger.error(f"Remote model {model_data.get('fileName')} missing base_url in metadata")
+            return None
+        # The key is read from the environment, model metadata is served to every LAN client by /api/llm/models
+        api_key = os.environ.get(model_data["api_key_env"]) if model_data.get("api_key_env") else None
+        return RemoteLLM(model_data["base_url"], model=model_data.get("model"), api_key=api_key,
+                         n_ctx=sizing.n_ctx, sampling_extensions=model_data.get("sampling_extensions", True))
+
+    def close_connections(self):
+        """Close the pooled connections to remote models"""
+        close_clients()
 
-            logger.info(f"Model changed to {model_name}.")
+    def _sizing(self, model_data: dict, free_gpu: Optional[int] = None) -> ModelSizing | None:
+        """Context, KV cache, offloaded layers and threads from metadata.json and the model's GGUF header"""
+        info = ModelCatalog.gguf_info(model_data)
+        try:
+            sizing = auto_size(model_data, info, self.gpu_layers, free_gpu=free_gpu)
+        except ValueError as e:
+            logger.error(f"Invalid context settings for {model_data.get('fileName')}: {e}")
+            return None
+        if model_data.get("type") == "vision":
+            # The image embedding takes a large part of the context
+            sizing.n_ctx = max(sizing.n_ctx, DEFAULT_CONTEXT_LENGTH)
+        if info:
+            logger.info(f"{model_data.get('fileName')}: {info.architecture} {info.parameter_count / 1e9:.1f}B "
+                        f"{info.quantization}, trained context {info.context_length}, loading with {sizing.to_dict()}")
+        return sizing
 
-    def unload_model(self):
-        if self.llm:
-            del self.llm
-            self.llm = None
-            logger.info("Model unloaded.")
+    def _draft_model_path(self, model_data: dict):
+        """Path of the draft model declared in metadata.json as {"draft_model": {"fileName": ...}}"""
+        draft_model = model_data.get("draft_model") or {}
+        if not draft_model.get("fileName"):
+            return None
+        model_folder, _ = self._model_path(model_data)
+        return os.path.join(model_folder, draft_model["fileName"])
+
+    def _speculative_config(self, model_data: dict):
+        if not self.speculative_decoding:
+            return None
+        from .SpeculativeDecoding import PROMPT_LOOKUP, DRAFT_MODEL
+        draft_model_path = self._draft_model_path(model_data)
+        if draft_model_path:
+            if os.path.exists(draft_model_path):
+                return {
+                    "mode": DRAFT_MODEL,
+                    "draft_model_path": draft_model_path,
+                    "num_pred_tokens": model_data["draft_model"].get("num_pred_tokens", self.speculative_num_pred_tokens)
+                }
+            logger.warning(f"Draft model {draft_model_path} not found, using prompt lookup instead")
+        return {"mode": PROMPT_LOOKUP, "num_pred_tokens": self.speculative_num_pred_tokens}
+
+    def _model_size(self, model_data: dict) -> int:
+        """Memory taken by a model, estimated from its files and its number of slots"""
+        size = model_data.get("file_size_bytes") or 0
+        model_folder, _ = self._model_path(model_data)
+        extra_paths = [os.path.join(model_folder, model_data["mmproj_path"])] if model_data.get("mmproj_path") else []
+        if self.speculative_decoding and self._draft_model_path(model_data):
+            extra_paths.append(self._draft_model_path(model_data))
+        for path in extra_paths:
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        if model_data.get("type") == "text" and self.gpu_layers != 0:
+            # Memory mapped weights are shared between slots on the CPU, offloaded layers are not
+            size *= self.slot_count
+        return size
+
+    def _on_model_unloaded(self, pool: SlotPool):
+        for instance in pool.instances:
+            if hasattr(instance, "save_state_on_finish"):
+                # A stream still running on this instance keeps its final state for the next load
+                instance.save_state_on_finish = True
+
+    def _serving_model(self) -> SlotPool | None:
+        """Slots for the next request: the current model, or the previous one while the current is warming up"""
+        key = ModelResidency.key_of(self.current_model_data)
+        instance = self.residency.get(key)
+        if instance is not None:
+            return instance
+        if self.previous_model_data and self.residency.is_loading(key):
+            instance = self.residency.get(ModelResidency.key_of(self.previous_model_data))
+            if instance is not None:
+                logger.debug(f"Model {key} still loading, serving with {self.previous_model_data.get('fileName')}")
+                return instance
+        with tracer.span("llm.load_model"):
+            self.load_model(self.current_model_data, self.gpu_layers)
+        return self.residency.get(key)
+
+    def _release_after_request(self):
+        # An idle timeout of 0 restores unloading right after each request
+        if not self.keep_model_loaded and self.idle_timeout == 0:
+            self.unload_model()
+
+    def unload_model(self, model_filename: str = None):
+        """Unload one model, all resident models if no filename is given"""
+        if model_filename is None:
+            self.residency.unload_all()
+        else:
+            self.residency.unload(model_filename)
+        if self.previous_model_data and not self.residency.is_loaded(ModelResidency.key_of(self.previous_model_data)):
+            self.previous_model_data = None
 
     def set_keep_model_loaded(self, value):
         self.keep_model_loaded = value
         if value == True:
-            self.load_model(self.current_model_data)
+            self.residency.configure(idle_timeout=-1)
+            self.preload()
         else:
-            self.unload_model()
+            self.residency.configure(idle_timeout=self.idle_timeout)
+
+    def set_speculative_decoding(self, enabled: bool, num_pred_tokens: int = None):
+        """
+        Turn speculative decoding on or off, resident text models are reloaded with the new setting.
+
+        Args:
+            enabled: Draft tokens with the model's draft model, or by prompt lookup if it has none
+            num_pred_tokens: Tokens drafted per step, None for the default of the drafting mode
+        """
+        if enabled == self.speculative_decoding and num_pred_tokens == self.speculative_num_pred_tokens:
+            return
+        self.speculative_decoding = enabled
+        self.speculative_num_pred_tokens = num_pred_tokens
+        logger.info(f"Speculative decoding {'enabled' if enabled else 'disabled'}")
+        self._reload_text_models()
+
+    def set_slot_count(self, count: int):
+        """
+        Change the number of contexts per text model, resident text models are reloaded with the new count.
+
+        Callers must allow as many concurrent completions, see the llm.slots settings applier.
+        """
+        count = max(1, count)
+        if count == self.slot_count:
+            return
+        self.slot_count = count
+        logger.info(f"LLM context slots set to {count}")
+        self._reload_text_models()
+
+    def _reload_text_models(self):
+        for key, pool in self.residency.instances().items():
+            if pool.instances[0].supports_slots:
+                self.residency.unload(key)
+        if self.previous_model_data and not self.residency.is_loaded(ModelResidency.key_of(self.previous_model_data)):
+            self.previous_model_data = None
+        if self.keep_model_loaded:
+            self.preload()
+
+    def speculative_stats(self):
+        """Draft acceptance and decode speed per slot of the resident text models"""
+        return {key: [instance.speculative_stats.to_dict() for instance in pool.instances]
+                for key, pool in self.residency.instances().items() if hasattr(pool.instances[0], "speculative_stats")}
+
+    def slot_status(self):
+        """Busy and idle context slots of the resident models, with the session each one holds"""
+        return {key: pool.status() for key, pool in self.residency.instances().items()}
+
+    def configure_residency(self, idle_timeout: float = None, memory_budget: int = None):
+        """
+        Change how long models stay loaded.
+
+        Args:
+            idle_timeout: Seconds without requests before a model is unloaded, 0 unloads after each request
+            memory_budget: Bytes of model files kept resident, the least recently used models are evicted first
+        """
+        if idle_timeout is not None:
+            self.idle_timeout = idle_timeout
+            if not self.keep_model_loaded:
+                self.residency.configure(idle_timeout=idle_timeout)
+        if memory_budget is not None:
+            self.residency.configure(memory_budget=memory_budget)
 
     def update_sampling_params(self, params: dict):
         """Update sampling parameters - no model reload needed as these are inference-time parameters"""
         self.sampling_params.update(params)
         logger.info(f"Updated sampling parameters: {self.sampling_params}")
 
-    def get_completion(self, text, history, system_prompt, screenshot=False):
-        if not self.llm:
-            self.load_model(self.current_model_data)
+    def _measure_stream(self, response, mode, start_time):
+        """Yield from a token stream while recording time to first token, decode speed and trace spans"""
+        if response is None:
+            return None
+        # Generation runs lazily on whichever thread consumes the stream, keep the caller's turn
+        turn_id = tracer.current_turn_id()
 
-        response = None
-        if isinstance(self.llm, VisionLLM):
-            self.llm: VisionLLM
-            response = self.llm.get_chat_completion(text, history, system_prompt, screenshot)
-        elif isinstance(self.llm, TextLLM):
-            self.llm: TextLLM
-            response = self.llm.get_chat_completion(
+        def measured():
+            tokens = 0
+            first_token_time = None
+            try:
+                for token in response:
+                    if first_token_time is None:
+                        first_token_time = time.time()
+                        LLM_TIME_TO_FIRST_TOKEN_SECONDS.observe(first_token_time - start_time, mode=mode)
+                        tracer.add_span("llm.prefill", start_time, first_token_time, turn_id, mode=mode)
+                    tokens += 1
+                    yield token
+            finally:
+                # Stop the underlying generation right away when the consumer closes the stream
+                close = getattr(response, "close", None)
+                if close:
+                    close()
+                end_time = time.time()
+                LLM_TOKENS_TOTAL.inc(tokens, mode=mode)
+                decode_time = end_time - first_token_time if first_token_time else 0
+                if tokens > 1 and decode_time > 0:
+                    LLM_TOKENS_PER_SECOND.observe((tokens - 1) / decode_time, mode=mode)
+                if first_token_time:
+                    tracer.add_span("llm.decode", first_token_time, end_time, turn_id, mode=mode, tokens=tokens)
+
+        return measured()
+
+    def _sampling_params(self, overrides=None):
+        """Global sampling parameters with a client session's overrides on top"""
+        if not overrides:
+            return self.sampling_params
+        return {**self.sampling_params, **overrides}
+
+    def _slot_stream(self, pool: SlotPool, session_id, generate):
+        """Run a completion on a slot taken when the stream starts and given back when it ends"""
+        slot = pool.acquire(session_id)
+        try:
+            yield from generate(slot.instance)
+        finally:
+            pool.release(slot)
+
+    def get_completion(self, text, history, system_prompt, screenshot=False, sampling_params=None, session_id=None):
+        start_time = time.time()
+        params = self._sampling_params(sampling_params)
+        pool = self._serving_model()
+
+        def generate(model):
+            if model.supports_screenshots:
+                return model.get_chat_completion(text, history, system_prompt, screenshot)
+            return model.get_chat_completion(
                 text, 
                 history, 
                 system_prompt,
-                top_k=self.sampling_params['top_k'],
-                top_p=self.sampling_params['top_p'],
-                min_p=self.sampling_params['min_p'],
-                repeat_penalty=self.sampling_params['repeat_penalty'],
-                temperature=self.sampling_params['temperature'],
-                seed=self.sampling_params['seed']
+                top_k=params['top_k'],
+                top_p=params['top_p'],
+                min_p=params['min_p'],
+                repeat_penalty=params['repeat_penalty'],
+                temperature=params['temperature'],
+                seed=params['seed']
             )
-        if not self.keep_model_loaded:
-            self.unload_model()
-        return response
 
-    def complete_current_response(self, history, system_prompt):
+        response = None
+        if pool is not None:
+            response = self._slot_stream(pool, session_id, generate)
+        self._release_after_request()
+        return self._measure_stream(response, "chat", start_time)
+
+    def complete_current_response(self, history, system_prompt, sampling_params=None, session_id=None):
         """Complete the current response with sampling parameters from settings"""
-        if not self.llm:
-            self.load_model(self.current_model_data)
+        start_time = time.time()
+        params = self._sampling_params(sampling_params)
+        pool = self._serving_model()
 
-        response = None
-        if isinstance(self.llm, TextLLM):
-            self.llm: TextLLM
-            response = self.llm.complete_current_response(
+        def generate(model):
+            return model.complete_current_response(
                 history, 
                 system_prompt,
-                top_k=self.sampling_params['top_k'],
-                top_p=self.sampling_params['top_p'],
-                min_p=self.sampling_params['min_p'],
-                repeat_penalty=self.sampling_params['repeat_penalty'],
-                temperature=self.sampling_params['temperature'],
-                seed=self.sampling_params['seed']
+                top_k=params['top_k'],
+                top_p=params['top_p'],
+                min_p=params['min_p'],
+                repeat_penalty=params['repeat_penalty'],
+                temperature=params['temperature'],
+                seed=params['seed']
             )
+
+        response = None
+        if pool is not None and pool.instances[0].supports_continuation:
+            response = self._slot_stream(pool, session_id, generate)
         
-        if not self.keep_model_loaded:
-            self.unload_model()
-        return response
\ No newline at end of file
+        self._release_after_request()
+        return self._measure_stream(response, "continue", start_time)
@@ -0,0 +1,183 @@
+import json
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from services.lib.LAV_logger import logger
+from .GGUFReader import GGUFInfo, read_gguf_info
+
+CATALOG_FILE_NAME = "catalog.json"
+CATALOG_VERSION = 1
+METADATA_FILE_NAME = "metadata.json"
+
+
+def format_file_size(size_bytes):
+    """Format file size in human readable format"""
+    if size_bytes == 0:
+        return "0 B"
+
+    size_names = ["B", "KB", "MB", "GB", "TB"]
+    i = int(math.floor(math.log(size_bytes, 1024)))
+    p = math.pow(1024, i)
+    s = round(size_bytes / p, 2)
+    return f"{s} {size_names[i]}"
+
+
+def _stat(path: str):
+    """(mtime, size) of a file, None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime, stat.st_size]
+
+
+class ModelCatalog:
+    """
+    Index of the models directory, persisted next to the models.
+
+    Each model folder is described by its metadata.json and, once downloaded,
+    the header of its GGUF file. A refresh only stats those files and re-reads
+    the ones whose mtime or size changed, so listing models no longer opens
+    every metadata file, and a GGUF header is read once per download.
+    """
+
+    def __init__(self, models_directory: str, catalog_path: Optional[str] = None):
+        """
+        Initialize the catalog.
+
+        Args:
+            models_directory: Directory holding one folder (with a metadata.json) per model
+            catalog_path: Persisted index, catalog.json in the models directory by default
+        """
+        self.models_directory = models_directory
+        self.catalog_path = catalog_path or os.path.join(models_directory, CATALOG_FILE_NAME)
+        self._entries: Dict[str, Dict[str, Any]] = self._load()
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.catalog_path, "r", encoding="utf-8") as f:
+                catalog = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (json.JSONDecodeError, IOError) as e:
+            logger.warning(f"Could not read model catalog {self.catalog_path}, rebuilding it: {e}")
+            return {}
+        if catalog.get("version") != CATALOG_VERSION:
+            return {}
+        return catalog.get("models", {})
+
+    def _save(self):
+        temp_path = self.catalog_path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": CATALOG_VERSION, "models": self._entries}, f, indent=4)
+            os.replace(temp_path, self.catalog_path)
+        except OSError as e:
+            logger.warning(f"Could not save model catalog {self.catalog_path}: {e}")
+
+    def refresh(self) -> List[Dict[str, Any]]:
+        """
+        Bring the index up to date with the models directory.
+
+        Returns:
+            The model data of every folder with a metadata.json, as the old full scan returned it
+            plus a "gguf" entry with the header facts of downloaded models
+        """
+        start_time = time.time()
+        with self._lock:
+            folders = []
+            for root, dirs, files in os.walk(self.models_directory):
+                if METADATA_FILE_NAME in files:
+                    folders.append(root)
+            dirs_seen = {os.path.relpath(folder, self.models_directory) for folder in folders}
+
+            changed = False
+            for key in [key for key in self._entries if key not in dirs_seen]:
+                del self._entries[key]
+                changed = True
+
+            models = []
+            rereads = 0
+            for folder in folders:
+                key = os.path.relpath(folder, self.models_directory)
+                entry, updated = self._refresh_entry(key, folder, self._entries.get(key))
+                if entry is None:
+                    self._entries.pop(key, None)
+                    changed |= updated
+                    continue
+                self._entries[key] = entry
+                if updated:
+                    changed = True
+                    rereads += 1
+                models.append(self._model_data(folder, entry))
+
+            if changed:
+                self._save()
+        logger.debug(f"Model catalog refreshed in {(time.time() - start_time) * 1000:.1f} ms, {rereads} folders re-read")
+        return models
+
+    def _refresh_entry(self, key: str, folder: str, entry: Optional[Dict[str, Any]]):
+        """Re-read the files of a folder that changed, returns (entry, updated)"""
+        metadata_path = os.path.join(folder, METADATA_FILE_NAME)
+        metadata_stat = _stat(metadata_path)
+        updated = False
+        if entry is None or entry.get("metadata_stat") != metadata_stat:
+            try:
+                with open(metadata_path, "r", encoding="utf-8") as f:
+                    metadata = json.load(f)
+            except (json.JSONDecodeError, IOError) as e:
+                logger.warning(f"Could not load metadata from {metadata_path}: {e}")
+                return None, entry is not None
+            entry = {"metadata_stat": metadata_stat, "metadata": metadata, "model_stat": None, "gguf": None}
+            updated = True
+            logger.debug(f"Loaded model metadata: {metadata.get('displayName', 'Unknown')} from {metadata_path}")
+
+        model_path = os.path.join(folder, entry["metadata"].get("fileName", ""))
+        model_stat = _stat(model_path) if entry["metadata"].get("fileName") else None
+        if entry.get("model_stat") != model_stat:
+            entry["model_stat"] = model_stat
+            entry["gguf"] = None
+            if model_stat is not None:
+                try:
+                    entry["gguf"] = read_gguf_info(model_path).to_dict()
+                except (ValueError, OSError) as e:
+                    # Still downloading or not a GGUF file, retried when it changes
+                    logger.warning(f"Could not read GGUF header of {model_path}: {e}")
+            updated = True
+
+        mmproj_path = entry["metadata"].get("mmproj_path")
+        mmproj_exists = bool(mmproj_path) and os.path.exists(os.path.join(folder, mmproj_path))
+        if entry.get("mmproj_exists") != mmproj_exists:
+            entry["mmproj_exists"] = mmproj_exists
+            updated = True
+        return entry, updated
+
+    def _model_data(self, folder: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        model_data = dict(entry["metadata"])
+        model_data['metadata_path'] = os.path.join(folder, METADATA_FILE_NAME)
+        model_data['model_folder'] = folder
+        model_stat = entry.get("model_stat")
+        model_data['file_exists'] = model_stat is not None
+        if model_stat is not None:
+            model_data['file_size_bytes'] = model_stat[1]
+            model_data['file_size_readable'] = format_file_size(model_stat[1])
+        else:
+            model_data['file_size_bytes'] = 0
+            model_data['file_size_readable'] = "Not Downloaded"
+        if model_data.get('type') == 'remote':
+            # Served by another machine, there is nothing to download
+            model_data['file_exists'] = True
+            model_data['file_size_readable'] = "Remote"
+        if model_data.get('type') == 'vision':
+            model_data['mmproj_exists'] = entry.get("mmproj_exists", False)
+        model_data['gguf'] = entry.get("gguf")
+        return model_data
+
+    @staticmethod
+    def gguf_info(model_data: Dict[str, Any]) -> Optional[GGUFInfo]:
+        """Header facts of a model returned by refresh(), None if it is not downloaded or unreadable"""
+        gguf = model_data.get("gguf")
+        return GGUFInfo.from_dict(gguf) if gguf else None
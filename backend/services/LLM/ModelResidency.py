@@ -0,0 +1,227 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+from services.lib.LAV_logger import logger
+
+# Seconds a model stays loaded without requests, None keeps it loaded
+DEFAULT_IDLE_TIMEOUT = 600
+# Bytes of model files allowed to stay resident, 0 keeps only the most recent model
+# (plus the incoming one while a switch warms it up)
+DEFAULT_MEMORY_BUDGET = 0
+IDLE_CHECK_INTERVAL = 15
+
+
+@dataclass
+class ResidentModel:
+    key: str
+    instance: Any
+    size_bytes: int
+    loaded_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.monotonic)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "model": self.key,
+            "size_bytes": self.size_bytes,
+            "loaded_at": self.loaded_at,
+            "idle_seconds": round(time.monotonic() - self.last_used, 1)
+        }
+
+
+class ModelResidency:
+    """
+    Keeps loaded LLM instances in memory between requests.
+
+    Models stay resident until they are idle for idle_timeout seconds or the
+    memory budget forces the least recently used one out, text and vision
+    models alike. Loads run at most once per model: concurrent callers wait
+    for the same load. preload() loads on a background thread, so a model
+    switch can warm the new model while the old one keeps serving.
+    """
+
+    def __init__(self, loader: Callable[[Dict[str, Any]], Any], size_of: Callable[[Dict[str, Any]], int],
+                 idle_timeout: Optional[float] = DEFAULT_IDLE_TIMEOUT, memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                 on_unload: Optional[Callable[[Any], None]] = None):
+        """
+        Initialize the residency manager.
+
+        Args:
+            loader: Creates the model instance from its metadata, returns None if it cannot be loaded
+            size_of: Memory estimate of a model in bytes from its metadata
+            idle_timeout: Seconds without use before a model is unloaded, None to never unload idle models
+            memory_budget: Bytes of resident models before the least recently used are evicted
+            on_unload: Called with an instance when it stops being resident
+        """
+        self.loader = loader
+        self.size_of = size_of
+        self.idle_timeout = idle_timeout
+        self.memory_budget = memory_budget
+        self.on_unload = on_unload
+        self._models: Dict[str, ResidentModel] = {}
+        self._loading: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._idle_thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def key_of(model_data: Dict[str, Any]) -> str:
+        return model_data.get("fileName", "")
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a resident instance without loading it, marking it as used"""
+        with self._lock:
+            resident = self._models.get(key)
+            if resident is None:
+                return None
+            resident.last_used = time.monotonic()
+            return resident.instance
+
+    def is_loaded(self, key: str) -> bool:
+        with self._lock:
+            return key in self._models
+
+    def is_loading(self, key: str) -> bool:
+        with self._lock:
+            return key in self._loading
+
+    def load(self, model_data: Dict[str, Any]) -> Optional[Any]:
+        """
+        Get the instance of a model, loading it if needed. Blocks while loading.
+
+        Returns:
+            The model instance, None if it could not be loaded
+        """
+        key = self.key_of(model_data)
+        while True:
+            with self._lock:
+                resident = self._models.get(key)
+                if resident is not None:
+                    resident.last_used = time.monotonic()
+                    return resident.instance
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = threading.Event()
+                    break
+            # Another thread is loading this model, use its result
+            loading.wait()
+            if not self.is_loaded(key):
+                return None
+
+        try:
+            start_time = time.time()
+            instance = self.loader(model_data)
+            if instance is not None:
+                with self._lock:
+                    self._models[key] = ResidentModel(key, instance, self.size_of(model_data))
+                logger.info(f"Model {key} resident after {time.time() - start_time:.2f}s")
+                self.evict_to_budget(keep=key)
+                self._start_idle_thread()
+            return instance
+        finally:
+            with self._lock:
+                self._loading.pop(key).set()
+
+    def preload(self, model_data: Dict[str, Any], on_loaded: Optional[Callable[[Any], None]] = None) -> threading.Thread:
+        """Load a model on a background thread, on_loaded is called with the instance (or None)"""
+        def run():
+            try:
+                instance = self.load(model_data)
+            except Exception as e:
+                logger.error(f"Preloading model {self.key_of(model_data)} failed: {e}", exc_info=True)
+                instance = None
+            if on_loaded:
+                on_loaded(instance)
+
+        thread = threading.Thread(target=run, name=f"llm-preload-{self.key_of(model_data)}", daemon=True)
+        thread.start()
+        return thread
+
+    def unload(self, key: str) -> bool:
+        """
+        Drop a resident model.
+
+        A stream still running on the instance keeps it alive until it finishes.
+        """
+        with self._lock:
+            resident = self._models.pop(key, None)
+        if resident is None:
+            return False
+        if self.on_unload:
+            self.on_unload(resident.instance)
+        logger.info(f"Model {key} unloaded")
+        return True
+
+    def unload_all(self, keep: Optional[str] = None):
+        with self._lock:
+            keys = [key for key in self._models if key != keep]
+        for key in keys:
+            self.unload(key)
+
+    def evict_to_budget(self, keep: Optional[str] = None):
+        """Unload least recently used models until the resident ones fit the memory budget"""
+        while True:
+            with self._lock:
+                total = sum(resident.size_bytes for resident in self._models.values())
+                candidates = sorted((r for r in self._models.values() if r.key != keep), key=lambda r: r.last_used)
+                if total <= self.memory_budget or not candidates:
+                    return
+                victim = candidates[0].key
+            logger.info(f"Evicting model {victim}, {total / 1024 ** 3:.1f} GB resident exceeds the "
+                        f"{self.memory_budget / 1024 ** 3:.1f} GB budget")
+            self.unload(victim)
+
+    def configure(self, idle_timeout: Optional[float] = None, memory_budget: Optional[int] = None):
+        """Change the idle timeout (negative for never) and memory budget, None leaves a value unchanged"""
+        if idle_timeout is not None:
+            self.idle_timeout = None if idle_timeout < 0 else idle_timeout
+        if memory_budget is not None:
+            self.memory_budget = memory_budget
+            self.evict_to_budget(keep=self._most_recent())
+        self._start_idle_thread()
+
+    def _most_recent(self) -> Optional[str]:
+        with self._lock:
+            if not self._models:
+                return None
+            return max(self._models.values(), key=lambda r: r.last_used).key
+
+    def _start_idle_thread(self):
+        with self._lock:
+            if self.idle_timeout is None or not self._models:
+                return
+            if self._idle_thread and self._idle_thread.is_alive():
+                return
+            self._idle_thread = threading.Thread(target=self._unload_idle, name="llm-idle-unload", daemon=True)
+            self._idle_thread.start()
+
+    def _unload_idle(self):
+        while True:
+            with self._lock:
+                idle_timeout = self.idle_timeout
+                if idle_timeout is None or not self._models:
+                    self._idle_thread = None
+                    return
+                now = time.monotonic()
+                idle = [r.key for r in self._models.values() if now - r.last_used > idle_timeout]
+            for key in idle:
+                logger.info(f"Model {key} idle for over {idle_timeout}s")
+                self.unload(key)
+            time.sleep(min(IDLE_CHECK_INTERVAL, max(idle_timeout, 1)))
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "resident": [resident.to_dict() for resident in self._models.values()],
+                "loading": list(self._loading),
+                "idle_timeout": self.idle_timeout,
+                "memory_budget": self.memory_budget
+            }
+
+    def instances(self) -> Dict[str, Any]:
+        """Resident instances by key, without marking them as used"""
+        with self._lock:
+            return {key: resident.instance for key, resident in self._models.items()}
+
+    def resident_keys(self) -> List[str]:
+        with self._lock:
+            return list(self._models)
@@ -0,0 +1,303 @@
+import os
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional
+from services.lib.LAV_logger import logger
+from .GGUFReader import GGUFInfo
+
+try:
+    import psutil
+except ImportError:  # Threads fall back to half the logical CPUs without psutil
+    psutil = None
+
+# Context used when the GGUF header does not tell the trained length
+DEFAULT_CONTEXT_LENGTH = 4096
+# Upper bound of the automatic context, longer chats are trimmed anyway and the KV cache grows linearly
+MAX_AUTO_CONTEXT_LENGTH = 8192
+# Upper bound of the automatic context in long-context mode, where the KV cache is quantized
+MAX_LONG_CONTEXT_LENGTH = 32768
+# VRAM left free for the CUDA context, compute buffers and the other models (TTS, Whisper)
+GPU_MEMORY_RESERVE = 1536 * 1024 * 1024
+# RAM left free for the rest of the server (TTS, Whisper, BLIP run in the same process)
+CPU_MEMORY_RESERVE = 2048 * 1024 * 1024
+# llama-cpp defaults
+DEFAULT_BATCH_SIZE = 512
+
+# KV cache types: (ggml_type value passed to llama-cpp, bytes per value).
+# Quantized types store blocks of 32 values with an f16 scale.
+KV_CACHE_TYPES = {
+    "f16": (1, 2.0),
+    "q8_0": (8, 34 / 32),
+    "q4_0": (2, 18 / 32),
+}
+DEFAULT_KV_CACHE_TYPE = "f16"
+LONG_CONTEXT_KV_CACHE_TYPE = "q8_0"
+# metadata.json "context" keys, e.g. {"context": {"n_ctx": 32768, "type_k": "q8_0", "type_v": "q8_0", "flash_attn": true}}
+CONTEXT_CONFIG_KEYS = ["long_context", "n_ctx", "type_k", "type_v", "flash_attn", "n_batch", "n_ubatch",
+                       "n_threads", "n_threads_batch"]
+
+
+class ModelMemoryError(Exception):
+    """A context configuration does not fit in the memory available to load it"""
+    pass
+
+
+@dataclass
+class ModelSizing:
+    """Context and offload settings for loading a model"""
+    n_ctx: int
+    n_gpu_layers: int
+    n_threads: Optional[int]
+    n_threads_batch: Optional[int]
+    type_k: str = DEFAULT_KV_CACHE_TYPE
+    type_v: str = DEFAULT_KV_CACHE_TYPE
+    flash_attn: bool = False
+    n_batch: int = DEFAULT_BATCH_SIZE
+    n_ubatch: int = DEFAULT_BATCH_SIZE
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def llama_kwargs(self) -> Dict[str, Any]:
+        """Keyword arguments of llama_cpp.Llama for this context"""
+        return {
+            "n_ctx": self.n_ctx,
+            "n_gpu_layers": self.n_gpu_layers,
+            "n_threads": self.n_threads,
+            "n_threads_batch": self.n_threads_batch,
+            "type_k": KV_CACHE_TYPES[self.type_k][0],
+            "type_v": KV_CACHE_TYPES[self.type_v][0],
+            "flash_attn": self.flash_attn,
+            "n_batch": self.n_batch,
+            "n_ubatch": self.n_ubatch,
+        }
+
+    @property
+    def kv_bytes_per_value(self) -> float:
+        """Mean bytes per K and V value"""
+        return (KV_CACHE_TYPES[self.type_k][1] + KV_CACHE_TYPES[self.type_v][1]) / 2
+
+
+@dataclass
+class MemoryEstimate:
+    """Bytes a model takes once loaded, split between the GPU and the CPU"""
+    weights_gpu: int
+    weights_cpu: int
+    kv_cache_gpu: int
+    kv_cache_cpu: int
+    compute_buffer: int
+
+    @property
+    def gpu(self) -> int:
+        return self.weights_gpu + self.kv_cache_gpu + (self.compute_buffer if self.weights_gpu else 0)
+
+    @property
+    def cpu(self) -> int:
+        return self.weights_cpu + self.kv_cache_cpu + (0 if self.weights_gpu else self.compute_buffer)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "gpu": self.gpu, "cpu": self.cpu}
+
+
+def free_gpu_memory() -> Optional[int]:
+    """Free VRAM in bytes on the first CUDA device, None if it cannot be queried"""
+    try:
+        import torch
+        if not torch.cuda.is_available():
+            return None
+        free, _ = torch.cuda.mem_get_info(0)
+        return free
+    except Exception:
+        return None
+
+
+def free_cpu_memory() -> Optional[int]:
+    """Available RAM in bytes, None without psutil"""
+    if psutil is None:
+        return None
+    return psutil.virtual_memory().available
+
+
+def cpu_threads():
+    """(generation threads, prompt processing threads), decoding is memory bound and scales with physical cores"""
+    logical = os.cpu_count() or 1
+    physical = psutil.cpu_count(logical=False) if psutil else None
+    return max(1, physical or logical // 2), logical
+
+
+def kv_cache_bytes_per_layer(info: GGUFInfo, n_ctx: int, bytes_per_value: float = KV_CACHE_TYPES["f16"][1]) -> int:
+    """K and V cache of one layer for n_ctx tokens"""
+    if not info.embedding_length or not info.head_count:
+        return 0
+    kv_embedding = info.embedding_length * (info.head_count_kv or info.head_count) // info.head_count
+    return int(2 * n_ctx * kv_embedding * bytes_per_value)
+
+
+def compute_buffer_bytes(info: GGUFInfo, n_ctx: int, n_ubatch: int, flash_attn: bool) -> int:
+    """
+    Rough size of llama.cpp's compute buffer.
+
+    Without flash attention the attention scores of a micro batch against the
+    whole context are materialized in f32, which dominates at long contexts.
+    """
+    if not info.embedding_length:
+        return 0
+    activations = n_ubatch * info.embedding_length * 4 * 8
+    if flash_attn or not info.head_count:
+        return activations
+    return activations + n_ubatch * n_ctx * info.head_count * 4
+
+
+def _context_config(model_data: Dict[str, Any]) -> Dict[str, Any]:
+    """The metadata.json "context" block, with a top-level "n_ctx" still honoured"""
+    config = dict(model_data.get("context") or {})
+    if model_data.get("n_ctx") and "n_ctx" not in config:
+        config["n_ctx"] = model_data["n_ctx"]
+    unknown = [key for key in config if key not in CONTEXT_CONFIG_KEYS]
+    if unknown:
+        logger.warning(f"{model_data.get('fileName')}: ignoring unknown context settings {unknown}")
+    return config
+
+
+def _kv_cache_type(value: Optional[str], default: str) -> str:
+    value = (value or default).lower()
+    if value not in KV_CACHE_TYPES:
+        raise ValueError(f"Unsupported KV cache type {value}, expected one of {list(KV_CACHE_TYPES)}")
+    return value
+
+
+def auto_context_length(info: Optional[GGUFInfo], max_context: int = MAX_AUTO_CONTEXT_LENGTH) -> int:
+    if info is None or not info.context_length:
+        return DEFAULT_CONTEXT_LENGTH
+    return min(info.context_length, max_context)
+
+
+def auto_gpu_layers(info: Optional[GGUFInfo], file_size: int, n_ctx: int, requested: int = -1,
+                    free_memory: Optional[int] = None, kv_bytes_per_value: float = KV_CACHE_TYPES["f16"][1]) -> int:
+    """
+    Number of layers to offload so the weights and KV cache fit in free VRAM.
+
+    Args:
+        info: GGUF header facts, offload is left as requested without them
+        file_size: Model file size in bytes, weights are spread evenly over the layers
+        n_ctx: Context length the KV cache is sized for
+        requested: Configured n_gpu_layers, -1 for all; explicit counts are only lowered
+        free_memory: Free VRAM in bytes, queried when None
+        kv_bytes_per_value: Bytes per K and V value of the configured cache types
+
+    Returns:
+        Layers to offload, -1 for all
+    """
+    if requested == 0 or info is None or not info.block_count:
+        return requested
+    free_memory = free_gpu_memory() if free_memory is None else free_memory
+    if free_memory is None:
+        # No CUDA device visible from here, llama.cpp keeps whatever its backend supports
+        return requested
+
+    # The output layer and embeddings take roughly one more layer's worth
+    layer_bytes = file_size / (info.block_count + 1) + kv_cache_bytes_per_layer(info, n_ctx, kv_bytes_per_value)
+    available = free_memory - GPU_MEMORY_RESERVE
+    layers = max(0, int(available // layer_bytes)) if layer_bytes > 0 else info.block_count + 1
+    wanted = info.block_count + 1 if requested < 0 else requested
+    if layers >= wanted:
+        return requested
+    logger.info(f"Offloading {layers}/{info.block_count + 1} layers to fit {free_memory / 1024 ** 3:.1f} GB free VRAM")
+    return layers
+
+
+def estimate_memory(info: Optional[GGUFInfo], file_size: int, sizing: ModelSizing, slots: int = 1) -> Optional[MemoryEstimate]:
+    """
+    Estimate the memory a model takes with a context configuration.
+
+    The KV cache of offloaded layers lives on the GPU with them, as llama.cpp
+    does by default. Every slot has its own context and offloaded weights,
+    weights left on the CPU are memory mapped once.
+
+    Returns:
+        MemoryEstimate, None without the GGUF header facts to size it from
+    """
+    if info is None or not info.block_count:
+        return None
+    layers = info.block_count + 1
+    offloaded = layers if sizing.n_gpu_layers < 0 else min(sizing.n_gpu_layers, layers)
+    gpu_share = offloaded / layers
+    kv_cache = kv_cache_bytes_per_layer(info, sizing.n_ctx, sizing.kv_bytes_per_value) * info.block_count
+    return MemoryEstimate(
+        weights_gpu=int(file_size * gpu_share) * slots,
+        weights_cpu=int(file_size * (1 - gpu_share)),
+        kv_cache_gpu=int(kv_cache * gpu_share) * slots,
+        kv_cache_cpu=int(kv_cache * (1 - gpu_share)) * slots,
+        compute_buffer=compute_buffer_bytes(info, sizing.n_ctx, sizing.n_ubatch, sizing.flash_attn) * slots,
+    )
+
+
+def check_memory(estimate: Optional[MemoryEstimate], free_gpu: Optional[int] = None, free_cpu: Optional[int] = None):
+    """
+    Refuse a configuration that would not fit, instead of letting llama.cpp fail or swap midway through loading.
+
+    Memory that cannot be queried (no CUDA device, no psutil) is not checked.
+
+    Raises:
+        ModelMemoryError: The GPU or CPU share of the estimate exceeds the free memory minus its reserve
+    """
+    if estimate is None:
+        return
+    free_gpu = free_gpu_memory() if free_gpu is None else free_gpu
+    free_cpu = free_cpu_memory() if free_cpu is None else free_cpu
+    gib = 1024 ** 3
+    if free_gpu is not None and estimate.gpu and estimate.gpu > free_gpu - GPU_MEMORY_RESERVE:
+        raise ModelMemoryError(f"needs {estimate.gpu / gib:.1f} GB of VRAM, {free_gpu / gib:.1f} GB free "
+                               f"({GPU_MEMORY_RESERVE / gib:.1f} GB reserved)")
+    if free_cpu is not None and estimate.cpu > free_cpu - CPU_MEMORY_RESERVE:
+        raise ModelMemoryError(f"needs {estimate.cpu / gib:.1f} GB of RAM, {free_cpu / gib:.1f} GB available "
+                               f"({CPU_MEMORY_RESERVE / gib:.1f} GB reserved)")
+
+
+def auto_size(model_data: Dict[str, Any], info: Optional[GGUFInfo], gpu_layers: int = -1,
+              n_ctx: Optional[int] = None, free_gpu: Optional[int] = None) -> ModelSizing:
+    """
+    Size the context, offload and threads of a model from its GGUF header and the machine.
+
+    The "context" block of metadata.json overrides any automatic choice. With
+    "long_context": true the context grows up to the trained length (capped at
+    MAX_LONG_CONTEXT_LENGTH) on a q8_0 KV cache with flash attention.
+
+    Args:
+        model_data: Model metadata, see CONTEXT_CONFIG_KEYS for the "context" block
+        info: GGUF header facts of the model
+        gpu_layers: Configured n_gpu_layers, -1 for all
+        n_ctx: Context length override
+        free_gpu: VRAM in bytes to offload into, queried when None
+
+    Returns:
+        ModelSizing: Settings to create the llama-cpp context with
+
+    Raises:
+        ValueError: The context block names an unsupported KV cache type
+    """
+    config = _context_config(model_data)
+    long_context = bool(config.get("long_context"))
+    default_kv_type = LONG_CONTEXT_KV_CACHE_TYPE if long_context else DEFAULT_KV_CACHE_TYPE
+    type_k = _kv_cache_type(config.get("type_k"), default_kv_type)
+    type_v = _kv_cache_type(config.get("type_v"), default_kv_type)
+    flash_attn = bool(config.get("flash_attn", long_context))
+    if type_v != "f16" and not flash_attn:
+        # llama.cpp only supports a quantized V cache inside the flash attention kernel
+        logger.warning(f"{model_data.get('fileName')}: {type_v} V cache requires flash attention, enabling it")
+        flash_attn = True
+    kv_bytes_per_value = (KV_CACHE_TYPES[type_k][1] + KV_CACHE_TYPES[type_v][1]) / 2
+
+    n_ctx = n_ctx or config.get("n_ctx") or auto_context_length(
+        info, MAX_LONG_CONTEXT_LENGTH if long_context else MAX_AUTO_CONTEXT_LENGTH)
+    n_batch = int(config.get("n_batch") or DEFAULT_BATCH_SIZE)
+    n_ubatch = min(int(config.get("n_ubatch") or DEFAULT_BATCH_SIZE), n_batch)
+    n_gpu_layers = auto_gpu_layers(info, model_data.get("file_size_bytes") or 0, n_ctx, gpu_layers,
+                                   free_memory=free_gpu, kv_bytes_per_value=kv_bytes_per_value)
+    n_threads, n_threads_batch = cpu_threads()
+    if n_gpu_layers < 0 or (info and info.block_count and n_gpu_layers > info.block_count):
+        # Fully offloaded, the CPU only feeds the GPU
+        n_threads = min(n_threads, 4)
+    return ModelSizing(n_ctx=n_ctx, n_gpu_layers=n_gpu_layers,
+                       n_threads=config.get("n_threads") or n_threads,
+                       n_threads_batch=config.get("n_threads_batch") or n_threads_batch,
+                       type_k=type_k, type_v=type_v, flash_attn=flash_attn, n_batch=n_batch, n_ubatch=n_ubatch)
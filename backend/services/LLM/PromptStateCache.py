@@ -0,0 +1,107 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Sequence, Tuple
+from services.lib.LAV_logger import logger
+
+# Host memory kept for KV snapshots, a 7B model needs roughly 0.1-0.5 MB per cached token
+DEFAULT_STATE_CACHE_SIZE = 2 * 1024 * 1024 * 1024
+# Live contexts diverging by fewer tokens than this are not worth a snapshot
+MIN_SNAPSHOT_TOKENS = 64
+
+
+def common_prefix_length(a: Sequence[int], b: Sequence[int]) -> int:
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+def state_size(state: Any) -> int:
+    """Bytes held by a llama_cpp LlamaState, including its copied logits and token IDs"""
+    return state.llama_state_size + state.scores.nbytes + state.input_ids.nbytes
+
+
+class PromptStateCache:
+    """
+    LRU cache of llama.cpp context snapshots keyed by the tokens they contain.
+
+    A lookup returns the snapshot sharing the longest token prefix with a new
+    prompt, so loading it leaves only the remaining tokens to prefill. Entries
+    are evicted least recently used first once the total size exceeds
+    capacity_bytes. Snapshots are only valid for the model that made them,
+    so each model looks up and stores them under its own namespace.
+    """
+
+    def __init__(self, capacity_bytes: int = DEFAULT_STATE_CACHE_SIZE):
+        self.capacity_bytes = capacity_bytes
+        self._entries: "OrderedDict[Tuple[str, Tuple[int, ...]], Any]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def find(self, tokens: Sequence[int], namespace: str = "") -> Tuple[Optional[Any], int]:
+        """
+        Find the snapshot sharing the longest prefix with tokens.
+
+        Args:
+            tokens: Prompt tokens
+            namespace: Model the snapshot must belong to
+
+        Returns:
+            (state, prefix length), (None, 0) if no snapshot shares a prefix
+        """
+        with self._lock:
+            best_key, best_length = None, 0
+            for key in self._entries:
+                if key[0] != namespace:
+                    continue
+                length = common_prefix_length(key[1], tokens)
+                # A snapshot longer than the shared prefix would have to be rolled back, still a win
+                if length > best_length:
+                    best_key, best_length = key, length
+            if best_key is None:
+                return None, 0
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key], best_length
+
+    def contains(self, tokens: Sequence[int], namespace: str = "") -> bool:
+        with self._lock:
+            return (namespace, tuple(tokens)) in self._entries
+
+    def put(self, tokens: Sequence[int], state: Any, namespace: str = ""):
+        key = (namespace, tuple(tokens))
+        size = state_size(state)
+        if size > self.capacity_bytes:
+            logger.debug(f"KV snapshot of {size} bytes exceeds the cache capacity, not cached")
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= state_size(previous)
+            # A snapshot made redundant by a longer one with the same start is dropped
+            for other in [k for k in self._entries
+                          if k[0] == namespace and len(k[1]) < len(key[1]) and key[1][:len(k[1])] == k[1]]:
+                self._size -= state_size(self._entries.pop(other))
+            self._entries[key] = state
+            self._size += size
+            while self._size > self.capacity_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= state_size(evicted)
+
+    def clear(self, namespace: Optional[str] = None):
+        """Drop all snapshots, or only those of one model"""
+        with self._lock:
+            if namespace is None:
+                self._entries.clear()
+                self._size = 0
+                return
+            for key in [k for k in self._entries if k[0] == namespace]:
+                self._size -= state_size(self._entries.pop(key))
@@ -0,0 +1,169 @@
+import json
+import threading
+from typing import Any, Dict, Generator, Iterator, List, Optional, Tuple
+import httpx
+from services.lib.LAV_logger import logger
+from .BaseLLM import BaseLLM, CHAT_MAX_TOKENS, CONTINUE_MAX_TOKENS
+from .TokenBudget import TokenBudget
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:  # httpx falls back to HTTP/1.1 keep-alive connections without h2
+    HTTP2_AVAILABLE = False
+
+# Model "type" of models served by another machine, e.g. a LAN PC running llama-server:
+# {"type": "remote", "fileName": "lan-llama", "base_url": "http://192.168.1.20:8080", "model": "...",
+#  "api_key_env": "LAN_LLM_API_KEY", "context": {"n_ctx": 8192}}
+REMOTE_MODEL_TYPE = "remote"
+# Seconds. The read timeout applies between streamed chunks, so it also bounds a stalled prefill.
+DEFAULT_REMOTE_TIMEOUTS = {
+    "connect": 5.0,
+    "read": 120.0,
+    "write": 30.0,
+    "pool": 30.0,
+}
+DEFAULT_MAX_CONNECTIONS = 8
+DEFAULT_KEEPALIVE_EXPIRY = 120.0  # seconds
+# Tokens are only estimated without the remote tokenizer, err on the side of trimming
+ESTIMATED_BYTES_PER_TOKEN = 3
+
+_clients: Dict[Tuple[str, Optional[str]], httpx.Client] = {}
+_clients_lock = threading.Lock()
+
+
+def shared_client(base_url: str, api_key: Optional[str] = None) -> httpx.Client:
+    """
+    Pooled client for a remote server, shared by all slots and model instances using it.
+
+    Connections are kept alive between requests and reloads. HTTP/2 multiplexes
+    concurrent slots over one connection when the server negotiates it (TLS
+    with ALPN), plain http:// servers such as llama-server get HTTP/1.1
+    keep-alive connections.
+    """
+    key = (base_url.rstrip("/"), api_key)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None or client.is_closed:
+            client = _clients[key] = httpx.Client(
+                base_url=key[0],
+                http2=HTTP2_AVAILABLE,
+                headers={"Authorization": f"Bearer {api_key}"} if api_key else None,
+                timeout=httpx.Timeout(**DEFAULT_REMOTE_TIMEOUTS),
+                limits=httpx.Limits(max_connections=DEFAULT_MAX_CONNECTIONS,
+                                    max_keepalive_connections=DEFAULT_MAX_CONNECTIONS,
+                                    keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY)
+            )
+        return client
+
+
+def close_clients():
+    """Close the pooled connections of every remote server"""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+def estimate_tokens(text: str) -> range:
+    """Stand-in for tokenize() in TokenBudget, only the length of the result is used"""
+    return range(len(text.encode("utf-8")) // ESTIMATED_BYTES_PER_TOKEN + 1)
+
+
+class RemoteLLM(BaseLLM):
+    """
+    Text model served over an OpenAI-compatible API by another machine.
+
+    Chat turns stream from /v1/chat/completions. Continuing a response uses
+    /v1/completions with a ChatML prompt left open, as TextLLM does locally.
+    Closing the returned generator (client disconnect) closes the HTTP stream,
+    which stops generation on servers that watch their connections, like
+    llama-server.
+    """
+    supports_continuation = True
+    # Slots are concurrent requests over the shared connection pool, the server decides how to batch them
+    supports_slots = True
+
+    def __init__(self, base_url: str, model: Optional[str] = None, api_key: Optional[str] = None,
+                 n_ctx: int = 4096, sampling_extensions: bool = True):
+        """
+        Args:
+            base_url: Server address without the /v1 suffix, e.g. http://192.168.1.20:8080
+            model: Model name sent with each request, servers hosting one model ignore it
+            api_key: Bearer token, if the server requires one
+            n_ctx: Context length of the remote model, history is trimmed to fit it
+            sampling_extensions: Send top_k, min_p and repeat_penalty, turn off for servers that reject them
+        """
+        self.base_url = base_url
+        self.model = model
+        self.context_length = n_ctx
+        self.sampling_extensions = sampling_extensions
+        self.client = shared_client(base_url, api_key)
+        self.token_budget = TokenBudget(estimate_tokens, n_ctx)
+
+    def _body(self, max_tokens: int, top_k: int, top_p: float, min_p: float, repeat_penalty: float,
+              temperature: float, seed: int) -> Dict[str, Any]:
+        body = {"stream": True, "max_tokens": max_tokens, "temperature": temperature, "top_p": top_p}
+        if self.model:
+            body["model"] = self.model
+        if seed >= 0:
+            body["seed"] = seed
+        if self.sampling_extensions:
+            # Accepted by llama-server, vLLM and most local servers on top of the OpenAI parameters
+            body.update(top_k=top_k, min_p=min_p, repeat_penalty=repeat_penalty)
+        return body
+
+    def _stream(self, path: str, body: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """POST a streaming request and yield the JSON chunks of its server-sent events"""
+        try:
+            with self.client.stream("POST", path, json=body) as response:
+                if response.status_code != 200:
+                    response.read()
+                    logger.error(f"Remote LLM {self.base_url}{path} answered {response.status_code}: {response.text[:500]}")
+                    return
+                for line in response.iter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    # Read on to the end of the body after [DONE], a fully read response returns its connection to the pool
+                    if data != "[DONE]":
+                        yield json.loads(data)
+        except httpx.HTTPError as e:
+            logger.error(f"Error streaming from remote LLM {self.base_url}{path}: {e}")
+
+    def get_chat_completion(self, text: str, history: list = [], system_prompt: str = "",
+                            top_k: int = 40, top_p: float = 0.95, min_p: float = 0.05,
+                            repeat_penalty: float = 1.1, temperature: float = 0.8, seed: int = -1) -> Generator[str, None, None]:
+        messages = [{"role": "system", "content": system_prompt}, *history, {"role": "user", "content": text}]
+        messages = self.token_budget.trim(messages, max_tokens=CHAT_MAX_TOKENS)
+
+        logger.info(f"Remote inference parameters - top_k: {top_k}, top_p: {top_p}, min_p: {min_p}, repeat_penalty: {repeat_penalty}, temperature: {temperature}, seed: {seed}")
+        body = self._body(CHAT_MAX_TOKENS, top_k, top_p, min_p, repeat_penalty, temperature, seed)
+        body["messages"] = messages
+        for chunk in self._stream("/v1/chat/completions", body):
+            choices = chunk.get("choices") or [{}]
+            content = (choices[0].get("delta") or {}).get("content")
+            if content:
+                yield content
+
+    def complete_current_response(self, history: List[Dict[str, str]], system_prompt: str = "",
+                                  top_k: int = 40, top_p: float = 0.95, min_p: float = 0.05,
+                                  repeat_penalty: float = 1.1, temperature: float = 0.8, seed: int = -1) -> Generator[str, None, None]:
+        """Continue the last message of the history, see TextLLM.complete_current_response"""
+        if not history:
+            logger.warning("No history provided to complete")
+            return
+
+        messages = [{"role": "system", "content": system_prompt}, *history]
+        messages = self.token_budget.trim(messages, max_tokens=CONTINUE_MAX_TOKENS)
+        # ChatML with the last message left open, the remote model must use the same template as local ones
+        prompt = "<|im_end|>\n".join(f"<|im_start|>{message['role']}\n{message['content']}" for message in messages)
+
+        logger.info(f"Remote complete response parameters - top_k: {top_k}, top_p: {top_p}, min_p: {min_p}, repeat_penalty: {repeat_penalty}, temperature: {temperature}, seed: {seed}")
+        body = self._body(CONTINUE_MAX_TOKENS, top_k, top_p, min_p, repeat_penalty, temperature, seed)
+        body.update(prompt=prompt, stop=["<|im_end|>", "<|im_start|>"])
+        for chunk in self._stream("/v1/completions", body):
+            choices = chunk.get("choices") or [{}]
+            text = choices[0].get("text")
+            if text:
+                yield text
@@ -0,0 +1,102 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from services.lib.LAV_logger import logger
+from services.lib.metrics import LLM_SLOT_WAIT_SECONDS, LLM_SLOTS_BUSY
+
+DEFAULT_LLM_SLOTS = 1
+
+
+@dataclass
+class ContextSlot:
+    """One llama.cpp context of a model, used by a single request at a time"""
+    index: int
+    instance: Any
+    busy: bool = False
+    # Session whose conversation the context holds, its next request gets this slot back
+    session_id: Optional[str] = None
+    last_used: float = field(default_factory=time.monotonic)
+    requests: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "busy": self.busy,
+            "session_id": self.session_id,
+            "requests": self.requests,
+            "idle_seconds": None if self.busy else round(time.monotonic() - self.last_used, 1)
+        }
+
+
+class SlotPool:
+    """
+    Contexts of one model that requests take turns on.
+
+    A llama.cpp context is not safe to use from two threads, so each request
+    holds a slot for the whole generation. A request is given the slot that
+    last served its session, which still holds that conversation in its KV
+    cache. Otherwise it gets the slot idle the longest, so the contexts of
+    recently active sessions survive. When every slot is busy, acquire()
+    blocks until one is released.
+    """
+
+    def __init__(self, instances: List[Any]):
+        """
+        Initialize the pool.
+
+        Args:
+            instances: One model instance (TextLLM or VisionLLM) per slot
+        """
+        self.slots = [ContextSlot(index, instance) for index, instance in enumerate(instances)]
+        self._condition = threading.Condition()
+
+    @property
+    def instances(self) -> List[Any]:
+        return [slot.instance for slot in self.slots]
+
+    def _pick(self, session_id: Optional[str]) -> Optional[ContextSlot]:
+        free = [slot for slot in self.slots if not slot.busy]
+        if not free:
+            return None
+        if session_id is not None:
+            for slot in free:
+                if slot.session_id == session_id:
+                    return slot
+        return min(free, key=lambda slot: slot.last_used)
+
+    def acquire(self, session_id: Optional[str] = None) -> ContextSlot:
+        """
+        Take a slot, waiting while all of them are busy.
+
+        Args:
+            session_id: Client session of the request, used to return to the slot holding its conversation
+        """
+        start_time = time.monotonic()
+        with self._condition:
+            while (slot := self._pick(session_id)) is None:
+                self._condition.wait()
+            slot.busy = True
+            slot.requests += 1
+            previous_session = slot.session_id
+            slot.session_id = session_id
+
+        wait_time = time.monotonic() - start_time
+        LLM_SLOT_WAIT_SECONDS.observe(wait_time)
+        LLM_SLOTS_BUSY.inc()
+        if session_id is not None and previous_session not in (None, session_id):
+            logger.debug(f"Session {session_id} takes LLM slot {slot.index} over from {previous_session}")
+        return slot
+
+    def release(self, slot: ContextSlot):
+        with self._condition:
+            if not slot.busy:
+                return
+            slot.busy = False
+            slot.last_used = time.monotonic()
+            self._condition.notify()
+        LLM_SLOTS_BUSY.dec()
+
+    def status(self) -> List[Dict[str, Any]]:
+        with self._condition:
+            return [slot.to_dict() for slot in self.slots]
@@ -0,0 +1,153 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+import numpy as np
+from llama_cpp import Llama
+from llama_cpp.llama_speculative import LlamaDraftModel, LlamaPromptLookupDecoding
+from services.lib.LAV_logger import logger
+from services.lib.metrics import LLM_DRAFT_TOKENS_TOTAL
+
+# Speculative decoding modes
+SPECULATIVE_OFF = "off"
+PROMPT_LOOKUP = "prompt_lookup"
+DRAFT_MODEL = "draft_model"
+
+# Prompt lookup drafts are free to make, so they can be long
+DEFAULT_PROMPT_LOOKUP_TOKENS = 10
+DEFAULT_MAX_NGRAM_SIZE = 2
+# Every token from a draft model costs a decode step of the draft model
+DEFAULT_DRAFT_MODEL_TOKENS = 4
+
+
+@dataclass
+class SpeculativeStats:
+    """Drafting statistics accumulated over completions"""
+    mode: str
+    completions: int = 0
+    tokens: int = 0
+    draft_calls: int = 0
+    drafted: int = 0
+    accepted: int = 0
+    decode_seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, tokens: int, draft_calls: int, drafted: int, decode_seconds: float) -> int:
+        """
+        Add one completion.
+
+        Every verification step yields the accepted draft tokens plus one token
+        sampled by the model itself, and the first token comes from the prompt
+        pass, so accepted = tokens - 1 - draft_calls. The final step may be cut
+        short by a stop string, which makes this a close lower bound.
+
+        Returns:
+            Accepted draft tokens of this completion
+        """
+        accepted = min(drafted, max(0, tokens - 1 - draft_calls))
+        with self._lock:
+            self.completions += 1
+            self.tokens += tokens
+            self.draft_calls += draft_calls
+            self.drafted += drafted
+            self.accepted += accepted
+            self.decode_seconds += decode_seconds
+        LLM_DRAFT_TOKENS_TOTAL.inc(accepted, result="accepted")
+        LLM_DRAFT_TOKENS_TOTAL.inc(drafted - accepted, result="rejected")
+        return accepted
+
+    @property
+    def acceptance_rate(self) -> float:
+        return self.accepted / self.drafted if self.drafted else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.tokens / self.decode_seconds if self.decode_seconds > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "completions": self.completions,
+            "tokens": self.tokens,
+            "drafted": self.drafted,
+            "accepted": self.accepted,
+            "acceptance_rate": round(self.acceptance_rate, 3),
+            "tokens_per_second": round(self.tokens_per_second, 2)
+        }
+
+
+class MeasuredDraftModel(LlamaDraftModel):
+    """Counts the calls and proposed tokens of a draft model"""
+
+    def __init__(self, draft_model: LlamaDraftModel):
+        self.draft_model = draft_model
+        self.calls = 0
+        self.drafted = 0
+
+    def __call__(self, input_ids: np.ndarray, /, **kwargs: Any) -> np.ndarray:
+        draft = self.draft_model(input_ids, **kwargs)
+        self.calls += 1
+        self.drafted += len(draft)
+        return draft
+
+    def take_counts(self):
+        """Counts since the last call, (calls, drafted tokens)"""
+        counts = self.calls, self.drafted
+        self.calls = self.drafted = 0
+        return counts
+
+
+class GGUFDraftModel(LlamaDraftModel):
+    """
+    Drafts tokens greedily with a small GGUF model sharing the target's vocabulary.
+
+    The draft context keeps the longest prefix shared with the previous call,
+    so each call only evaluates the tokens accepted since then.
+    """
+
+    def __init__(self, model_path: str, n_ctx: int = 4096, n_gpu_layers: int = -1,
+                 num_pred_tokens: int = DEFAULT_DRAFT_MODEL_TOKENS):
+        self.num_pred_tokens = num_pred_tokens
+        self.llm = Llama(model_path=model_path, n_ctx=n_ctx, n_gpu_layers=n_gpu_layers, verbose=False)
+
+    def __call__(self, input_ids: np.ndarray, /, **kwargs: Any) -> np.ndarray:
+        draft = []
+        for token in self.llm.generate(input_ids.tolist(), top_k=1, temp=0.0, reset=True):
+            if token == self.llm.token_eos():
+                break
+            draft.append(token)
+            if len(draft) >= self.num_pred_tokens:
+                break
+        return np.array(draft, dtype=np.intc)
+
+
+def create_draft_model(mode: str, draft_model_path: Optional[str] = None, n_ctx: int = 4096,
+                       n_gpu_layers: int = -1, num_pred_tokens: Optional[int] = None) -> Optional[MeasuredDraftModel]:
+    """
+    Create the draft model of a speculative decoding mode.
+
+    Args:
+        mode: PROMPT_LOOKUP, DRAFT_MODEL or SPECULATIVE_OFF
+        draft_model_path: GGUF file of the draft model, required for DRAFT_MODEL
+        n_ctx: Context length, must match the target model
+        n_gpu_layers: Layers of the draft model offloaded to the GPU
+        num_pred_tokens: Tokens proposed per step, None for the mode's default
+
+    Returns:
+        The draft model wrapped for measuring, None when speculation is off
+    """
+    if mode == PROMPT_LOOKUP:
+        draft_model = LlamaPromptLookupDecoding(max_ngram_size=DEFAULT_MAX_NGRAM_SIZE,
+                                                num_pred_tokens=num_pred_tokens or DEFAULT_PROMPT_LOOKUP_TOKENS)
+    elif mode == DRAFT_MODEL:
+        if not draft_model_path:
+            raise ValueError("Draft model speculation needs a draft model path")
+        start_time = time.time()
+        draft_model = GGUFDraftModel(draft_model_path, n_ctx, n_gpu_layers,
+                                     num_pred_tokens or DEFAULT_DRAFT_MODEL_TOKENS)
+        logger.info(f"Draft model {draft_model_path} loaded in {time.time() - start_time:.2f}s")
+    elif mode == SPECULATIVE_OFF:
+        return None
+    else:
+        raise ValueError(f"Unknown speculative decoding mode: {mode}")
+    return MeasuredDraftModel(draft_model)
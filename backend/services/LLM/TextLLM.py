@@ -2,31 +2,140 @@ from services.lib.LAV_logger import logger
 import os
 from typing import Generator, Optional, Dict, List, Union
 from llama_cpp import Llama
-from .BaseLLM import BaseLLM
+from .BaseLLM import BaseLLM, CHAT_MAX_TOKENS, CONTINUE_MAX_TOKENS
 from datetime import datetime
 from jinja2 import Environment
 import llama_cpp.llama_chat_format as llama_chat_format
 import json
+import time
+from .PromptStateCache import PromptStateCache, MIN_SNAPSHOT_TOKENS, common_prefix_length
+from .TokenBudget import TokenBudget
+from .SpeculativeDecoding import SpeculativeStats, SPECULATIVE_OFF, create_draft_model
+
 class TextLLM(BaseLLM):
-    def __init__(self, model_path, n_ctx=4096, n_gpu_layers=-1, seed=-1):
+    supports_continuation = True
+    supports_slots = True
+
+    def __init__(self, model_path, n_ctx=4096, n_gpu_layers=-1, seed=-1, state_cache: Optional[PromptStateCache] = None,
+                 speculative: Optional[Dict] = None, n_threads: Optional[int] = None, n_threads_batch: Optional[int] = None,
+                 type_k: Optional[int] = None, type_v: Optional[int] = None, flash_attn: bool = False,
+                 n_batch: int = 512, n_ubatch: int = 512):
+        """
+        Args:
+            speculative: Opt-in speculative decoding, {"mode": "prompt_lookup" or "draft_model",
+                "draft_model_path": ..., "num_pred_tokens": ...}. Drafting keeps the logits of every
+                position, so KV snapshots get larger and fewer fit in the state cache.
+            type_k, type_v: ggml_type of the K and V cache, None for f16, see ModelSizing.KV_CACHE_TYPES.
+                A quantized V cache needs flash_attn.
+        """
         self.context_length = n_ctx
         self.chat_format = "chatml"
+        # Snapshots of the KV cache, shared with later instances of the same model so they survive unloading
+        self.state_cache = state_cache if state_cache is not None else PromptStateCache()
+        speculative = speculative or {}
+        # Snapshots only load into a context of the same size and KV cache types. Speculative
+        # decoding keeps the logits of every position, which changes the shape of the saved scores.
+        self.state_namespace = f"{model_path}:{n_ctx}:{type_k}:{type_v}:{speculative.get('mode', SPECULATIVE_OFF)}"
+        # Set when the instance is unloaded while a stream may still be running on it
+        self.save_state_on_finish = False
 
         # Create Jinja2 environment with strftime_now function
         env = Environment()
         env.globals['strftime_now'] = lambda fmt: datetime.now().strftime(fmt)
-        
+
+        self.draft_model = create_draft_model(
+            speculative.get("mode", SPECULATIVE_OFF), speculative.get("draft_model_path"), n_ctx, n_gpu_layers,
+            speculative.get("num_pred_tokens"))
+        self.speculative_stats = SpeculativeStats(speculative.get("mode", SPECULATIVE_OFF))
+
         self.llm = Llama(
             model_path=model_path,
             n_ctx=n_ctx,
             n_gpu_layers=n_gpu_layers,
+            n_threads=n_threads,
+            n_threads_batch=n_threads_batch,
+            n_batch=n_batch,
+            n_ubatch=n_ubatch,
+            type_k=type_k,
+            type_v=type_v,
+            flash_attn=flash_attn,
             seed=seed,
             verbose=False,
             chat_format=self.chat_format,
             chat_handler=None,
             chat_template=None,
-            jinja2_env=env
+            jinja2_env=env,
+            draft_model=self.draft_model
         )
+        self.token_budget = TokenBudget(
+            lambda text: self.llm.tokenize(text.encode("utf-8"), add_bos=False, special=True), n_ctx)
+
+    def _restore_prefix(self, prompt: str, system_prompt: str):
+        """
+        Prepare the context so prefill starts at the first token that differs from a cached state.
+
+        llama-cpp already skips the prefix shared with the live context. This
+        adds snapshots on top: the live context is saved before a different
+        conversation overwrites it, the snapshot sharing the longest prefix
+        with the prompt is loaded when it beats the live context, and the
+        state right after the system prompt is saved per character.
+        """
+        tokens = self.llm.tokenize(prompt.encode("utf-8"), add_bos=True, special=True)
+        system_tokens = self.llm.tokenize(f"<|im_start|>system\n{system_prompt}<|im_end|>\n".encode("utf-8"),
+                                          add_bos=True, special=True)
+        if tokens[:len(system_tokens)] != system_tokens:
+            system_tokens = []  # Tokenized differently inside the full prompt, no clean boundary to snapshot at
+
+        live_tokens = self.llm._input_ids.tolist()
+        reused = common_prefix_length(live_tokens, tokens)
+        if len(live_tokens) - reused >= MIN_SNAPSHOT_TOKENS and not self.state_cache.contains(live_tokens, self.state_namespace):
+            # Another conversation or character is about to be overwritten, keep it for when it comes back
+            self.state_cache.put(live_tokens, self.llm.save_state(), self.state_namespace)
+
+        state, cached = self.state_cache.find(tokens, self.state_namespace)
+        if state is not None and cached > reused:
+            self.llm.load_state(state)
+            reused = cached
+
+        if reused < len(system_tokens) and MIN_SNAPSHOT_TOKENS <= len(system_tokens) < len(tokens):
+            # Prefill the system prompt alone so its state can be snapshot for the next turn of this character
+            self.llm.n_tokens = reused
+            self.llm.eval(system_tokens[reused:])
+            self.state_cache.put(system_tokens, self.llm.save_state(), self.state_namespace)
+            reused = len(system_tokens)
+
+        logger.debug(f"KV cache reuse: {reused}/{len(tokens)} prompt tokens, "
+                     f"{len(self.state_cache)} snapshots ({self.state_cache.size / 1024 / 1024:.0f} MB)")
+
+    def _save_final_state(self):
+        """Snapshot the conversation before an unloaded instance is freed"""
+        if self.save_state_on_finish and self.llm.n_tokens >= MIN_SNAPSHOT_TOKENS:
+            self.state_cache.put(self.llm._input_ids.tolist(), self.llm.save_state(), self.state_namespace)
+
+    def _measure_speculation(self, chunks):
+        """Yield from a completion stream, recording draft acceptance and decode speed when speculating"""
+        if self.draft_model is None:
+            yield from chunks
+            return
+        self.draft_model.take_counts()
+        tokens = 0
+        first_token_time = None
+        try:
+            for chunk in chunks:
+                choice = chunk["choices"][0]
+                # Streamed chunks carry one token each, the chat role and finish chunks carry none
+                if choice.get("text") or choice.get("delta", {}).get("content"):
+                    if first_token_time is None:
+                        first_token_time = time.time()
+                    tokens += 1
+                yield chunk
+        finally:
+            draft_calls, drafted = self.draft_model.take_counts()
+            decode_seconds = time.time() - first_token_time if first_token_time else 0.0
+            accepted = self.speculative_stats.record(tokens, draft_calls, drafted, decode_seconds)
+            if drafted:
+                logger.debug(f"Speculative decoding accepted {accepted}/{drafted} draft tokens, "
+                             f"{tokens / decode_seconds if decode_seconds > 0 else 0:.1f} tokens/s")
 
     def get_chat_completion(self, text: str, history: list = [], system_prompt: str = "", 
                           top_k: int = 40, top_p: float = 0.95, min_p: float = 0.05, 
@@ -41,14 +150,9 @@ class TextLLM(BaseLLM):
 
         messages.append({"role": "user", "content": text})
 
-        def count_tokens(msg_list):
-            result = sum(len(self.llm.tokenize(
-                str.encode(msg['content']))) for msg in msg_list)
-            logger.debug(f"Tokens_in_context = {result}")
-            return result
+        messages = self.token_budget.trim(messages, max_tokens=CHAT_MAX_TOKENS)
 
-        while count_tokens(messages) > self.context_length and len(messages) > 1:
-            messages.pop(1)
+        self._restore_prefix(llama_chat_format.format_chatml(messages).prompt, system_prompt)
 
         # Log sampling parameters before inference
         logger.info(f"Inference parameters - top_k: {top_k}, top_p: {top_p}, min_p: {min_p}, repeat_penalty: {repeat_penalty}, temperature: {temperature}, seed: {seed}")
@@ -56,7 +160,7 @@ class TextLLM(BaseLLM):
         completion_chunks = self.llm.create_chat_completion(
             messages, 
             stream=True, 
-            max_tokens=1024,
+            max_tokens=CHAT_MAX_TOKENS,
             temperature=temperature,
             top_k=top_k,
             top_p=top_p,
@@ -65,11 +169,14 @@ class TextLLM(BaseLLM):
             seed=seed
         )
         
-        for completion_chunk in completion_chunks:
-            if "content" in completion_chunk["choices"][0]["delta"].keys():
-                yield completion_chunk["choices"][0]["delta"]["content"]
-            else:
-                pass
+        try:
+            for completion_chunk in self._measure_speculation(completion_chunks):
+                if "content" in completion_chunk["choices"][0]["delta"].keys():
+                    yield completion_chunk["choices"][0]["delta"]["content"]
+                else:
+                    pass
+        finally:
+            self._save_final_state()
 
     def complete_current_response(self, history: List[Dict[str, str]], system_prompt: str = "",
                                 top_k: int = 40, top_p: float = 0.95, min_p: float = 0.05, 
@@ -98,14 +205,7 @@ class TextLLM(BaseLLM):
         messages = [{"role": "system", "content": system_prompt}]
         messages.extend(history)
 
-        def count_tokens(msg_list):
-            result = sum(len(self.llm.tokenize(
-                str.encode(msg['content']))) for msg in msg_list)
-            logger.debug(f"Tokens_in_context = {result}")
-            return result
-
-        while count_tokens(messages) > self.context_length and len(messages) > 1:
-            messages.pop(1)
+        messages = self.token_budget.trim(messages, max_tokens=CONTINUE_MAX_TOKENS)
 
         # apply chatml format to the messages
         logger.debug(f"Messages: {messages}")
@@ -131,13 +231,15 @@ class TextLLM(BaseLLM):
         logger.debug(f"Prompt: {prompt}")
         logger.debug(f"Stop: {stop}")
 
+        self._restore_prefix(prompt, system_prompt)
+
         # Log sampling parameters before inference
         logger.info(f"Complete response parameters - top_k: {top_k}, top_p: {top_p}, min_p: {min_p}, repeat_penalty: {repeat_penalty}, temperature: {temperature}, seed: {seed}")
 
         completion_chunks = self.llm.create_completion(
             prompt, 
             stream=True, 
-            max_tokens=2048,  # Increased to allow for longer completions
+            max_tokens=CONTINUE_MAX_TOKENS,
             temperature=temperature,
             top_k=top_k,
             top_p=top_p,
@@ -148,14 +250,14 @@ class TextLLM(BaseLLM):
         )
 
         
-        for completion_chunk in completion_chunks:
-            yield completion_chunk["choices"][0]["text"]
-        else:
-            pass
+        try:
+            for completion_chunk in self._measure_speculation(completion_chunks):
+                yield completion_chunk["choices"][0]["text"]
+        finally:
+            self._save_final_state()
 
 if __name__ == "__main__":
     current_module_directory = os.path.dirname(__file__)
-    import time
     startTime = time.time()
     text_LLM = TextLLM(
         model_path=os.path.join(current_module_directory,"Models", "dolphin-2.6-mistral-7b.Q4_0", "dolphin-2.6-mistral-7b.Q4_0.gguf")
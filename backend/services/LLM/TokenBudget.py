@@ -0,0 +1,112 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Sequence
+from services.lib.LAV_logger import logger
+
+# Token counts remembered per message content, a long session repeats the same history every turn
+DEFAULT_MEMO_SIZE = 4096
+# Counted for each image part of a vision message, LLaVA 1.6 uses up to 5 tiles of 576 tokens
+DEFAULT_IMAGE_TOKENS = 2880
+
+# ChatML framing around every message and the assistant primer opening the reply
+CHATML_MESSAGE_TEMPLATE = "<|im_start|>{role}\n<|im_end|>\n"
+CHATML_REPLY_PRIMER = "<|im_start|>assistant\n"
+
+
+class TokenBudget:
+    """
+    Fits chat messages into the context window.
+
+    Token counts are memoized per message by a hash of the content, so only
+    new messages are tokenized. Trimming drops the oldest history in a single
+    pass over prefix sums instead of recounting everything after each
+    removal. The budget includes the chat template framing of each message
+    and leaves room for the tokens the reply may generate.
+    """
+
+    def __init__(self, tokenize: Callable[[str], Sequence[int]], context_length: int,
+                 image_tokens: int = DEFAULT_IMAGE_TOKENS, memo_size: int = DEFAULT_MEMO_SIZE):
+        """
+        Initialize the budget.
+
+        Args:
+            tokenize: Tokenizes text without adding BOS, special tokens parsed
+            context_length: Context window of the model in tokens
+            image_tokens: Tokens counted per image part of list content
+            memo_size: Maximum number of memoized message counts
+        """
+        self.tokenize = tokenize
+        self.context_length = context_length
+        self.image_tokens = image_tokens
+        self.memo_size = memo_size
+        self._memo: "OrderedDict[bytes, int]" = OrderedDict()
+        self._role_overhead: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # BOS and the assistant primer are added once per prompt
+        self.prompt_overhead = 1 + len(tokenize(CHATML_REPLY_PRIMER))
+
+    def _text_tokens(self, text: str) -> int:
+        key = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            count = self._memo.get(key)
+            if count is not None:
+                self._memo.move_to_end(key)
+                return count
+        count = len(self.tokenize(text))
+        with self._lock:
+            self._memo[key] = count
+            if len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return count
+
+    def _overhead(self, role: str) -> int:
+        overhead = self._role_overhead.get(role)
+        if overhead is None:
+            overhead = self._role_overhead[role] = len(self.tokenize(CHATML_MESSAGE_TEMPLATE.format(role=role)))
+        return overhead
+
+    def count(self, message: Dict[str, Any]) -> int:
+        """Tokens a message takes in the prompt, including its template framing"""
+        content = message.get("content") or ""
+        if isinstance(content, str):
+            tokens = self._text_tokens(content)
+        else:
+            # Vision messages: a list of {"type": "text", "text": ...} and {"type": "image_url", ...} parts
+            tokens = sum(self._text_tokens(part.get("text", "")) if part.get("type") == "text" else self.image_tokens
+                         for part in content)
+        return tokens + self._overhead(message.get("role", "user"))
+
+    def trim(self, messages: List[Dict[str, Any]], max_tokens: int = 0) -> List[Dict[str, Any]]:
+        """
+        Drop the oldest history messages until the prompt and reply fit the context.
+
+        The first (system) message and the last message are always kept.
+
+        Args:
+            messages: System message, history and the final message
+            max_tokens: Tokens reserved for the generated reply
+
+        Returns:
+            The messages that fit, the input list itself if nothing was dropped
+        """
+        budget = self.context_length - max_tokens - self.prompt_overhead
+        counts = [self.count(message) for message in messages]
+        total = sum(counts)
+        if total <= budget or len(messages) <= 2:
+            return messages
+
+        # Running prefix sum over the history, stop at the first (oldest) cut that fits
+        excess = total - budget
+        dropped = 0
+        saved = 0
+        for count in counts[1:-1]:
+            if saved >= excess:
+                break
+            saved += count
+            dropped += 1
+
+        if saved < excess:
+            logger.warning(f"Prompt exceeds the context budget by {excess - saved} tokens after dropping all history")
+        logger.debug(f"Trimmed {dropped} history messages ({saved} tokens) to fit {budget} tokens")
+        return [messages[0]] + messages[1 + dropped:]
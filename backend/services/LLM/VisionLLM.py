@@ -1,27 +1,56 @@
 from services.lib.LAV_logger import logger
+from services.Input.ScreenCapture import ScreenCapture
 import os
-from typing import Generator
+from typing import Generator, List, Tuple
 from llama_cpp import Llama
+from PIL import Image
+
+from .BaseLLM import BaseLLM, CHAT_MAX_TOKENS
+from .TokenBudget import TokenBudget
+from .CachedLlavaHandler import CachedLlava16ChatHandler
+
+# Resolutions the LLaVA 1.6 projector tiles images into (multiples of its 336 pixel CLIP input)
+LLAVA16_GRID_PINPOINTS = [(336, 672), (672, 336), (672, 672), (1008, 336), (336, 1008)]
+# Lossless so the model reads small on-screen text as well as from the full capture
+SCREENSHOT_FORMAT = "png"
+
+
+def select_best_resolution(size: Tuple[int, int], resolutions: List[Tuple[int, int]]) -> Tuple[int, int]:
+    """
+    Pick the projector resolution an image is tiled into, as llava.cpp does.
+
+    The resolution keeping the most of the image's pixels wins, ties go to
+    the one wasting the least area.
+    """
+    width, height = size
+    best, best_effective, best_wasted = resolutions[0], -1, float("inf")
+    for resolution in resolutions:
+        scale = min(resolution[0] / width, resolution[1] / height)
+        effective = min(int(width * scale) * int(height * scale), width * height)
+        wasted = resolution[0] * resolution[1] - effective
+        if effective > best_effective or (effective == best_effective and wasted < best_wasted):
+            best, best_effective, best_wasted = resolution, effective, wasted
+    return best
+
+
+def fit_to_projector(image: Image.Image, resolutions: List[Tuple[int, int]] = LLAVA16_GRID_PINPOINTS) -> Image.Image:
+    """Downscale an image to the size CLIP would resize it to, keeping the aspect ratio"""
+    target = select_best_resolution(image.size, resolutions)
+    scale = min(target[0] / image.width, target[1] / image.height)
+    if scale >= 1:
+        return image
+    return image.resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))),
+                        Image.Resampling.BICUBIC)
 
-from llama_cpp.llama_chat_format import Llava16ChatHandler
-import base64
-import pyautogui
-
-from .BaseLLM import BaseLLM
-
-def image_to_base64_data_uri(file_path):
-    with open(file_path, "rb") as img_file:
-        base64_data = base64.b64encode(img_file.read()).decode('utf-8')
-        return f"data:image/png;base64,{base64_data}"
 
 class VisionLLM(BaseLLM):
-    def __init__(self, model_path, mmproj_path, n_ctx=4096, n_gpu_layers=-1, seed=-1):
-        self.current_module_directory = os.path.dirname(__file__)
+    supports_screenshots = True
 
-        self.screenshot_path = os.path.join(self.current_module_directory, "screen.png")
-        self.test_path = os.path.join(self.current_module_directory, "test.png")
-
-        self.chat_handler = Llava16ChatHandler(clip_model_path=mmproj_path, verbose=False)
+    def __init__(self, model_path, mmproj_path, n_ctx=4096, n_gpu_layers=-1, seed=-1, n_threads=None, n_threads_batch=None,
+                 type_k=None, type_v=None, flash_attn=False, n_batch=512, n_ubatch=512):
+        # Screenshots are captured to memory, resized and handed to CLIP without touching the disk
+        self.screen_capture = ScreenCapture()
+        self.chat_handler = CachedLlava16ChatHandler(clip_model_path=mmproj_path, verbose=False)
         self.context_length = n_ctx
 
         self.llm = Llama(
@@ -29,9 +58,18 @@ class VisionLLM(BaseLLM):
             chat_handler=self.chat_handler,
             n_ctx=n_ctx, # n_ctx should be increased to accommodate the image embedding
             n_gpu_layers=n_gpu_layers,
+            n_threads=n_threads,
+            n_threads_batch=n_threads_batch,
+            n_batch=n_batch,
+            n_ubatch=n_ubatch,
+            type_k=type_k,
+            type_v=type_v,
+            flash_attn=flash_attn,
             seed=seed,
             verbose=False
         )
+        self.token_budget = TokenBudget(
+            lambda text: self.llm.tokenize(text.encode("utf-8"), add_bos=False, special=True), n_ctx)
 
     def get_chat_completion(self, text: str, history: list = [], system_prompt: str = "", screenshot: bool = False) -> Generator[str, None, None]:
         messages = [
@@ -42,15 +80,15 @@ class VisionLLM(BaseLLM):
             messages.append(entry)
 
         if screenshot:
-            image = pyautogui.screenshot()
-            image.save(self.screenshot_path)
-            data_uri = image_to_base64_data_uri(self.screenshot_path)
+            image = fit_to_projector(self.screen_capture.capture())
+            image_url = self.chat_handler.add_image(
+                image, lambda image: self.screen_capture.encode(image, SCREENSHOT_FORMAT))
 
             messages.append(
                 {
                     "role": "user",
                     "content": [
-                        {"type": "image_url", "image_url": {"url": data_uri }},
+                        {"type": "image_url", "image_url": {"url": image_url}},
                         {"type": "text", "text": text}
                     ]
                 }
@@ -65,20 +103,13 @@ class VisionLLM(BaseLLM):
                 }
             )
 
-        def count_tokens(msg_list):
-            result = sum(len(self.llm.tokenize(
-                str.encode(msg['content']))) for msg in msg_list)
-            logger.debug(f"Tokens_in_context = {result}")
-            return result
-
-        # Trim oldest messages if context length in tokens is exceeded
-        while count_tokens(messages) > self.context_length and len(messages) > 1:
-            # Remove the oldest message (after the system prompt)
-            messages.pop(1)
+        # Trim oldest messages if context length in tokens is exceeded, image parts count as a fixed size
+        messages = self.token_budget.trim(messages, max_tokens=CHAT_MAX_TOKENS)
 
         completion_chunks = self.llm.create_chat_completion(
             messages=messages,
-            stream=True
+            stream=True,
+            max_tokens=CHAT_MAX_TOKENS
         )
 
         for completion_chunk in completion_chunks:
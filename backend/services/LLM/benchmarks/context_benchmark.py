@@ -0,0 +1,154 @@
+"""
+CPU benchmark of prefill and decode throughput for context configurations.
+
+Each configuration is a comma separated list of metadata.json "context" keys
+(see ModelSizing.CONTEXT_CONFIG_KEYS). The prompt is built from the recorded
+transcripts, repeated until it reaches --prompt-tokens, then decoded greedily.
+Run from the backend directory:
+
+    python -m services.LLM.benchmarks.context_benchmark --model services/LLM/Models/<folder>/<model>.gguf
+    python -m services.LLM.benchmarks.context_benchmark --model <model>.gguf --prompt-tokens 8192 \\
+        --config n_ctx=16384 --config n_ctx=16384,type_k=q8_0,type_v=q8_0 --config long_context=1 --json results.json
+"""
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict, List
+from services.lib.LAV_logger import logger
+from services.LLM.TextLLM import TextLLM
+from services.LLM.PromptStateCache import PromptStateCache
+from services.LLM.GGUFReader import read_gguf_info
+from services.LLM.ModelSizing import auto_size, estimate_memory, check_memory, ModelMemoryError, ModelSizing
+from services.LLM.benchmarks.transcript_loader import TRANSCRIPTS_DIRECTORY, load_transcripts
+
+DEFAULT_PROMPT_TOKENS = 2048
+DEFAULT_DECODE_TOKENS = 64
+# f16 baseline against the quantized caches long-context mode is meant to use
+DEFAULT_CONFIGS = [
+    "n_ctx=8192",
+    "n_ctx=8192,flash_attn=1",
+    "n_ctx=8192,type_k=q8_0,type_v=q8_0,flash_attn=1",
+    "n_ctx=8192,type_k=q4_0,type_v=q4_0,flash_attn=1",
+]
+
+
+def parse_config(text: str) -> Dict[str, Any]:
+    """'n_ctx=16384,type_k=q8_0,flash_attn=1' to a metadata.json "context" block"""
+    config = {}
+    for item in filter(None, text.split(",")):
+        key, _, value = item.partition("=")
+        key, value = key.strip(), value.strip()
+        if key in ("type_k", "type_v"):
+            config[key] = value
+        elif key in ("flash_attn", "long_context"):
+            config[key] = value.lower() in ("1", "true", "yes", "on")
+        else:
+            config[key] = int(value)
+    return config
+
+
+def build_prompt(llm: TextLLM, transcripts: Dict[str, Dict[str, Any]], prompt_tokens: int) -> List[int]:
+    """Transcript turns in ChatML, repeated until the prompt reaches prompt_tokens"""
+    text = ""
+    for transcript in transcripts.values():
+        text += f"<|im_start|>system\n{transcript['system_prompt']}<|im_end|>\n"
+        for turn in transcript["turns"]:
+            text += f"<|im_start|>{turn['role']}\n{turn['content']}<|im_end|>\n"
+    chunk = llm.llm.tokenize(text.encode("utf-8"), add_bos=False, special=True)
+    tokens = [llm.llm.token_bos()]
+    while len(tokens) < prompt_tokens:
+        tokens += chunk
+    return tokens[:prompt_tokens]
+
+
+def benchmark_config(model_path: str, config: Dict[str, Any], transcripts: Dict[str, Dict[str, Any]],
+                     prompt_tokens: int, decode_tokens: int) -> Dict[str, Any]:
+    """Prefill one long prompt and decode after it with one context configuration, CPU only"""
+    info = read_gguf_info(model_path)
+    file_size = os.path.getsize(model_path)
+    sizing: ModelSizing = auto_size({"fileName": os.path.basename(model_path), "file_size_bytes": file_size,
+                                     "context": config}, info, gpu_layers=0)
+    estimate = estimate_memory(info, file_size, sizing)
+    result = {"config": config, "sizing": sizing.to_dict(), "memory": estimate.to_dict() if estimate else None}
+    try:
+        check_memory(estimate, free_gpu=0)
+    except ModelMemoryError as e:
+        logger.warning(f"Skipping {config}: it {e}")
+        return {**result, "skipped": str(e)}
+    if prompt_tokens + decode_tokens > sizing.n_ctx:
+        prompt_tokens = sizing.n_ctx - decode_tokens
+        logger.warning(f"Prompt shortened to {prompt_tokens} tokens to fit n_ctx={sizing.n_ctx}")
+
+    start_time = time.time()
+    llm = TextLLM(model_path=model_path, seed=0, state_cache=PromptStateCache(capacity_bytes=0), **sizing.llama_kwargs())
+    load_seconds = time.time() - start_time
+    prompt = build_prompt(llm, transcripts, prompt_tokens)
+
+    start_time = time.time()
+    first_token_time = None
+    tokens = 0
+    # Tokens past an end of turn are still decoded, only the speed matters here
+    for _ in llm.llm.generate(prompt, temp=0.0, reset=True):
+        if first_token_time is None:
+            first_token_time = time.time()
+        tokens += 1
+        if tokens >= decode_tokens:
+            break
+    end_time = time.time()
+    del llm
+
+    prefill_seconds = first_token_time - start_time
+    decode_seconds = end_time - first_token_time
+    result.update({
+        "load_seconds": load_seconds,
+        "prompt_tokens": len(prompt),
+        "prefill_seconds": prefill_seconds,
+        "prefill_tokens_per_second": len(prompt) / prefill_seconds if prefill_seconds > 0 else 0.0,
+        "decode_tokens": tokens,
+        "decode_seconds": decode_seconds,
+        "decode_tokens_per_second": (tokens - 1) / decode_seconds if tokens > 1 and decode_seconds > 0 else 0.0,
+    })
+    logger.info(f"{config}: prefill {result['prefill_tokens_per_second']:.1f} tokens/s, "
+                f"decode {result['decode_tokens_per_second']:.1f} tokens/s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefill and decode throughput per context configuration (CPU only)")
+    parser.add_argument("--model", required=True, help="GGUF model to benchmark")
+    parser.add_argument("--config", action="append", help="Context configuration, e.g. n_ctx=16384,type_k=q8_0,type_v=q8_0,flash_attn=1; repeatable")
+    parser.add_argument("--transcripts", default=TRANSCRIPTS_DIRECTORY, help="Directory of transcript JSON files")
+    parser.add_argument("--prompt-tokens", type=int, default=DEFAULT_PROMPT_TOKENS, help="Tokens prefilled per configuration")
+    parser.add_argument("--decode-tokens", type=int, default=DEFAULT_DECODE_TOKENS, help="Tokens decoded after the prompt")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    transcripts = load_transcripts(args.transcripts)
+    if not transcripts:
+        raise SystemExit(f"No transcripts found in {args.transcripts}")
+
+    configs = [parse_config(config) for config in (args.config or DEFAULT_CONFIGS)]
+    logger.info(f"Benchmarking {len(configs)} context configurations on {os.cpu_count()} CPU threads")
+    results = [benchmark_config(args.model, config, transcripts, args.prompt_tokens, args.decode_tokens)
+               for config in configs]
+
+    print(f"\n{'n_ctx':>7}{'K':>6}{'V':>6}{'FA':>4}{'ubatch':>8}{'RAM GB':>8}{'prefill tok/s':>15}{'decode tok/s':>14}")
+    for result in results:
+        sizing = result["sizing"]
+        memory = f"{result['memory']['cpu'] / 1024 ** 3:.1f}" if result["memory"] else "-"
+        if "skipped" in result:
+            throughput = f"{'skipped':>15}{'-':>14}"
+        else:
+            throughput = f"{result['prefill_tokens_per_second']:>15.1f}{result['decode_tokens_per_second']:>14.1f}"
+        print(f"{sizing['n_ctx']:>7}{sizing['type_k']:>6}{sizing['type_v']:>6}{'on' if sizing['flash_attn'] else 'off':>4}"
+              f"{sizing['n_ubatch']:>8}{memory:>8}{throughput}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "results": results}, f, indent=4)
+        logger.info(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
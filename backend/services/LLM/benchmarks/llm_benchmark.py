@@ -0,0 +1,212 @@
+"""
+Benchmark of the LLM layer on recorded transcripts.
+
+Every user turn is answered through LLM.get_completion and every assistant
+turn, cut in half, is finished through LLM.complete_current_response, so the
+numbers include trimming, templating, slot handling and the streaming
+wrapper. By default the model is FakeLLM, which needs no model file and
+costs nothing per token unless told to, leaving only the orchestration
+overhead to measure; a small --n-ctx with --history-repeat makes trimming
+do real work. Run from the backend directory:
+
+    python -m services.LLM.benchmarks.llm_benchmark --json results.json
+    python -m services.LLM.benchmarks.llm_benchmark --n-ctx 2048 --history-repeat 20 --runs 5
+    python -m services.LLM.benchmarks.llm_benchmark --model <file name from Models> --json results.json
+    python -m services.LLM.benchmarks.llm_benchmark --remote http://127.0.0.1:8089 --json results.json
+"""
+import argparse
+import hashlib
+import json
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+from services.lib.LAV_logger import logger
+from services.LLM.LLM import LLM
+from services.LLM.FakeLLM import FakeLLM, FAKE_MODEL_TYPE
+from services.LLM.RemoteLLM import REMOTE_MODEL_TYPE
+from services.LLM.benchmarks.transcript_loader import TRANSCRIPTS_DIRECTORY, load_transcripts
+
+CHAT = "chat"
+CONTINUE = "continue"
+# Greedy and seeded so the fake backend and real models give the same replies on every run
+BENCHMARK_SAMPLING_PARAMS = {"temperature": 0.0, "seed": 0}
+
+
+class TrimTimer:
+    """Wraps the TokenBudget.trim of model instances to add up the time spent trimming"""
+
+    def __init__(self):
+        self.seconds = 0.0
+
+    def wrap(self, instance):
+        budget = getattr(instance, "token_budget", None)
+        if budget is None or getattr(budget.trim, "timed", False):
+            return
+        trim = budget.trim
+
+        def timed_trim(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return trim(*args, **kwargs)
+            finally:
+                self.seconds += time.perf_counter() - start_time
+
+        timed_trim.timed = True
+        budget.trim = timed_trim
+
+    def take(self) -> float:
+        seconds, self.seconds = self.seconds, 0.0
+        return seconds
+
+
+def chat_turns(transcript: Dict[str, Any], history_repeat: int):
+    """Yield (history, text) for every user message, the earlier turns repeated to lengthen the history"""
+    turns = transcript["turns"]
+    for index, turn in enumerate(turns):
+        if turn["role"] == "user":
+            yield turns * (history_repeat - 1) + turns[:index], turn["content"]
+
+
+def continue_turns(transcript: Dict[str, Any], history_repeat: int):
+    """Yield the history up to every assistant message, which is cut in half to be continued"""
+    turns = transcript["turns"]
+    for index, turn in enumerate(turns):
+        if turn["role"] == "assistant":
+            partial = {"role": "assistant", "content": turn["content"][:len(turn["content"]) // 2]}
+            yield turns * (history_repeat - 1) + turns[:index] + [partial]
+
+
+def run_turn(complete: Callable[[], Any], trim_timer: TrimTimer) -> Dict[str, Any]:
+    trim_timer.take()
+    start_time = time.perf_counter()
+    first_token_time = None
+    tokens = 0
+    reply = ""
+    response = complete()
+    if response is None:
+        raise RuntimeError("The LLM returned no response, is the model loaded?")
+    for chunk in response:
+        if first_token_time is None:
+            first_token_time = time.perf_counter()
+        tokens += 1
+        reply += chunk
+    end_time = time.perf_counter()
+    decode_time = end_time - first_token_time if first_token_time else 0.0
+    return {
+        "reply": reply,
+        "tokens": tokens,
+        "time_to_first_token": first_token_time - start_time if first_token_time else None,
+        "tokens_per_second": (tokens - 1) / decode_time if tokens > 1 and decode_time > 0 else 0.0,
+        "trim_seconds": trim_timer.take(),
+        "end_to_end_seconds": end_time - start_time
+    }
+
+
+def summarize(turns: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Mean, median and 95th percentile of each measurement"""
+    summary = {"turns": len(turns), "tokens": sum(turn["tokens"] for turn in turns)}
+    for name in ("time_to_first_token", "tokens_per_second", "trim_seconds", "end_to_end_seconds"):
+        values = sorted(turn[name] for turn in turns if turn[name] is not None)
+        if not values:
+            continue
+        summary[name] = {
+            "mean": statistics.fmean(values),
+            "p50": values[len(values) // 2],
+            "p95": values[min(len(values) - 1, int(len(values) * 0.95))]
+        }
+    # Identical on every run with the same arguments, a change means the replies or the trimming changed
+    summary["replies_digest"] = hashlib.sha256("\0".join(turn["reply"] for turn in turns).encode("utf-8")).hexdigest()[:16]
+    return summary
+
+
+def benchmark(llm: LLM, transcripts: Dict[str, Dict[str, Any]], history_repeat: int, runs: int) -> Dict[str, List[Dict[str, Any]]]:
+    trim_timer = TrimTimer()
+    for pool in llm.residency.instances().values():
+        for instance in pool.instances:
+            trim_timer.wrap(instance)
+
+    results = {CHAT: [], CONTINUE: []}
+    for run in range(runs):
+        for name, transcript in transcripts.items():
+            system_prompt = transcript["system_prompt"]
+            for history, text in chat_turns(transcript, history_repeat):
+                result = run_turn(lambda: llm.get_completion(text, history, system_prompt,
+                                                             sampling_params=BENCHMARK_SAMPLING_PARAMS), trim_timer)
+                results[CHAT].append({"transcript": name, "run": run, "history": len(history), **result})
+            for history in continue_turns(transcript, history_repeat):
+                result = run_turn(lambda: llm.complete_current_response(history, system_prompt,
+                                                                        sampling_params=BENCHMARK_SAMPLING_PARAMS), trim_timer)
+                results[CONTINUE].append({"transcript": name, "run": run, "history": len(history), **result})
+    return results
+
+
+def create_llm(args) -> LLM:
+    llm = LLM()
+    # Resident for the whole run, loading is not part of any turn
+    llm.configure_residency(idle_timeout=-1)
+    if args.model:
+        model_data = llm._find_model(args.model)
+        if model_data is None:
+            raise SystemExit(f"Model {args.model} not found in {llm.models_directory}")
+    elif args.remote:
+        model_data = {"displayName": "Remote", "fileName": "remote", "type": REMOTE_MODEL_TYPE,
+                      "base_url": args.remote, "n_ctx": args.n_ctx}
+    else:
+        llm.register_backend(FAKE_MODEL_TYPE, lambda model_data, sizing: FakeLLM(
+            n_ctx=sizing.n_ctx, reply_tokens=args.reply_tokens,
+            prefill_seconds_per_token=args.prefill_ms / 1000, decode_seconds_per_token=args.decode_ms / 1000))
+        model_data = {"displayName": "Fake", "fileName": "fake", "type": FAKE_MODEL_TYPE, "n_ctx": args.n_ctx}
+    start_time = time.perf_counter()
+    llm.load_model(model_data)
+    if llm.llm is None:
+        raise SystemExit(f"Could not load {model_data['fileName']}")
+    logger.info(f"{model_data['fileName']} loaded in {time.perf_counter() - start_time:.2f}s")
+    return llm
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LLM.get_completion and complete_current_response on recorded transcripts")
+    parser.add_argument("--model", help="File name of a model from the Models directory, the fake backend if omitted")
+    parser.add_argument("--remote", help="Base URL of an OpenAI-compatible server, e.g. openai_stub_server or llama-server")
+    parser.add_argument("--transcripts", default=TRANSCRIPTS_DIRECTORY, help="Directory of transcript JSON files")
+    parser.add_argument("--runs", type=int, default=3, help="Passes over all transcripts")
+    parser.add_argument("--history-repeat", type=int, default=1, help="Repeat each transcript's earlier turns to lengthen the history")
+    parser.add_argument("--n-ctx", type=int, default=4096, help="Context length of the fake or remote backend")
+    parser.add_argument("--reply-tokens", type=int, default=48, help="Tokens per reply of the fake backend")
+    parser.add_argument("--prefill-ms", type=float, default=0.0, help="Simulated prefill time per prompt token of the fake backend")
+    parser.add_argument("--decode-ms", type=float, default=0.0, help="Simulated decode time per token of the fake backend")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    transcripts = load_transcripts(args.transcripts)
+    if not transcripts:
+        raise SystemExit(f"No transcripts found in {args.transcripts}")
+
+    llm = create_llm(args)
+    try:
+        results = benchmark(llm, transcripts, max(1, args.history_repeat), max(1, args.runs))
+    finally:
+        llm.unload_model()
+        llm.close_connections()
+    summaries = {mode: summarize(turns) for mode, turns in results.items()}
+
+    def ms(summary, name, statistic):
+        return summary[name][statistic] * 1000 if name in summary else 0.0
+
+    print(f"\n{'mode':<10}{'turns':>7}{'TTFT p50 ms':>13}{'TTFT p95 ms':>13}{'tok/s':>10}{'trim ms':>10}{'e2e p50 ms':>12}{'e2e p95 ms':>12}")
+    for mode, summary in summaries.items():
+        tokens_per_second = summary["tokens_per_second"]["mean"] if "tokens_per_second" in summary else 0.0
+        print(f"{mode:<10}{summary['turns']:>7}{ms(summary, 'time_to_first_token', 'p50'):>13.3f}"
+              f"{ms(summary, 'time_to_first_token', 'p95'):>13.3f}{tokens_per_second:>10.1f}"
+              f"{ms(summary, 'trim_seconds', 'mean'):>10.3f}{ms(summary, 'end_to_end_seconds', 'p50'):>12.3f}"
+              f"{ms(summary, 'end_to_end_seconds', 'p95'):>12.3f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model or args.remote or FAKE_MODEL_TYPE, "arguments": vars(args), "summary": summaries,
+                       "turns": results}, f, indent=4)
+        logger.info(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Local OpenAI-compatible server streaming FakeLLM replies, to try RemoteLLM without a second machine.
+
+Serves /v1/chat/completions and /v1/completions as server-sent events over
+HTTP/1.1 keep-alive connections, logging every new connection and every
+stream the client closes early, so connection reuse and cancellation on
+disconnect can be checked. Run from the backend directory:
+
+    python -m services.LLM.benchmarks.openai_stub_server --port 8089 --decode-ms 20
+
+then point a remote model at it, e.g. Models/stub/metadata.json:
+
+    {"displayName": "Stub", "fileName": "stub", "type": "remote", "base_url": "http://127.0.0.1:8089"}
+
+or benchmark it with llm_benchmark --remote http://127.0.0.1:8089
+"""
+import argparse
+import json
+import socket
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from services.lib.LAV_logger import logger
+from services.LLM.FakeLLM import FakeLLM, format_chatml
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fake: FakeLLM = FakeLLM()
+    connections = 0
+    cancelled = 0
+    _lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        # Events are small writes, Nagle's algorithm would hold each one back until the previous is acknowledged
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self._lock:
+            StubHandler.connections += 1
+            logger.info(f"Connection {StubHandler.connections} from {self.client_address[0]}:{self.client_address[1]}")
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, status: int, content):
+        body = json.dumps(content).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_event(self, data: str):
+        # One chunk of the chunked transfer encoding per event
+        payload = f"data: {data}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(payload):X}\r\n".encode("ascii") + payload + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/v1/models":
+            self._send_json(200, {"object": "list", "data": [{"id": "fake", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path == "/v1/chat/completions":
+            prompt, chunk = format_chatml(body.get("messages", [])), lambda text: {"delta": {"content": text}}
+        elif self.path == "/v1/completions":
+            prompt, chunk = body.get("prompt", ""), lambda text: {"text": text}
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        if not body.get("stream"):
+            self._send_json(400, {"error": {"message": "Only streamed completions are supported"}})
+            return
+
+        completion_id = f"cmpl-{uuid.uuid4().hex[:12]}"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for text in self.fake.generate(prompt, int(body.get("max_tokens") or 256), int(body.get("seed", -1))):
+                self._send_event(json.dumps({"id": completion_id, "created": int(time.time()), "model": "fake",
+                                             "choices": [{"index": 0, "finish_reason": None, **chunk(text)}]}))
+            self._send_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            with self._lock:
+                StubHandler.cancelled += 1
+            logger.info(f"Client closed stream {completion_id}, generation stopped ({StubHandler.cancelled} cancelled)")
+            self.close_connection = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub server streaming FakeLLM replies")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--reply-tokens", type=int, default=48, help="Tokens per reply")
+    parser.add_argument("--prefill-ms", type=float, default=0.0, help="Simulated prefill time per prompt token")
+    parser.add_argument("--decode-ms", type=float, default=0.0, help="Simulated decode time per token")
+    args = parser.parse_args()
+
+    StubHandler.fake = FakeLLM(reply_tokens=args.reply_tokens, prefill_seconds_per_token=args.prefill_ms / 1000,
+                               decode_seconds_per_token=args.decode_ms / 1000)
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    logger.info(f"OpenAI stub server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+CPU benchmark of speculative decoding against plain decoding on recorded transcripts.
+
+Every user turn of each transcript is answered greedily (temperature 0) once
+per decoding mode, so all modes must produce the same text and only the speed
+differs. Run from the backend directory:
+
+    python -m services.LLM.benchmarks.speculative_benchmark --model services/LLM/Models/<folder>/<model>.gguf
+    python -m services.LLM.benchmarks.speculative_benchmark --model <model>.gguf --draft-model <small>.gguf --json results.json
+"""
+import argparse
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+from services.lib.LAV_logger import logger
+from services.LLM.TextLLM import TextLLM
+from services.LLM.PromptStateCache import PromptStateCache
+from services.LLM.SpeculativeDecoding import SPECULATIVE_OFF, PROMPT_LOOKUP, DRAFT_MODEL
+from services.LLM.benchmarks.transcript_loader import TRANSCRIPTS_DIRECTORY, load_transcripts
+
+# Tokens generated per turn, enough to see drafting settle without waiting for full replies
+DEFAULT_TURN_TOKENS = 128
+
+
+def user_turns(transcript: Dict[str, Any]):
+    """Yield (history, text) for every user message of a transcript"""
+    turns = transcript["turns"]
+    for index, turn in enumerate(turns):
+        if turn["role"] == "user":
+            yield turns[:index], turn["content"]
+
+
+def run_turn(llm: TextLLM, system_prompt: str, history: List[Dict[str, str]], text: str, max_tokens: int) -> Dict[str, Any]:
+    start_time = time.time()
+    first_token_time = None
+    tokens = 0
+    reply = ""
+    response = llm.get_chat_completion(text, history, system_prompt, temperature=0.0, seed=0)
+    try:
+        for chunk in response:
+            if first_token_time is None:
+                first_token_time = time.time()
+            tokens += 1
+            reply += chunk
+            if tokens >= max_tokens:
+                break
+    finally:
+        response.close()
+    end_time = time.time()
+    decode_time = end_time - first_token_time if first_token_time else 0.0
+    return {
+        "reply": reply,
+        "tokens": tokens,
+        "time_to_first_token": first_token_time - start_time if first_token_time else None,
+        "decode_seconds": decode_time,
+        "tokens_per_second": (tokens - 1) / decode_time if tokens > 1 and decode_time > 0 else 0.0
+    }
+
+
+def benchmark_mode(model_path: str, mode: str, transcripts: Dict[str, Dict[str, Any]], n_ctx: int,
+                   max_tokens: int, draft_model_path: Optional[str] = None, num_pred_tokens: Optional[int] = None) -> Dict[str, Any]:
+    """Answer every user turn with one decoding mode, CPU only"""
+    speculative = {"mode": mode, "draft_model_path": draft_model_path, "num_pred_tokens": num_pred_tokens}
+    start_time = time.time()
+    # Snapshots are disabled so every mode starts each turn from the same context reuse
+    llm = TextLLM(model_path=model_path, n_ctx=n_ctx, n_gpu_layers=0, seed=0,
+                  state_cache=PromptStateCache(capacity_bytes=0), speculative=speculative)
+    logger.info(f"[{mode}] model loaded in {time.time() - start_time:.2f}s")
+
+    turns = []
+    for name, transcript in transcripts.items():
+        for history, text in user_turns(transcript):
+            result = run_turn(llm, transcript["system_prompt"], history, text, max_tokens)
+            result["transcript"] = name
+            turns.append(result)
+            logger.info(f"[{mode}] {name}: {result['tokens']} tokens at {result['tokens_per_second']:.1f} tokens/s")
+
+    tokens = sum(turn["tokens"] for turn in turns)
+    decode_seconds = sum(turn["decode_seconds"] for turn in turns)
+    speculative_stats = llm.speculative_stats.to_dict() if mode != SPECULATIVE_OFF else None
+    del llm
+    return {
+        "mode": mode,
+        "turns": turns,
+        "tokens": tokens,
+        "tokens_per_second": tokens / decode_seconds if decode_seconds > 0 else 0.0,
+        "mean_time_to_first_token": sum(turn["time_to_first_token"] or 0 for turn in turns) / max(len(turns), 1),
+        "speculative": speculative_stats
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare speculative and plain decoding on recorded transcripts (CPU only)")
+    parser.add_argument("--model", required=True, help="GGUF model to benchmark")
+    parser.add_argument("--draft-model", help="Small GGUF draft model sharing the vocabulary, adds a draft_model run")
+    parser.add_argument("--num-pred-tokens", type=int, help="Tokens drafted per step, default depends on the mode")
+    parser.add_argument("--transcripts", default=TRANSCRIPTS_DIRECTORY, help="Directory of transcript JSON files")
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_TURN_TOKENS, help="Tokens generated per turn")
+    parser.add_argument("--n-ctx", type=int, default=4096, help="Context length")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    transcripts = load_transcripts(args.transcripts)
+    if not transcripts:
+        raise SystemExit(f"No transcripts found in {args.transcripts}")
+
+    modes = [SPECULATIVE_OFF, PROMPT_LOOKUP] + ([DRAFT_MODEL] if args.draft_model else [])
+    logger.info(f"Benchmarking {', '.join(modes)} on {os.cpu_count()} CPU threads")
+    results = [benchmark_mode(args.model, mode, transcripts, args.n_ctx, args.max_tokens,
+                              args.draft_model, args.num_pred_tokens)
+               for mode in modes]
+
+    baseline = results[0]
+    print(f"\n{'mode':<15}{'tokens':>8}{'tok/s':>9}{'speedup':>9}{'TTFT s':>9}{'accepted':>10}{'same text':>11}")
+    for result in results:
+        same = sum(turn["reply"] == plain["reply"] for turn, plain in zip(result["turns"], baseline["turns"]))
+        result["identical_replies"] = same
+        speedup = result["tokens_per_second"] / baseline["tokens_per_second"] if baseline["tokens_per_second"] else 0.0
+        result["speedup"] = speedup
+        acceptance = f"{result['speculative']['acceptance_rate']:.0%}" if result["speculative"] else "-"
+        identical = f"{same}/{len(result['turns'])}"
+        print(f"{result['mode']:<15}{result['tokens']:>8}{result['tokens_per_second']:>9.1f}{speedup:>8.2f}x"
+              f"{result['mean_time_to_first_token']:>9.2f}{acceptance:>10}{identical:>11}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "draft_model": args.draft_model, "results": results}, f, indent=4)
+        logger.info(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""Recorded transcripts shared by the benchmarks, kept apart so benchmarks of the fake and remote backends need no llama-cpp"""
+import glob
+import json
+import os
+from typing import Any, Dict
+
+TRANSCRIPTS_DIRECTORY = os.path.join(os.path.dirname(__file__), "transcripts")
+
+
+def load_transcripts(directory: str = TRANSCRIPTS_DIRECTORY) -> Dict[str, Dict[str, Any]]:
+    transcripts = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            transcripts[os.path.splitext(os.path.basename(path))[0]] = json.load(f)
+    return transcripts
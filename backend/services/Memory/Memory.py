@@ -6,6 +6,8 @@ from qdrant_client import QdrantClient
 from qdrant_client.models import Filter, FieldCondition, MatchValue, Distance, VectorParams
 import time
 from ..lib.LAV_logger import logger
+from ..lib.metrics import MEMORY_QUERY_SECONDS
+from ..lib.tracing import tracer
 import datetime
 from typing import List, Dict, Any, Optional
 from .ChatChunker import ChatChunker
@@ -106,11 +108,12 @@ class Memory:
 
     def query(self, text, limit = 3)  -> list:
         if not self.check_collection_exists(): return []
-        search_result = self.client.query(
-            collection_name=self.MESSAGE_COLLECTION_NAME,
-            query_text = text,
-            limit = limit
-        )
+        with MEMORY_QUERY_SECONDS.time(), tracer.span("memory.query", limit=limit):
+            search_result = self.client.query(
+                collection_name=self.MESSAGE_COLLECTION_NAME,
+                query_text = text,
+                limit = limit
+            )
         # logger.debug(f"Search result: {search_result}")
         result = []
         for s in search_result:
@@ -0,0 +1,314 @@
+import asyncio
+import json
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import WebSocket, WebSocketDisconnect
+from ..lib.LAV_logger import logger
+from ..lib.inference_executor import inference_executor
+from ..lib.metrics import PIPELINE_QUEUE_DEPTH
+from ..lib.tracing import tracer
+from ..lib.scheduler import FairScheduler, Ticket, LLM_RESOURCE, TTS_RESOURCE, PRIORITY_CONTROL
+from ..lib.client_sessions import ClientSession
+
+SENTENCE_PUNCTUATION = {',', '.', ';', '?', '!', '、', '，', '。', '？', '！', '：', '…'}
+
+
+def split_sentences(text: str) -> Tuple[List[str], str]:
+    """
+    Split streamed text into complete sentences, mirroring cut5 in the frontend.
+
+    Args:
+        text: Accumulated text that has not been segmented yet
+
+    Returns:
+        Tuple of (complete sentences, remaining partial text)
+    """
+    text = text.lstrip()
+    sentences = []
+    items = []
+
+    for i, char in enumerate(text):
+        items.append(char)
+        if char in SENTENCE_PUNCTUATION:
+            # Keep decimal numbers such as 3.14 together, a trailing "3." waits for the next chunk (or end of stream)
+            if char == '.' and i > 0 and text[i - 1].isdigit() and (i == len(text) - 1 or text[i + 1].isdigit()):
+                continue
+            sentences.append("".join(items))
+            items = []
+
+    sentences = [s for s in sentences if not set(s.strip()).issubset(SENTENCE_PUNCTUATION)]
+    return sentences, "".join(items)
+
+
+class ConversationTurn:
+    """State of a single user turn flowing through the pipeline"""
+    def __init__(self, text: str, history: Optional[list], system_prompt: str, screenshot: bool, memory_limit: int,
+                 turn_id: Optional[str] = None, session: Optional[ClientSession] = None):
+        # A turn started by voice input keeps the ID it got at end of speech so the trace is continuous
+        self.id = turn_id or str(uuid.uuid4())
+        self.start_time = time.time()
+        self.first_sentence_time: Optional[float] = None
+        self.text = text
+        self.session = session
+        # Without a history from the client the session keeps it on the server
+        self.uses_session_history = history is None and session is not None
+        self.history = list(session.history) if self.uses_session_history else history or []
+        self.system_prompt = system_prompt
+        self.screenshot = screenshot
+        self.memory_limit = memory_limit
+        self.response_text = ""
+
+
+class ConversationPipeline:
+    """
+    Server-side conversation pipeline.
+
+    A user turn is streamed back over a single WebSocket as LLM tokens, sentence
+    boundaries and encoded audio. LLM generation, sentence segmentation and TTS
+    run as overlapped stages connected by bounded queues, so the first sentence
+    is synthesized while the rest of the reply is still being generated.
+    """
+
+    def __init__(self, llm, tts, memory=None, scheduler: Optional[FairScheduler] = None,
+                 token_queue_size: int = 64, sentence_queue_size: int = 4):
+        """
+        Initialize the pipeline.
+
+        Args:
+            llm: LLM service used for generation
+            tts: TTS service used for synthesis
+            memory: Optional Memory service used for context retrieval
+            scheduler: Optional scheduler arbitrating the LLM and TTS between client sessions
+            token_queue_size: Maximum tokens buffered between the LLM and the segmenter
+            sentence_queue_size: Maximum sentences buffered between the segmenter and TTS
+        """
+        self.llm = llm
+        self.tts = tts
+        self.memory = memory
+        self.scheduler = scheduler
+        self.token_queue_size = token_queue_size
+        self.sentence_queue_size = sentence_queue_size
+
+    async def serve(self, websocket: WebSocket, session: Optional[ClientSession] = None):
+        """
+        Handle a pipeline WebSocket until the client disconnects.
+
+        With a client session, turns use the session's voice and sampling
+        parameters, and its server-side history when the client sends none.
+
+        Client messages:
+            {"type": "turn", "text": ..., "history": [...], "systemPrompt": ..., "screenshot": false, "memoryLimit": 0,
+             "turnId": optional ID from the voice input transcription}
+            {"type": "cancel"}
+
+        Server messages:
+            {"type": "turn_started", "turn_id": ...}
+            {"type": "queued", "turn_id": ..., "resource": "llm" | "tts", "position": n}
+                while waiting behind other clients for a shared model
+            {"type": "token", "turn_id": ..., "text": ...}
+            {"type": "sentence", "turn_id": ..., "index": n, "text": ...}
+            {"type": "audio", "turn_id": ..., "index": n, "media_type": "audio/wav", "size": bytes}
+                followed by one binary frame containing the audio
+            {"type": "turn_finished", "turn_id": ..., "text": ..., "cancelled": bool}
+            {"type": "error", "turn_id": ..., "error": ...}
+        """
+        send_lock = asyncio.Lock()
+        current_task: Optional[asyncio.Task] = None
+
+        async def send_json(message: Dict[str, Any]):
+            async with send_lock:
+                await websocket.send_json(message)
+
+        async def send_audio(header: Dict[str, Any], audio: bytes):
+            # Header and payload must not be interleaved with other messages
+            async with send_lock:
+                await websocket.send_json(header)
+                await websocket.send_bytes(audio)
+
+        async def cancel_current():
+            if current_task and not current_task.done():
+                current_task.cancel()
+                try:
+                    await current_task
+                except (asyncio.CancelledError, Exception):
+                    pass
+
+        try:
+            while True:
+                try:
+                    message = json.loads(await websocket.receive_text())
+                    if not isinstance(message, dict):
+                        raise ValueError("Messages must be JSON objects")
+                    message_type = message.get("type")
+                    memory_limit = int(message.get("memoryLimit") or 0) if message_type == "turn" else 0
+                except (ValueError, TypeError, KeyError) as e:
+                    # Malformed messages (binary frames raise KeyError) are answered, the connection and the running turn stay up
+                    await send_json({"type": "error", "error": f"Invalid message: {e}"})
+                    continue
+
+                if message_type == "cancel":
+                    await cancel_current()
+                elif message_type == "turn":
+                    # A new turn interrupts the one in progress
+                    await cancel_current()
+                    turn = ConversationTurn(
+                        text=message.get("text", ""),
+                        history=message.get("history"),
+                        system_prompt=message.get("systemPrompt", ""),
+                        screenshot=message.get("screenshot", False),
+                        memory_limit=memory_limit,
+                        turn_id=message.get("turnId"),
+                        session=session
+                    )
+                    current_task = asyncio.create_task(self.run_turn(turn, send_json, send_audio))
+                else:
+                    await send_json({"type": "error", "error": f"Unknown message type: {message_type}"})
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            logger.error(f"Pipeline WebSocket closed by an unexpected error: {e}", exc_info=True)
+        finally:
+            await cancel_current()
+
+    async def run_turn(self, turn: ConversationTurn, send_json, send_audio):
+        """Run the LLM -> segmentation -> TTS stages for one turn"""
+        with tracer.turn(turn.id), tracer.span("pipeline.turn"):
+            await self._run_turn(turn, send_json, send_audio)
+
+    async def _run_turn(self, turn: ConversationTurn, send_json, send_audio):
+        sentence_queue: asyncio.Queue = asyncio.Queue(maxsize=self.sentence_queue_size)
+
+        await send_json({"type": "turn_started", "turn_id": turn.id})
+
+        llm_ticket: Optional[Ticket] = None
+        try:
+            system_prompt = await self._build_system_prompt(turn)
+            # The LLM is held until the last token, TTS is scheduled per sentence
+            llm_ticket = await self._acquire(LLM_RESOURCE, turn, send_json)
+            sampling_params = turn.session.sampling_params if turn.session else None
+            session_id = turn.session.id if turn.session else None
+            response = await inference_executor.run(
+                self.llm.get_completion, turn.text, turn.history, system_prompt, turn.screenshot, sampling_params,
+                session_id, pool="llm")
+            if response is None:
+                raise RuntimeError("No response from LLM service")
+
+            tokens = inference_executor.stream(response, pool="llm", max_queue_size=self.token_queue_size)
+            stages = [
+                asyncio.create_task(self._segment(turn, tokens, sentence_queue, send_json, llm_ticket)),
+                asyncio.create_task(self._synthesize(turn, sentence_queue, send_json, send_audio)),
+            ]
+            try:
+                await asyncio.gather(*stages)
+            finally:
+                for stage in stages:
+                    stage.cancel()
+                # Sentences left behind by a cancelled turn are no longer queued
+                while not sentence_queue.empty():
+                    if sentence_queue.get_nowait() is not None:
+                        PIPELINE_QUEUE_DEPTH.dec(queue="sentences")
+
+            if turn.uses_session_history:
+                turn.session.add_to_history({"role": "user", "content": turn.text},
+                                            {"role": "assistant", "content": turn.response_text})
+            await send_json({"type": "turn_finished", "turn_id": turn.id,
+                             "text": turn.response_text, "cancelled": False})
+        except asyncio.CancelledError:
+            try:
+                await send_json({"type": "turn_finished", "turn_id": turn.id,
+                                 "text": turn.response_text, "cancelled": True})
+            except Exception:
+                pass
+            raise
+        except Exception as e:
+            logger.error(f"Pipeline turn {turn.id} failed: {e}", exc_info=True)
+            await send_json({"type": "error", "turn_id": turn.id, "error": str(e)})
+        finally:
+            if llm_ticket:
+                llm_ticket.release()
+
+    async def _acquire(self, resource: str, turn: ConversationTurn, send_json) -> Optional[Ticket]:
+        """Wait for a shared model, telling the client its queue position meanwhile"""
+        if self.scheduler is None:
+            return None
+
+        def on_position(position: int):
+            message = {"type": "queued", "turn_id": turn.id, "resource": resource, "position": position}
+            asyncio.create_task(send_json(message))
+
+        session_id = turn.session.id if turn.session else turn.id
+        priority = turn.session.priority if turn.session else PRIORITY_CONTROL
+        return await self.scheduler.acquire(resource, session_id, priority, on_position)
+
+    async def _build_system_prompt(self, turn: ConversationTurn) -> str:
+        """Append retrieved memory to the system prompt when requested"""
+        if not self.memory or turn.memory_limit <= 0:
+            return turn.system_prompt
+
+        context = await inference_executor.run(self.memory.query, turn.text, turn.memory_limit)
+        context_text = "\n".join(c.get("document", "") for c in context if isinstance(c, dict) and c.get("document"))
+        if not context_text.strip():
+            return turn.system_prompt
+        # After the character prompt, so the prompt's cached prefill stays reusable when the memory changes
+        return f"{turn.system_prompt}\n\n[RETRIEVED MEMORY]\n{context_text}"
+
+    async def _segment(self, turn: ConversationTurn, tokens: AsyncIterator[str],
+                       sentence_queue: asyncio.Queue, send_json, llm_ticket: Optional[Ticket] = None):
+        """Segmentation stage, turns the token stream into sentences for TTS"""
+        pending = ""
+        index = 0
+
+        async def emit(sentence: str):
+            nonlocal index
+            sentence = sentence.strip()
+            if not sentence:
+                return
+            if turn.first_sentence_time is None:
+                turn.first_sentence_time = time.time()
+                tracer.add_span("pipeline.first_sentence", turn.start_time, turn.first_sentence_time)
+            await send_json({"type": "sentence", "turn_id": turn.id, "index": index, "text": sentence})
+            await sentence_queue.put((index, sentence))
+            PIPELINE_QUEUE_DEPTH.inc(queue="sentences")
+            index += 1
+
+        async for token in tokens:
+            turn.response_text += token
+            await send_json({"type": "token", "turn_id": turn.id, "text": token})
+
+            pending += token
+            sentences, pending = split_sentences(pending)
+            for sentence in sentences:
+                await emit(sentence)
+
+        # Generation is done, the next client can use the LLM while the last sentences are synthesized
+        if llm_ticket:
+            llm_ticket.release()
+        await emit(pending)
+        await sentence_queue.put(None)
+
+    async def _synthesize(self, turn: ConversationTurn, sentence_queue: asyncio.Queue, send_json, send_audio):
+        """TTS stage, synthesizes sentences while later ones are still being generated"""
+        while True:
+            item = await sentence_queue.get()
+            if item is None:
+                break
+            PIPELINE_QUEUE_DEPTH.dec(queue="sentences")
+            index, sentence = item
+            voice = turn.session.voice if turn.session else None
+            tts_ticket = await self._acquire(TTS_RESOURCE, turn, send_json)
+            try:
+                audio = await inference_executor.run(self.tts.synthesize, sentence, voice, pool="tts")
+            except ValueError as e:
+                # The session's voice was deleted mid-turn, later sentences still get their own answer
+                logger.warning(f"TTS failed for sentence {index} of turn {turn.id}: {e}")
+                audio = None
+            finally:
+                if tts_ticket:
+                    tts_ticket.release()
+            if not isinstance(audio, (bytes, bytearray)):
+                await send_json({"type": "error", "turn_id": turn.id, "index": index,
+                                 "error": f"TTS failed for sentence {index}"})
+                continue
+            await send_audio({"type": "audio", "turn_id": turn.id, "index": index,
+                              "media_type": "audio/wav", "size": len(audio)}, bytes(audio))
@@ -32,6 +32,8 @@ from BigVGAN.bigvgan import BigVGAN
 from module.mel_processing import spectrogram_torch,mel_spectrogram_torch
 from process_ckpt import get_sovits_version_from_path_fast, load_sovits_new
 from services.lib.LAV_logger import logger
+from services.lib.metrics import TTS_T2S_STEPS_PER_SECOND, TTS_VITS_DECODE_SECONDS
+from services.lib.tracing import tracer
 language=os.environ.get("language","Auto")
 language=sys.argv[-1] if sys.argv[-1] in scan_language_list() else language
 i18n = I18nAuto(language=language)
@@ -1030,6 +1032,8 @@ class TTS:
 
 
         t2 = ttime()
+        tracer.add_span("tts.prompt", t0, t1)
+        tracer.add_span("tts.text_preprocess", t1, t2)
         try:
             logger.debug("############ 推理 ############")
             ###### inference ######
@@ -1075,6 +1079,10 @@ class TTS:
                 )
                 t4 = ttime()
                 t_34 += t4 - t3
+                t2s_steps = sum(int(idx) for idx in idx_list)
+                if t4 > t3:
+                    TTS_T2S_STEPS_PER_SECOND.observe(t2s_steps / (t4 - t3))
+                tracer.add_span("tts.t2s", t3, t4, steps=t2s_steps)
 
                 refer_audio_spec:torch.Tensor = [item.to(dtype=self.precision, device=self.configs.device) for item in self.prompt_cache["refer_spec"]]
 
@@ -1132,6 +1140,8 @@ class TTS:
 
                 t5 = ttime()
                 t_45 += t5 - t4
+                TTS_VITS_DECODE_SECONDS.observe(t5 - t4)
+                tracer.add_span("tts.vits", t4, t5)
                 if return_fragment:
                     logger.debug("%.3f\t%.3f\t%.3f\t%.3f" % (t1 - t0, t2 - t1, t4 - t3, t5 - t4))
                     yield self.audio_postprocess([batch_audio_fragment],
@@ -3,11 +3,14 @@ import os
 import shutil
 import subprocess
 import sys
+import time
 from typing import Generator
 import wave
 import numpy as np
 import soundfile as sf
 from services.lib.LAV_logger import logger
+from services.lib.metrics import TTS_REAL_TIME_FACTOR
+from services.lib.tracing import tracer
 
 base_dir = os.path.dirname(__file__)
 sys.path.insert(0, base_dir)
@@ -109,22 +112,37 @@ class GptSovits():
         self.prompt_lang = self.prompt_langs[voice_name]
         return {"message": f"Voice changed to {voice_name}"}
 
-    def synthesize(self, text):
+    def synthesize(self, text, voice=None):
+        """
+        Synthesize text with the given voice, or the current voice if None.
+
+        Passing a voice does not change the current voice, so clients with
+        different voices can share the pipeline.
+        """
         self._update_voice_files()  # Update voice files before synthesis
-        
-        if not self.current_voice:
+
+        if voice is None or voice == self.current_voice:
+            voice = self.current_voice
+            ref_audio_path, prompt_text, prompt_lang = self.ref_audio_path, self.prompt_text, self.prompt_lang
+        elif voice in self.voice_files:
+            ref_audio_path = os.path.join(current_module_directory, "models", voice, self.voice_files[voice])
+            prompt_text, prompt_lang = self.prompt_texts[voice], self.prompt_langs[voice]
+        else:
+            raise ValueError(f"Voice '{voice}' not found")
+
+        if not voice:
             raise ValueError("No voice models available. Please upload a voice model first.")
             
-        if not self.ref_audio_path or not os.path.exists(self.ref_audio_path):
-            raise ValueError(f"Reference audio file not found for voice '{self.current_voice}'")
+        if not ref_audio_path or not os.path.exists(ref_audio_path):
+            raise ValueError(f"Reference audio file not found for voice '{voice}'")
         
         req = {
             "text": text,
             "text_lang": 'auto',
-            "ref_audio_path": self.ref_audio_path,
+            "ref_audio_path": ref_audio_path,
             "aux_ref_audio_paths": [],
-            "prompt_text": self.prompt_text,
-            "prompt_lang": self.prompt_lang,
+            "prompt_text": prompt_text,
+            "prompt_lang": prompt_lang,
             "top_k": 5,
             "top_p": 1,
             "temperature": 1,
@@ -155,6 +173,8 @@ class GptSovits():
             req["return_fragment"] = True
             
         try:
+            start_time = time.perf_counter()
+            wall_start_time = time.time()
             tts_generator = self.tts_pipeline.run(req)
             
             if streaming_mode:
@@ -170,6 +190,10 @@ class GptSovits():
         
             else:
                 sr, audio_data = next(tts_generator)
+                if len(audio_data):
+                    TTS_REAL_TIME_FACTOR.observe((time.perf_counter() - start_time) / (len(audio_data) / sr))
+                tracer.add_span("tts.synthesize", wall_start_time, time.time(),
+                                characters=len(text), audio_seconds=round(len(audio_data) / sr, 2))
                 audio_data = pack_audio(BytesIO(), audio_data, sr, media_type).getvalue()
                 return audio_data
         except Exception as e:
@@ -181,7 +205,7 @@ class GptSovits():
         
         Args:
             name (str): Name of the voice (will be used as directory name)
-            reference_audio (bytes): Audio file data
+            reference_audio (bytes or str): Audio file data, or the path of an uploaded audio file
             reference_text (str): Reference text that matches the audio
             reference_language (str): Language code for the reference text
         
@@ -197,27 +221,31 @@ class GptSovits():
             audio_file = "reference.wav"
             wav_path = os.path.join(voice_dir, audio_file)
             
-            # Save audio file
-            audio_buffer = BytesIO(reference_audio)
+            # Save audio file, uploads are streamed to disk so they are read from their path
+            audio_source = reference_audio if isinstance(reference_audio, str) else BytesIO(reference_audio)
             
             # Convert to wav if needed using soundfile
             try:
-                data, samplerate = sf.read(audio_buffer)
+                data, samplerate = sf.read(audio_source)
                 sf.write(wav_path, data, samplerate)
             except Exception as e:
                 # If soundfile fails, try ffmpeg conversion
+                from_path = isinstance(audio_source, str)
                 process = subprocess.Popen([
                     'ffmpeg',
-                    '-i', 'pipe:0',  # Read from stdin
+                    '-i', audio_source if from_path else 'pipe:0',  # Read from the file or stdin
                     '-ar', '32000',  # Set sample rate to 32kHz
                     '-ac', '1',      # Convert to mono
                     '-f', 'wav',     # Output format
                     wav_path         # Output file
-                ], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                ], stdin=None if from_path else subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
                 
-                # Reset buffer position and write to ffmpeg
-                audio_buffer.seek(0)
-                process.communicate(input=audio_buffer.read())
+                if from_path:
+                    process.communicate()
+                else:
+                    # Reset buffer position and write to ffmpeg
+                    audio_source.seek(0)
+                    process.communicate(input=audio_source.read())
                 
                 if process.returncode != 0:
                     raise ValueError("Failed to convert audio file to WAV format")
@@ -15,9 +15,9 @@ class TTS:
         """Change the current voice to the specified one"""
         return self.tts_engine.change_voice(voice_name)
 
-    def synthesize(self, text):
-        """Synthesize text to speech using the current voice"""
-        return self.tts_engine.synthesize(text)
+    def synthesize(self, text, voice=None):
+        """Synthesize text to speech using the given voice, or the current voice if None"""
+        return self.tts_engine.synthesize(text, voice)
     
     def upload_voice(self, name, reference_audio, reference_text, reference_language):
         return self.tts_engine.upload_voice(name, reference_audio, reference_text, reference_language)
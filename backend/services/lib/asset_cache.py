@@ -0,0 +1,284 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from email.utils import formatdate
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from fastapi import Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from .LAV_logger import logger
+from .inference_executor import inference_executor
+
+try:
+    import brotli
+except ImportError:  # Optional, gzip variants are still served without it
+    brotli = None
+
+CHUNK_SIZE = 1024 * 1024
+# Only text assets compress well, textures, .moc3 and .vrm files are already compact binaries
+COMPRESSIBLE_EXTENSIONS = {".json", ".txt", ".xml"}
+MIN_COMPRESS_SIZE = 1024
+MAX_COMPRESS_SIZE = 64 * 1024 * 1024
+# Sent when the request URL carries the current content hash as ?v=, so the URL can never point to other content
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Sent otherwise, the browser keeps the file but revalidates it with the ETag (answered with a 304)
+REVALIDATE_CACHE_CONTROL = "no-cache"
+VERSION_PARAM = "v"
+
+# Content-Encoding, file suffix of the precompressed variant, in order of preference
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+mimetypes.add_type("model/gltf-binary", ".vrm")
+mimetypes.add_type("application/octet-stream", ".moc3")
+
+
+def parse_range(range_header: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single byte range.
+
+    Args:
+        range_header: Value of the Range header, e.g. "bytes=0-1023"
+        file_size: Size of the file in bytes
+
+    Returns:
+        (start, end) inclusive, None if the range is unsatisfiable
+
+    Raises:
+        ValueError: If the header is malformed or asks for several ranges
+    """
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in ranges:
+        raise ValueError(f"Unsupported range: {range_header}")
+    start_text, _, end_text = ranges.strip().partition("-")
+    if start_text == "":
+        # Suffix range, the last N bytes
+        length = int(end_text)
+        if length <= 0:
+            return None
+        return max(file_size - length, 0), file_size - 1
+    start = int(start_text)
+    end = int(end_text) if end_text else file_size - 1
+    if start > end and end_text:
+        raise ValueError(f"Invalid range: {range_header}")
+    if start >= file_size:
+        return None
+    return start, min(end, file_size - 1)
+
+
+def accepted_encodings(accept_encoding: str) -> List[str]:
+    """Content codings the client accepts, explicitly refused ones (q=0) excluded"""
+    accepted = []
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        if coding and params not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.append(coding.lower())
+    return accepted
+
+
+class AssetCache:
+    """
+    Serves static asset files with HTTP caching.
+
+    Each file gets a strong ETag from the SHA-256 of its content, computed once
+    and reused while the file's size and modification time stay the same.
+    Conditional requests are answered with 304, single byte ranges with 206,
+    and text assets are served from gzip/brotli copies that are generated on
+    first request and stored under cache_dir by content hash.
+    """
+
+    def __init__(self, cache_dir: str,
+                 hash_provider: Optional[Callable[[str], Optional[Tuple[int, int, str]]]] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir: Directory for the precompressed copies
+            hash_provider: Optional lookup of already known (size, mtime_ns, sha256) by absolute path,
+                used instead of hashing the file when size and mtime still match
+        """
+        self.cache_dir = cache_dir
+        self.hash_provider = hash_provider
+        self._hashes: Dict[str, Tuple[int, int, str]] = {}
+        self._lock = threading.Lock()
+        self._path_locks: Dict[str, threading.Lock] = {}
+
+    def _path_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._path_locks.setdefault(key, threading.Lock())
+
+    def content_hash(self, path: str, stat_result: Optional[os.stat_result] = None) -> str:
+        """
+        Get the SHA-256 of a file, cached by size and modification time.
+
+        Blocks while hashing a new or changed file, call it off the event loop.
+        """
+        path = os.path.abspath(path)
+        stat_result = stat_result or os.stat(path)
+        cached = self._hashes.get(path)
+        if cached and cached[:2] == (stat_result.st_size, stat_result.st_mtime_ns):
+            return cached[2]
+
+        known = self.hash_provider(path) if self.hash_provider else None
+        if known and known[:2] == (stat_result.st_size, stat_result.st_mtime_ns):
+            self._hashes[path] = known
+            return known[2]
+
+        # One thread hashes, concurrent first requests for the same file wait for it
+        with self._path_lock(path):
+            cached = self._hashes.get(path)
+            if cached and cached[:2] == (stat_result.st_size, stat_result.st_mtime_ns):
+                return cached[2]
+            sha256 = hashlib.sha256()
+            with open(path, "rb") as f:
+                while chunk := f.read(CHUNK_SIZE):
+                    sha256.update(chunk)
+            content_hash = sha256.hexdigest()
+            self._hashes[path] = (stat_result.st_size, stat_result.st_mtime_ns, content_hash)
+            return content_hash
+
+    def _is_compressible(self, path: str, size: int) -> bool:
+        return (os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS
+                and MIN_COMPRESS_SIZE <= size <= MAX_COMPRESS_SIZE)
+
+    def _variant_path(self, content_hash: str, suffix: str) -> str:
+        return os.path.join(self.cache_dir, content_hash[:2], content_hash + suffix)
+
+    def compressed_variant(self, path: str, content_hash: str, encoding: str) -> Optional[str]:
+        """
+        Get the precompressed copy of a file, creating it on first use.
+
+        Blocks while compressing, call it off the event loop.
+
+        Returns:
+            Path of the compressed copy, None if the encoding is unavailable or does not save space
+        """
+        suffix = dict(ENCODINGS)[encoding]
+        variant_path = self._variant_path(content_hash, suffix)
+        skip_marker = variant_path + ".skip"
+        if os.path.exists(variant_path):
+            return variant_path
+        if os.path.exists(skip_marker) or (encoding == "br" and brotli is None):
+            return None
+
+        with self._path_lock(variant_path):
+            if os.path.exists(variant_path):
+                return variant_path
+            with open(path, "rb") as f:
+                data = f.read()
+            if encoding == "br":
+                compressed = brotli.compress(data, quality=11)
+            else:
+                compressed = gzip.compress(data, compresslevel=9, mtime=0)
+
+            os.makedirs(os.path.dirname(variant_path), exist_ok=True)
+            if len(compressed) >= len(data) * 0.9:
+                # Not worth the decode on the client, remember that so it is not retried
+                open(skip_marker, "wb").close()
+                return None
+            temp_path = f"{variant_path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(compressed)
+            os.replace(temp_path, variant_path)
+            logger.debug(f"Precompressed {path} with {encoding}: {len(data)} -> {len(compressed)} bytes")
+            return variant_path
+
+    def invalidate(self, path: str):
+        """
+        Forget cached hashes and precompressed copies for a file or everything under a directory.
+
+        Call after a file is replaced or deleted.
+        """
+        path = os.path.abspath(path)
+        prefix = path.rstrip(os.sep) + os.sep
+        with self._lock:
+            stale = [p for p in self._hashes if p == path or p.startswith(prefix)]
+            entries = [self._hashes.pop(p) for p in stale]
+        for _, _, content_hash in entries:
+            for _, suffix in ENCODINGS:
+                for variant in (self._variant_path(content_hash, suffix),
+                                self._variant_path(content_hash, suffix) + ".skip"):
+                    try:
+                        os.remove(variant)
+                    except FileNotFoundError:
+                        pass
+                    except OSError as e:
+                        logger.warning(f"Could not remove cached asset {variant}: {e}")
+
+    async def serve(self, request: Request, path: str) -> Response:
+        """
+        Build the response for a GET or HEAD of an asset file.
+
+        Args:
+            request: The incoming request
+            path: Absolute path of the file to serve
+        """
+        stat_result = os.stat(path)
+        content_hash = await inference_executor.run(self.content_hash, path, stat_result)
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        versioned = request.query_params.get(VERSION_PARAM) == content_hash
+        headers = {
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if versioned else REVALIDATE_CACHE_CONTROL,
+            "Accept-Ranges": "bytes",
+            "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        }
+
+        # Pick the representation first, ETags differ between encodings of the same file
+        encoding = None
+        variant_path = None
+        range_header = request.headers.get("range")
+        if not range_header and self._is_compressible(path, stat_result.st_size):
+            headers["Vary"] = "Accept-Encoding"
+            accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+            for candidate, _ in ENCODINGS:
+                if candidate in accepted:
+                    variant_path = await inference_executor.run(self.compressed_variant, path, content_hash, candidate)
+                    if variant_path:
+                        encoding = candidate
+                        break
+
+        etag = f'"{content_hash[:32]}-{encoding}"' if encoding else f'"{content_hash[:32]}"'
+        headers["ETag"] = etag
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            if "*" in tags or etag in tags:
+                return Response(status_code=304, headers=headers)
+
+        if encoding:
+            headers["Content-Encoding"] = encoding
+            return FileResponse(variant_path, media_type=media_type, headers=headers)
+
+        # If-Range: only honour the range if the client's copy is still current
+        if_range = request.headers.get("if-range")
+        byte_range = False
+        if range_header and (not if_range or if_range == etag):
+            try:
+                byte_range = parse_range(range_header, stat_result.st_size)
+            except ValueError:
+                pass  # Malformed or multiple ranges, the whole file is sent instead
+        if byte_range is not False:
+            file_size = stat_result.st_size
+            if byte_range is None:
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{file_size}"})
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+            headers["Content-Length"] = str(end - start + 1)
+            body = self._read_range(path, start, end) if request.method != "HEAD" else iter(())
+            return StreamingResponse(body, status_code=206, media_type=media_type, headers=headers)
+
+        return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat_result)
+
+    def _read_range(self, path: str, start: int, end: int) -> Iterator[bytes]:
+        # A sync iterator, Starlette reads it on a worker thread
+        remaining = end - start + 1
+        with open(path, "rb") as f:
+            f.seek(start)
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
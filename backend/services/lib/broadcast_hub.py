@@ -0,0 +1,216 @@
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Hashable, Optional, Set, Tuple
+from fastapi import WebSocket
+from .LAV_logger import logger
+from .metrics import BROADCAST_DROPPED_TOTAL, BROADCAST_EVICTED_TOTAL
+
+# Messages buffered per subscriber before the policy kicks in
+DEFAULT_QUEUE_SIZE = 64
+# Seconds a single send may take before the subscriber is considered stuck
+DEFAULT_SEND_TIMEOUT = 5.0
+# Close code sent to evicted subscribers, "try again later"
+EVICTED_CLOSE_CODE = 1013
+
+# Channels
+AUDIO_CHANNEL = "audio"
+STREAM_CHAT_CHANNEL = "streamChat"
+
+# Delivery policies
+RELIABLE = "reliable"        # Every message is delivered, a subscriber whose queue is full is evicted
+DROP_OLDEST = "drop_oldest"  # A full queue drops its oldest message to make room
+COALESCE = "coalesce"        # Only the latest message per key is kept, e.g. VAD probability
+
+
+class Subscriber:
+    """A WebSocket subscribed to a channel, with its own bounded send queue and sender task"""
+
+    def __init__(self, websocket: WebSocket, channel: str, queue_size: int):
+        self.websocket = websocket
+        self.channel = channel
+        self.queue_size = queue_size
+        # Entries are (key, message), key is None for messages that are not coalesced
+        self.queue: Deque[Tuple[Optional[Hashable], Any]] = deque()
+        # Latest message per coalesce key, its slot in the queue is kept so ordering stays stable
+        self.coalesced: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.sender: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.queue)
+
+
+class BroadcastHub:
+    """
+    Fan-out of JSON messages to the WebSocket subscribers of named channels.
+
+    publish() never awaits a socket: it appends to each subscriber's bounded
+    queue and returns, and a sender task per subscriber drains the queue. When a
+    queue is full the message's policy decides: reliable messages evict the
+    slow subscriber, drop-oldest messages replace the oldest queued one, and
+    coalesced messages only ever keep their latest value. A subscriber whose
+    send does not finish within send_timeout is evicted as well.
+    """
+
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE, send_timeout: float = DEFAULT_SEND_TIMEOUT):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self._channels: Dict[str, Set[Subscriber]] = {}
+
+    def subscribe(self, websocket: WebSocket, channel: str) -> Subscriber:
+        """Subscribe an accepted WebSocket to a channel, must be called on the event loop"""
+        subscriber = Subscriber(websocket, channel, self.queue_size)
+        self._channels.setdefault(channel, set()).add(subscriber)
+        subscriber.sender = asyncio.create_task(self._send_loop(subscriber))
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self._channels.get(subscriber.channel)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._channels[subscriber.channel]
+        subscriber.closed = True
+        subscriber.ready.set()
+
+    def subscriber_count(self, channel: str) -> int:
+        return len(self._channels.get(channel, ()))
+
+    def publish(self, channel: str, message: Any, policy: str = RELIABLE, key: Optional[Hashable] = None):
+        """
+        Queue a message for every subscriber of a channel without waiting.
+
+        Must be called on the event loop thread, use publish_threadsafe from other threads.
+
+        Args:
+            channel: Channel name, e.g. "audio"
+            message: JSON serializable message
+            policy: RELIABLE, DROP_OLDEST or COALESCE
+            key: Coalesce key, defaults to the channel. Only used with COALESCE
+        """
+        for subscriber in list(self._channels.get(channel, ())):
+            self._enqueue(subscriber, message, policy, key if key is not None else channel)
+
+    def publish_threadsafe(self, loop: asyncio.AbstractEventLoop, channel: str, message: Any,
+                           policy: str = RELIABLE, key: Optional[Hashable] = None):
+        """Publish from a thread other than the event loop's"""
+        loop.call_soon_threadsafe(self.publish, channel, message, policy, key)
+
+    def _enqueue(self, subscriber: Subscriber, message: Any, policy: str, key: Hashable):
+        if subscriber.closed:
+            return
+
+        if policy == COALESCE:
+            if key in subscriber.coalesced:
+                # Already queued and not sent yet, replace the value in place
+                subscriber.coalesced[key] = message
+                BROADCAST_DROPPED_TOTAL.inc(channel=subscriber.channel)
+                return
+            if len(subscriber) >= subscriber.queue_size:
+                BROADCAST_DROPPED_TOTAL.inc(channel=subscriber.channel)
+                return
+            subscriber.coalesced[key] = message
+            subscriber.queue.append((key, None))
+        else:
+            if len(subscriber) >= subscriber.queue_size:
+                if policy == RELIABLE:
+                    logger.warning(f"Evicting slow subscriber from {subscriber.channel}: "
+                                   f"{len(subscriber)} messages queued")
+                    self._evict(subscriber)
+                    return
+                dropped_key, _ = subscriber.queue.popleft()
+                if dropped_key is not None:
+                    subscriber.coalesced.pop(dropped_key, None)
+                BROADCAST_DROPPED_TOTAL.inc(channel=subscriber.channel)
+            subscriber.queue.append((None, message))
+        subscriber.ready.set()
+
+    def _evict(self, subscriber: Subscriber):
+        BROADCAST_EVICTED_TOTAL.inc(channel=subscriber.channel)
+        self.unsubscribe(subscriber)
+        asyncio.create_task(self._close(subscriber.websocket, EVICTED_CLOSE_CODE))
+
+    async def _close(self, websocket: WebSocket, code: int = 1000):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass  # Already closed
+
+    async def _send_loop(self, subscriber: Subscriber):
+        while True:
+            await subscriber.ready.wait()
+            if subscriber.closed:
+                return
+            if not subscriber.queue:
+                subscriber.ready.clear()
+                continue
+
+            key, message = subscriber.queue.popleft()
+            if key is not None:
+                message = subscriber.coalesced.pop(key)
+            try:
+                await asyncio.wait_for(subscriber.websocket.send_json(message), self.send_timeout)
+            except asyncio.TimeoutError:
+                if not subscriber.closed:
+                    logger.warning(f"Evicting subscriber from {subscriber.channel}: send took over "
+                                   f"{self.send_timeout}s")
+                    self._evict(subscriber)
+                return
+            except Exception:
+                # Disconnected, the receive loop in serve() cleans up
+                self.unsubscribe(subscriber)
+                return
+
+    async def serve(self, websocket: WebSocket, channel: str):
+        """
+        Handle a subscriber WebSocket until it disconnects.
+
+        Accepts the connection, subscribes it to the channel and discards
+        anything the client sends.
+        """
+        await websocket.accept()
+        subscriber = self.subscribe(websocket, channel)
+        try:
+            while not subscriber.closed:
+                await websocket.receive_text()
+        except Exception:
+            pass
+        finally:
+            self.unsubscribe(subscriber)
+            if subscriber.sender and not subscriber.sender.done():
+                subscriber.sender.cancel()
+            await self._close(websocket)
+
+# Create a global broadcast hub instance
+broadcast_hub = BroadcastHub()
+
+
+if __name__ == "__main__":
+    class SlowSocket:
+        def __init__(self, name: str, delay: float):
+            self.name = name
+            self.delay = delay
+            self.received = []
+
+        async def send_json(self, message):
+            await asyncio.sleep(self.delay)
+            self.received.append(message)
+
+        async def close(self, code: int = 1000):
+            logger.info(f"{self.name} closed with code {code}")
+
+    async def main():
+        hub = BroadcastHub(queue_size=8, send_timeout=0.5)
+        fast, slow = SlowSocket("fast", 0), SlowSocket("slow", 0.05)
+        hub.subscribe(fast, "audio")
+        hub.subscribe(slow, "audio")
+        for i in range(200):
+            hub.publish("audio", {"type": "probability", "probability": i / 200}, COALESCE, "probability")
+            await asyncio.sleep(0.002)
+        hub.publish("audio", {"type": "transcription", "text": "hello"})
+        await asyncio.sleep(0.3)
+        for socket in (fast, slow):
+            logger.info(f"{socket.name} received {len(socket.received)} messages, last: {socket.received[-1]}")
+
+    asyncio.run(main())
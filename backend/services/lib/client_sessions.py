@@ -0,0 +1,154 @@
+import ipaddress
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+from .LAV_logger import logger
+from .scheduler import PRIORITY_CONTROL, PRIORITY_VIEWER
+
+# Header (HTTP) or query parameter (WebSocket) carrying the client session ID
+CLIENT_ID_HEADER = "X-Client-ID"
+CLIENT_ID_PARAM = "client_id"
+# Sessions not seen for this many seconds are dropped
+SESSION_IDLE_TIMEOUT = 6 * 60 * 60
+# Messages kept in a session's server-side history
+MAX_SESSION_HISTORY = 200
+
+# Client roles
+ROLE_CONTROL = "control"
+ROLE_VIEWER = "viewer"
+ROLE_PRIORITIES = {
+    ROLE_CONTROL: PRIORITY_CONTROL,
+    ROLE_VIEWER: PRIORITY_VIEWER,
+}
+
+
+@dataclass
+class ClientSession:
+    """
+    State of one browser talking to the backend.
+
+    voice and sampling_params override the global settings for this client's
+    requests only, the models themselves are shared.
+    """
+    id: str
+    role: str
+    host: str
+    voice: Optional[str] = None
+    sampling_params: Dict[str, Any] = field(default_factory=dict)
+    history: List[Dict[str, Any]] = field(default_factory=list)
+    created: float = field(default_factory=time.time)
+    last_seen: float = field(default_factory=time.time)
+
+    @property
+    def priority(self) -> int:
+        return ROLE_PRIORITIES.get(self.role, PRIORITY_VIEWER)
+
+    def add_to_history(self, *messages: Dict[str, Any]):
+        self.history.extend(messages)
+        del self.history[:-MAX_SESSION_HISTORY]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "role": self.role,
+            "host": self.host,
+            "voice": self.voice,
+            "sampling_params": self.sampling_params,
+            "history_length": len(self.history),
+            "created": self.created,
+            "last_seen": self.last_seen
+        }
+
+
+def is_loopback(host: str) -> bool:
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == "localhost"
+
+
+class ClientSessionManager:
+    """
+    Per-client sessions for the UI served to other PCs on the LAN.
+
+    A session is created on first contact and identified by the ID the client
+    sends back with later requests. Clients connecting from the host machine,
+    or from an address listed as a control host, get the control role and are
+    scheduled ahead of viewers.
+    """
+
+    def __init__(self, idle_timeout: float = SESSION_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self.control_hosts: set = set()
+        self._sessions: Dict[str, ClientSession] = {}
+        self._end_listeners = []
+
+    def set_control_hosts(self, hosts: Iterable[str]):
+        """Addresses whose clients get the control role in addition to the host machine"""
+        self.control_hosts = set(hosts or [])
+
+    def add_end_listener(self, listener):
+        """Register a callback called with the session ID when a session ends"""
+        self._end_listeners.append(listener)
+
+    def role_for(self, host: str) -> str:
+        return ROLE_CONTROL if is_loopback(host) or host in self.control_hosts else ROLE_VIEWER
+
+    def get_or_create(self, client_id: Optional[str], host: str) -> ClientSession:
+        """
+        Get the session of a client, creating it if the ID is missing or unknown.
+
+        Args:
+            client_id: Session ID sent by the client, if any
+            host: Client address, decides the role of a new session
+        """
+        self._expire()
+        session = self._sessions.get(client_id) if client_id else None
+        if session is None:
+            session = ClientSession(id=client_id or str(uuid.uuid4()), role=self.role_for(host), host=host)
+            self._sessions[session.id] = session
+            logger.info(f"Client session {session.id} started for {host} as {session.role}")
+        session.last_seen = time.time()
+        return session
+
+    def get(self, client_id: str) -> Optional[ClientSession]:
+        return self._sessions.get(client_id)
+
+    def update(self, client_id: str, **changes) -> Optional[ClientSession]:
+        """Update voice, sampling_params or role of a session, None values are ignored"""
+        session = self._sessions.get(client_id)
+        if session is None:
+            return None
+        for name, value in changes.items():
+            if value is not None:
+                setattr(session, name, value)
+        return session
+
+    def clear_voice(self, voice: str) -> int:
+        """Drop a deleted voice from the sessions using it, they fall back to the global voice"""
+        sessions = [session for session in self._sessions.values() if session.voice == voice]
+        for session in sessions:
+            session.voice = None
+        return len(sessions)
+
+    def end(self, client_id: str) -> bool:
+        session = self._sessions.pop(client_id, None)
+        if session is None:
+            return False
+        for listener in self._end_listeners:
+            listener(client_id)
+        logger.info(f"Client session {client_id} ended")
+        return True
+
+    def all(self) -> List[Dict[str, Any]]:
+        self._expire()
+        return [session.to_dict() for session in self._sessions.values()]
+
+    def _expire(self):
+        cutoff = time.time() - self.idle_timeout
+        for client_id in [s.id for s in self._sessions.values() if s.last_seen < cutoff]:
+            self.end(client_id)
+
+# Create a global client session manager instance
+client_sessions = ClientSessionManager()
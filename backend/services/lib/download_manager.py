@@ -0,0 +1,554 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import aiofiles
+import aiohttp
+from .LAV_logger import logger
+
+DEFAULT_SEGMENTS = 4
+MIN_SEGMENT_SIZE = 8 * 1024 * 1024  # Smaller files are not worth splitting
+CHUNK_SIZE = 1024 * 1024
+PROGRESS_INTERVAL = 0.5  # seconds between progress/state updates
+SEGMENT_RETRIES = 3
+FINISHED_JOB_RETENTION = 60 * 60  # seconds a finished job stays queryable for progress polling
+
+PART_SUFFIX = ".part"
+STATE_SUFFIX = ".part.json"
+
+# Job states, compatible with the statuses the frontend polls for
+STARTING = "starting"
+DOWNLOADING = "downloading"
+VERIFYING = "verifying"
+COMPLETED = "completed"
+ERROR = "error"
+CANCELLED = "cancelled"
+
+
+class DownloadError(Exception):
+    pass
+
+
+@dataclass
+class Segment:
+    """Byte range [start, end) of a file, end is None when the size is unknown"""
+    start: int
+    end: Optional[int]
+    done: int = 0
+
+    @property
+    def position(self) -> int:
+        return self.start + self.done
+
+    @property
+    def complete(self) -> bool:
+        return self.end is not None and self.position >= self.end
+
+
+@dataclass
+class DownloadFile:
+    """A single file of a download job"""
+    url: str
+    target_path: str
+    sha256: Optional[str] = None
+    total_size: int = 0
+    downloaded_size: int = 0
+    actual_sha256: Optional[str] = None
+    segments: List[Segment] = field(default_factory=list)
+    # ETag or Last-Modified of the remote file, a changed file is not resumed
+    _validator: Optional[str] = None
+    # Streaming hash state, the hash follows the contiguous downloaded prefix
+    _hasher: Any = None
+    _hash_position: int = 0
+    _hashing: bool = False
+
+    @property
+    def part_path(self) -> str:
+        return self.target_path + PART_SUFFIX
+
+    @property
+    def state_path(self) -> str:
+        return self.target_path + STATE_SUFFIX
+
+
+class DownloadJob:
+    """A download of one or more files tracked under a single ID"""
+
+    def __init__(self, download_id: str, model_name: str, files: List[DownloadFile],
+                 on_complete: Optional[Callable[["DownloadJob"], None]] = None):
+        self.id = download_id
+        self.model_name = model_name
+        self.files = files
+        self.on_complete = on_complete
+        self.status = STARTING
+        self.error: Optional[str] = None
+        self.start_time = time.time()
+        self.end_time: Optional[float] = None
+        self.progress = 0.0
+        self.speed = 0.0  # bytes per second
+        self.discard_on_cancel = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def total_size(self) -> int:
+        return sum(f.total_size for f in self.files)
+
+    @property
+    def downloaded_size(self) -> int:
+        return sum(f.downloaded_size for f in self.files)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (COMPLETED, ERROR, CANCELLED)
+
+    async def wait(self) -> "DownloadJob":
+        """Wait until the job has finished, successfully or not"""
+        if self._task:
+            try:
+                await asyncio.shield(self._task)
+            except asyncio.CancelledError:
+                if not self._task.cancelled():
+                    raise
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "model_name": self.model_name,
+            "status": self.status,
+            "progress": self.progress,
+            "total_size": self.total_size,
+            "downloaded_size": self.downloaded_size,
+            "download_speed_bytes": self.speed,
+            "error": self.error,
+            "start_time": self.start_time,
+            "elapsed_time": (self.end_time or time.time()) - self.start_time,
+            "files": [{"target_path": f.target_path, "sha256": f.actual_sha256} for f in self.files]
+        }
+
+
+class DownloadManager:
+    """
+    Shared download service for model files (LLM GGUFs, mmproj files, RVC zips).
+
+    Files are fetched with parallel HTTP Range segments when the server supports
+    them. Progress is kept in a .part.json file next to the .part data file so an
+    interrupted or cancelled download resumes where it stopped. SHA-256 is computed
+    while streaming and checked against the expected digest when one is given.
+    Progress and state are updated at most every PROGRESS_INTERVAL seconds.
+    """
+
+    def __init__(self, segments: int = DEFAULT_SEGMENTS, chunk_size: int = CHUNK_SIZE,
+                 min_segment_size: int = MIN_SEGMENT_SIZE, progress_interval: float = PROGRESS_INTERVAL):
+        """
+        Initialize the download manager.
+
+        Args:
+            segments: Maximum number of parallel connections per file
+            chunk_size: Size of the chunks read from the network
+            min_segment_size: Minimum size of a segment in bytes
+            progress_interval: Seconds between progress updates
+        """
+        self.segments = segments
+        self.chunk_size = chunk_size
+        self.min_segment_size = min_segment_size
+        self.progress_interval = progress_interval
+        self.jobs: Dict[str, DownloadJob] = {}
+
+    def start(self, model_name: str, files: List[Tuple[str, str, Optional[str]]], download_id: Optional[str] = None,
+              on_complete: Optional[Callable[[DownloadJob], None]] = None) -> DownloadJob:
+        """
+        Start a download in the background. Must be called from the event loop.
+
+        Args:
+            model_name: Name shown in progress reports
+            files: List of (url, target_path, expected sha256 or None), downloaded in order
+            download_id: Optional ID for the job, generated when omitted
+            on_complete: Optional callable run on a worker thread after all files completed
+
+        Returns:
+            DownloadJob: The started job, or the running one already downloading any of the target paths
+        """
+        self._prune()
+        for _, target_path, _ in files:
+            running = self.active_job(target_path)
+            if running:
+                # Two jobs would write overlapping ranges of the same .part file
+                logger.info(f"{os.path.basename(target_path)} is already downloading as {running.id}")
+                return running
+        download_id = download_id or str(uuid.uuid4())
+        job = DownloadJob(download_id, model_name,
+                          [DownloadFile(url, path, sha256.lower() if sha256 else None) for url, path, sha256 in files],
+                          on_complete)
+        self.jobs[download_id] = job
+        job._task = asyncio.create_task(self._run(job))
+        return job
+
+    def get(self, download_id: str) -> Optional[DownloadJob]:
+        return self.jobs.get(download_id)
+
+    def active_job(self, target_path: str) -> Optional[DownloadJob]:
+        """The unfinished job writing target_path, if any"""
+        target_path = os.path.abspath(target_path)
+        for job in self.jobs.values():
+            if not job.finished and any(os.path.abspath(f.target_path) == target_path for f in job.files):
+                return job
+        return None
+
+    def _prune(self):
+        cutoff = time.time() - FINISHED_JOB_RETENTION
+        for download_id in [job.id for job in self.jobs.values() if job.finished and job.end_time and job.end_time < cutoff]:
+            del self.jobs[download_id]
+
+    def cancel(self, download_id: str, discard: bool = False) -> bool:
+        """
+        Cancel a running download, stopping all its connections.
+
+        Args:
+            download_id: ID of the job
+            discard: Delete the partial files instead of keeping them for resuming
+
+        Returns:
+            bool: False if the job does not exist or has already finished
+        """
+        job = self.jobs.get(download_id)
+        if not job or job.finished or not job._task:
+            return False
+        job.discard_on_cancel = discard
+        job._task.cancel()
+        return True
+
+    async def _run(self, job: DownloadJob):
+        reporter = asyncio.create_task(self._report_progress(job))
+        try:
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60)
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                for file in job.files:
+                    job.status = DOWNLOADING
+                    await self._download_file(session, file)
+                    job.status = VERIFYING
+                    await self._finish_file(file)
+
+            if job.on_complete:
+                await asyncio.to_thread(job.on_complete, job)
+            job.status = COMPLETED
+            job.progress = 100
+            logger.info(f"Download completed: {job.model_name}")
+        except asyncio.CancelledError:
+            job.status = CANCELLED
+            for file in job.files:
+                if job.discard_on_cancel:
+                    self._remove_partial(file)
+                elif file.segments:
+                    self._save_state(file)
+            logger.info(f"Download cancelled: {job.model_name}")
+        except Exception as e:
+            job.status = ERROR
+            job.error = str(e)
+            logger.error(f"Download failed for {job.model_name}: {e}")
+            # Keep partial data for resuming unless it is known to be bad
+            for file in job.files:
+                if file.segments and not isinstance(e, DownloadError):
+                    self._save_state(file)
+        finally:
+            job.end_time = time.time()
+            reporter.cancel()
+
+    # *******************************
+    # Single file
+    # *******************************
+
+    async def _download_file(self, session: aiohttp.ClientSession, file: DownloadFile):
+        if os.path.exists(file.target_path):
+            raise DownloadError(f"File already exists: {file.target_path}")
+
+        total_size, accepts_ranges, validator = await self._probe(session, file.url)
+        os.makedirs(os.path.dirname(file.target_path) or ".", exist_ok=True)
+
+        resumed = total_size is not None and accepts_ranges and self._load_state(file, total_size, validator)
+        if not resumed:
+            self._plan_segments(file, total_size, accepts_ranges)
+            with open(file.part_path, "wb") as f:
+                if total_size:
+                    f.truncate(total_size)
+        file.total_size = total_size or 0
+        file.downloaded_size = sum(s.done for s in file.segments)
+        file._validator = validator
+        file._hasher = hashlib.sha256()
+        file._hash_position = 0
+        self._save_state(file)
+
+        if resumed:
+            logger.info(f"Resuming download of {os.path.basename(file.target_path)} at {file.downloaded_size} bytes")
+            # Hash the part that was downloaded before
+            await self._advance_hash(file)
+
+        tasks = [asyncio.create_task(self._download_segment(session, file, segment))
+                 for segment in file.segments if not segment.complete]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if total_size is None:
+            file.total_size = file.downloaded_size
+        await self._advance_hash(file)
+        if file._hash_position != file.total_size:
+            raise DownloadError(f"Incomplete download of {file.url}")
+        file.actual_sha256 = file._hasher.hexdigest()
+
+    async def _probe(self, session: aiohttp.ClientSession, url: str) -> Tuple[Optional[int], bool, Optional[str]]:
+        """Find the size of the file and whether the server supports Range requests"""
+        async with session.get(url, headers={"Range": "bytes=0-0"}) as response:
+            if response.status >= 400:
+                raise Exception(f"HTTP {response.status}: {await response.text()}")
+            validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+            content_range = response.headers.get("Content-Range", "")
+            if response.status == 206 and "/" in content_range and not content_range.endswith("/*"):
+                return int(content_range.rsplit("/", 1)[1]), True, validator
+            length = response.headers.get("Content-Length")
+            return (int(length) if length else None), False, validator
+
+    def _plan_segments(self, file: DownloadFile, total_size: Optional[int], accepts_ranges: bool):
+        if not total_size or not accepts_ranges:
+            file.segments = [Segment(0, total_size)]
+            return
+        count = max(1, min(self.segments, total_size // self.min_segment_size))
+        size = -(-total_size // count)
+        file.segments = [Segment(start, min(start + size, total_size)) for start in range(0, total_size, size)]
+
+    async def _download_segment(self, session: aiohttp.ClientSession, file: DownloadFile, segment: Segment):
+        attempt = 0
+        while not segment.complete:
+            headers = {}
+            if segment.end is not None:
+                headers["Range"] = f"bytes={segment.position}-{segment.end - 1}"
+            try:
+                async with session.get(file.url, headers=headers) as response:
+                    if response.status >= 400:
+                        raise Exception(f"HTTP {response.status}: {await response.text()}")
+                    if segment.end is not None and response.status != 206 and segment.position > 0:
+                        raise DownloadError("Server ignored the Range request")
+
+                    async with aiofiles.open(file.part_path, "r+b") as f:
+                        await f.seek(segment.position)
+                        async for chunk in response.content.iter_chunked(self.chunk_size):
+                            if segment.end is not None:
+                                chunk = chunk[:segment.end - segment.position]
+                            offset = segment.position
+                            await f.write(chunk)
+                            segment.done += len(chunk)
+                            file.downloaded_size += len(chunk)
+                            self._hash_chunk(file, offset, chunk)
+                            if segment.complete:
+                                break
+                    await self._advance_hash(file)
+
+                if segment.end is None:
+                    return  # Unknown size, the stream ending is the end of the file
+                if not segment.complete:
+                    raise aiohttp.ClientPayloadError("Connection closed before the segment was complete")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                attempt += 1
+                if attempt > SEGMENT_RETRIES or segment.end is None:
+                    raise
+                logger.warning(f"Retrying segment at {segment.position} of {file.url} ({attempt}/{SEGMENT_RETRIES}): {e}")
+                await asyncio.sleep(attempt)
+
+    async def _finish_file(self, file: DownloadFile):
+        if file.sha256 and file.actual_sha256 != file.sha256:
+            self._remove_partial(file)
+            raise DownloadError(f"SHA-256 mismatch for {os.path.basename(file.target_path)}: "
+                                f"expected {file.sha256}, got {file.actual_sha256}")
+        os.replace(file.part_path, file.target_path)
+        if os.path.exists(file.state_path):
+            os.remove(file.state_path)
+
+    # *******************************
+    # Streaming hash
+    # *******************************
+
+    def _hash_chunk(self, file: DownloadFile, offset: int, chunk: bytes):
+        """Hash a chunk straight from memory when it continues the hashed prefix"""
+        if not file._hashing and offset == file._hash_position:
+            file._hasher.update(chunk)
+            file._hash_position += len(chunk)
+
+    def _hashable_end(self, file: DownloadFile) -> int:
+        """End of the contiguous downloaded data starting at the hash position"""
+        end = file._hash_position
+        for segment in file.segments:
+            if segment.end is not None and segment.end <= end:
+                continue
+            if segment.start > end:
+                break
+            end = segment.position
+            if not segment.complete:
+                break
+        return end
+
+    async def _advance_hash(self, file: DownloadFile):
+        """
+        Catch the hash up over data another segment already wrote to disk.
+
+        Only needed when the hash crosses into a segment that was downloading in
+        parallel (or on resume). Those bytes were just written and are read back
+        from the page cache.
+        """
+        if file._hashing or self._hashable_end(file) <= file._hash_position:
+            return
+        file._hashing = True
+        try:
+            async with aiofiles.open(file.part_path, "rb") as f:
+                while True:
+                    end = self._hashable_end(file)
+                    if end <= file._hash_position:
+                        break
+                    await f.seek(file._hash_position)
+                    data = await f.read(min(self.chunk_size, end - file._hash_position))
+                    if not data:
+                        break
+                    file._hasher.update(data)
+                    file._hash_position += len(data)
+        finally:
+            file._hashing = False
+
+    # *******************************
+    # Resume state
+    # *******************************
+
+    def _save_state(self, file: DownloadFile):
+        if not file.segments or file.segments[0].end is None:
+            return  # Unknown size cannot be resumed
+        state = {
+            "url": file.url,
+            "total_size": file.total_size,
+            "validator": file._validator,
+            "segments": [[s.start, s.end, s.done] for s in file.segments]
+        }
+        try:
+            with open(file.state_path, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+        except OSError as e:
+            logger.warning(f"Could not save download state for {file.target_path}: {e}")
+
+    def _load_state(self, file: DownloadFile, total_size: int, validator: Optional[str]) -> bool:
+        """Restore segments from a previous attempt if it is for the same remote file"""
+        if not (os.path.exists(file.state_path) and os.path.exists(file.part_path)):
+            return False
+        try:
+            with open(file.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return False
+        if (state.get("url") != file.url or state.get("total_size") != total_size
+                or state.get("validator") != validator or os.path.getsize(file.part_path) != total_size):
+            logger.info(f"Remote file changed, restarting download of {os.path.basename(file.target_path)}")
+            return False
+        file.segments = [Segment(start, end, done) for start, end, done in state["segments"]]
+        return True
+
+    def _remove_partial(self, file: DownloadFile):
+        for path in (file.part_path, file.state_path):
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError as e:
+                logger.warning(f"Could not remove {path}: {e}")
+
+    # *******************************
+    # Progress
+    # *******************************
+
+    async def _report_progress(self, job: DownloadJob):
+        """Update progress, speed and resume state at a fixed interval instead of per chunk"""
+        last_size = job.downloaded_size
+        last_time = time.time()
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            now = time.time()
+            size = job.downloaded_size
+            # Exponential smoothing keeps the reported speed stable
+            current_speed = (size - last_size) / (now - last_time)
+            job.speed = current_speed if job.speed == 0 else 0.7 * job.speed + 0.3 * current_speed
+            job.progress = (size / job.total_size * 100) if job.total_size else 0
+            last_size, last_time = size, now
+            for file in job.files:
+                if file.segments and not all(s.complete for s in file.segments):
+                    self._save_state(file)
+
+# Create a global download manager instance
+download_manager = DownloadManager()
+
+
+if __name__ == "__main__":
+    # Manual test against a local HTTP stand-in that supports Range requests
+    import random
+    import tempfile
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    payload = random.Random(0).randbytes(40 * 1024 * 1024)
+    expected_sha256 = hashlib.sha256(payload).hexdigest()
+
+    class RangeHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            start, end = 0, len(payload) - 1
+            range_header = self.headers.get("Range")
+            if range_header:
+                first, last = range_header.split("=", 1)[1].split("-")
+                start, end = int(first), int(last) if last else len(payload) - 1
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{len(payload)}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("ETag", '"stand-in"')
+            self.end_headers()
+            try:
+                view = memoryview(payload)[start:end + 1]
+                for i in range(0, len(view), 256 * 1024):
+                    self.wfile.write(view[i:i + 256 * 1024])
+                    time.sleep(0.05)  # Slow enough to cancel mid-download
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/model.gguf"
+
+    async def main():
+        manager = DownloadManager(progress_interval=0.1)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            target = os.path.join(temp_dir, "model.gguf")
+
+            job = manager.start("model", [(url, target, expected_sha256)])
+            await asyncio.sleep(0.5)
+            manager.cancel(job.id)
+            await job.wait()
+            logger.info(f"Cancelled at {job.downloaded_size} bytes, status {job.status}")
+
+            start_time = time.time()
+            job = manager.start("model", [(url, target, expected_sha256)])
+            await job.wait()
+            logger.info(f"Resumed download {job.status} in {time.time() - start_time:.2f}s, sha256 {job.files[0].actual_sha256}")
+            assert job.status == COMPLETED, job.error
+            with open(target, "rb") as f:
+                assert f.read() == payload
+
+            os.remove(target)
+            job = manager.start("model", [(url, target, "0" * 64)])
+            await job.wait()
+            logger.info(f"Wrong checksum: {job.status}, {job.error}")
+            assert job.status == ERROR and not os.path.exists(target)
+
+    asyncio.run(main())
+    server.shutdown()
@@ -0,0 +1,160 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncGenerator, Callable, Dict, Iterable, Optional
+from .LAV_logger import logger
+from .metrics import INFERENCE_QUEUE_DEPTH
+
+# Worker threads per pool. Model pools are single threaded because the
+# underlying models (llama-cpp context, GPT-SoVITS, Whisper) are not safe to
+# call concurrently; requests for the same model queue up in FIFO order.
+# The llm pool gets one worker per llama-cpp context slot when llm.slots is raised.
+DEFAULT_POOLS = {
+    "llm": 1,
+    "tts": 1,
+    "asr": 1,
+    "vision": 1,
+    "capture": 1,
+    "default": 4,
+}
+
+_ITEM = object()
+_DONE = object()
+_ERROR = object()
+
+
+class InferenceExecutor:
+    """
+    Runs blocking model calls on worker threads so they never stall the event loop.
+
+    Each pool is a dedicated ThreadPoolExecutor. `run` awaits a single call and
+    `stream` turns a synchronous generator (e.g. llama-cpp token streaming) into an
+    async generator fed through a bounded queue.
+    """
+
+    def __init__(self, pools: Optional[Dict[str, int]] = None):
+        """
+        Initialize the executor.
+
+        Args:
+            pools: Mapping of pool name to number of worker threads
+        """
+        self.pool_sizes = dict(DEFAULT_POOLS if pools is None else pools)
+        self._pools: Dict[str, ThreadPoolExecutor] = {}
+        self._lock = threading.Lock()
+
+    def _get_pool(self, name: str) -> ThreadPoolExecutor:
+        """Get (or lazily create) the thread pool with the given name"""
+        with self._lock:
+            if name not in self._pools:
+                max_workers = self.pool_sizes.get(name, self.pool_sizes.get("default", 4))
+                self._pools[name] = ThreadPoolExecutor(max_workers=max_workers,
+                                                       thread_name_prefix=f"inference-{name}")
+            return self._pools[name]
+
+    async def run(self, fn: Callable, *args, pool: str = "default", **kwargs) -> Any:
+        """
+        Run a blocking function on a worker thread and await its result.
+
+        Args:
+            fn: The function to call
+            *args: Positional arguments for fn
+            pool: Name of the pool to run in
+            **kwargs: Keyword arguments for fn
+
+        Returns:
+            Any: The return value of fn
+        """
+        loop = asyncio.get_running_loop()
+        # Run in a copy of the caller's context so context variables (e.g. the traced turn) follow the call
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._get_pool(pool), functools.partial(context.run, fn, *args, **kwargs))
+
+    async def stream(self, generator: Iterable, pool: str = "llm", max_queue_size: int = 32) -> AsyncGenerator[Any, None]:
+        """
+        Iterate a synchronous generator on a worker thread and yield its items asynchronously.
+
+        The worker blocks while the queue is full (backpressure). When the consumer
+        stops iterating (client disconnect, task cancellation or break) the worker
+        stops at the next item and closes the generator on its own thread.
+
+        Args:
+            generator: Synchronous iterable to consume
+            pool: Name of the pool to run in
+            max_queue_size: Maximum number of items buffered between the worker and the consumer
+
+        Yields:
+            Items produced by the generator
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        cancel_event = threading.Event()
+
+        def put(kind, value) -> bool:
+            future = asyncio.run_coroutine_threadsafe(queue.put((kind, value)), loop)
+            while True:
+                try:
+                    future.result(timeout=0.1)
+                    return True
+                except concurrent.futures.TimeoutError:
+                    if cancel_event.is_set():
+                        future.cancel()
+                        return False
+
+        def produce():
+            try:
+                for item in generator:
+                    if cancel_event.is_set() or not put(_ITEM, item):
+                        break
+                else:
+                    put(_DONE, None)
+            except Exception as e:
+                logger.error(f"Error in streamed inference: {e}")
+                put(_ERROR, e)
+            finally:
+                close = getattr(generator, "close", None)
+                if close:
+                    close()
+
+        loop.run_in_executor(self._get_pool(pool), contextvars.copy_context().run, produce)
+
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind is _DONE:
+                    break
+                if kind is _ERROR:
+                    raise value
+                yield value
+        finally:
+            cancel_event.set()
+
+    def set_pool_size(self, name: str, size: int):
+        """Change the number of worker threads of a pool, running calls finish on the old workers"""
+        with self._lock:
+            if self.pool_sizes.get(name) == size:
+                return
+            self.pool_sizes[name] = size
+            old_pool = self._pools.pop(name, None)
+        if old_pool is not None:
+            old_pool.shutdown(wait=False)
+        logger.info(f"Inference pool {name} resized to {size} workers")
+
+    def queue_depths(self) -> Dict[tuple, int]:
+        """Number of calls waiting for a worker in each pool"""
+        with self._lock:
+            return {(name,): pool._work_queue.qsize() for name, pool in self._pools.items()}
+
+    def shutdown(self):
+        """Stop all pools without waiting for running calls"""
+        with self._lock:
+            for pool in self._pools.values():
+                pool.shutdown(wait=False, cancel_futures=True)
+            self._pools.clear()
+
+# Create a global inference executor instance
+inference_executor = InferenceExecutor()
+INFERENCE_QUEUE_DEPTH.set_function(inference_executor.queue_depths)
@@ -0,0 +1,261 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+from .LAV_logger import logger
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Real-time factor buckets (processing time / audio duration, < 1 is faster than real time)
+RTF_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0)
+# Throughput buckets (tokens or decode steps per second)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500, 1000)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """Base class for metrics, values are kept per label combination"""
+    type_name = ""
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if len(labels) != len(self.label_names):
+            raise ValueError(f"Metric {self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(Metric):
+    """Monotonically increasing value"""
+    type_name = "counter"
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = ()):
+        super().__init__(name, description, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Metric):
+    """
+    Value that can go up and down.
+
+    Instead of being set explicitly a gauge can be backed by a function evaluated at
+    scrape time, which costs nothing on the hot path (used for queue depths).
+    """
+    type_name = "gauge"
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = ()):
+        super().__init__(name, description, labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], Union[float, Dict[LabelValues, float]]]] = None
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function: Callable[[], Union[float, Dict[LabelValues, float]]]):
+        """
+        Back the gauge with a function.
+
+        Args:
+            function: Returns a number, or for labelled gauges a dict of label value tuples to numbers
+        """
+        self._function = function
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            values = dict(self._values)
+        if self._function:
+            try:
+                result = self._function()
+                if isinstance(result, dict):
+                    values.update(result)
+                else:
+                    values[()] = result
+            except Exception as e:
+                logger.warning(f"Failed to collect gauge {self.name}: {e}")
+        for key, value in values.items():
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(Metric):
+    """Distribution of observed values over fixed buckets"""
+    type_name = "histogram"
+
+    def __init__(self, name: str, description: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label combination: [bucket counts (non cumulative, last is +Inf), sum, count]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            values = [(key, list(entry[0]), entry[1], entry[2]) for key, entry in self._values.items()]
+        bucket_labels = self.label_names + ("le",)
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                labels = _format_labels(bucket_labels, key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, description: str, labels: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, description, labels))
+
+    def gauge(self, name: str, description: str, labels: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, description, labels))
+
+    def histogram(self, name: str, description: str, labels: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, description, labels, buckets))
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text format"""
+        with self._lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Create a global metrics registry instance
+metrics = MetricsRegistry()
+
+# *******************************
+# Voice loop metrics
+# *******************************
+
+VAD_TO_ASR_SECONDS = metrics.histogram(
+    "lav_vad_to_asr_seconds", "Time from VAD end of speech to the transcription being available")
+ASR_REAL_TIME_FACTOR = metrics.histogram(
+    "lav_asr_real_time_factor", "Whisper transcription time divided by audio duration", buckets=RTF_BUCKETS)
+LLM_TIME_TO_FIRST_TOKEN_SECONDS = metrics.histogram(
+    "lav_llm_time_to_first_token_seconds", "Time from completion request to the first generated token", labels=("mode",))
+LLM_TOKENS_PER_SECOND = metrics.histogram(
+    "lav_llm_tokens_per_second", "Decode speed after the first token", labels=("mode",), buckets=RATE_BUCKETS)
+LLM_TOKENS_TOTAL = metrics.counter(
+    "lav_llm_tokens_total", "Generated tokens", labels=("mode",))
+TTS_T2S_STEPS_PER_SECOND = metrics.histogram(
+    "lav_tts_t2s_steps_per_second", "GPT-SoVITS text-to-semantic decode steps per second", buckets=RATE_BUCKETS)
+TTS_VITS_DECODE_SECONDS = metrics.histogram(
+    "lav_tts_vits_decode_seconds", "GPT-SoVITS VITS decode time per batch")
+TTS_REAL_TIME_FACTOR = metrics.histogram(
+    "lav_tts_real_time_factor", "TTS synthesis time divided by generated audio duration", buckets=RTF_BUCKETS)
+PROXY_REQUEST_SECONDS = metrics.histogram(
+    "lav_proxy_request_seconds", "Proxied request time, endpoint=\"convert\" on /api/rvc is RVC conversion",
+    labels=("target", "endpoint"))
+MEMORY_QUERY_SECONDS = metrics.histogram(
+    "lav_memory_query_seconds", "Memory vector search latency")
+INFERENCE_QUEUE_DEPTH = metrics.gauge(
+    "lav_inference_queue_depth", "Calls waiting for a worker in each inference pool", labels=("pool",))
+PIPELINE_QUEUE_DEPTH = metrics.gauge(
+    "lav_pipeline_queue_depth", "Items buffered between conversation pipeline stages", labels=("queue",))
+BROADCAST_DROPPED_TOTAL = metrics.counter(
+    "lav_broadcast_dropped_total", "Messages dropped or coalesced for slow WebSocket subscribers", labels=("channel",))
+BROADCAST_EVICTED_TOTAL = metrics.counter(
+    "lav_broadcast_evicted_total", "WebSocket subscribers disconnected for falling behind", labels=("channel",))
+SCHEDULER_WAIT_SECONDS = metrics.histogram(
+    "lav_scheduler_wait_seconds", "Time a client request waited for a shared model slot", labels=("resource",))
+SCHEDULER_QUEUE_DEPTH = metrics.gauge(
+    "lav_scheduler_queue_depth", "Client requests waiting for a shared model slot", labels=("resource",))
+LLM_DRAFT_TOKENS_TOTAL = metrics.counter(
+    "lav_llm_draft_tokens_total", "Speculative decoding draft tokens accepted or rejected by the model", labels=("result",))
+SCHEDULER_CANCELLED_TOTAL = metrics.counter(
+    "lav_scheduler_cancelled_total", "Client requests that left the queue before getting a model slot", labels=("resource",))
+LLM_SLOT_WAIT_SECONDS = metrics.histogram(
+    "lav_llm_slot_wait_seconds", "Time a completion waited for a free LLM context slot")
+LLM_SLOTS_BUSY = metrics.gauge(
+    "lav_llm_slots_busy", "LLM context slots running a completion")
+VISION_EMBEDDING_CACHE_TOTAL = metrics.counter(
+    "lav_vision_embedding_cache_total", "CLIP image embedding lookups, a miss runs the vision encoder", labels=("result",))
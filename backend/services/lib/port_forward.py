@@ -1,45 +1,105 @@
+import time
 import httpx
 from fastapi import Request, Response
-from fastapi.responses import JSONResponse
-from typing import Optional, Callable
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Optional, Callable, Dict, List
 from .LAV_logger import logger
+from .metrics import PROXY_REQUEST_SECONDS
+from .tracing import tracer
 
-async def forward_request(request: Request, from_path: str, to_url: str) -> Response:
+# Seconds, overridable per proxy. The read timeout applies between received chunks,
+# not to the whole response, so long streamed audio is not cut off.
+DEFAULT_PROXY_TIMEOUTS = {
+    "connect": 5.0,
+    "read": 120.0,
+    "write": 60.0,
+    "pool": 10.0,
+}
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 60.0  # seconds
+
+# Headers that only apply to a single connection and must not be forwarded (RFC 9110 section 7.6.1)
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "transfer-encoding", "upgrade", "host"
+}
+
+
+class ReverseProxy:
     """
-    Forward a request from one path to another URL.
-    
-    Args:
-        request (Request): The incoming FastAPI request
-        from_path (str): The path prefix to strip (e.g. "/api/rvc")
-        to_url (str): The base URL to forward to (e.g. "http://localhost:8001")
-        
-    Returns:
-        Response: The response from the forwarded request
+    Streaming reverse proxy from a path prefix to another server.
+
+    Uses one long-lived pooled client so connections to the target are kept alive
+    between requests. Request and response bodies are passed through chunk by
+    chunk instead of being buffered, so e.g. audio from the RVC server reaches the
+    browser as it is produced.
     """
-    # Strip prefix and create target URL
-    path = request.url.path.replace(from_path, "", 1)
-    target_url = f"{to_url}{path}"
-    
-    async with httpx.AsyncClient() as client:
+
+    def __init__(self, from_path: str, to_url: str, timeouts: Optional[Dict[str, float]] = None,
+                 max_connections: int = DEFAULT_MAX_CONNECTIONS, exclude_paths: Optional[List[str]] = None):
+        """
+        Initialize the proxy.
+
+        Args:
+            from_path (str): The path prefix to strip (e.g. "/api/rvc")
+            to_url (str): The base URL to forward to (e.g. "http://localhost:8001")
+            timeouts (dict): Optional overrides for the "connect", "read", "write" and "pool" timeouts
+            max_connections (int): Maximum number of pooled connections to the target
+            exclude_paths (list): Paths under from_path handled locally instead of forwarded
+        """
+        self.from_path = from_path
+        self.to_url = to_url
+        self.timeouts = {**DEFAULT_PROXY_TIMEOUTS, **(timeouts or {})}
+        self.max_connections = max_connections
+        self.exclude_paths = set(exclude_paths or [])
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use so it binds to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(**self.timeouts),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections,
+                                    keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY)
+            )
+        return self._client
+
+    async def forward_request(self, request: Request) -> Response:
+        """
+        Forward a request to the target server and stream the response back.
+
+        Args:
+            request (Request): The incoming FastAPI request
+
+        Returns:
+            Response: The streamed response from the target server
+        """
+        # Strip prefix and create target URL
+        path = request.url.path.replace(self.from_path, "", 1)
+        target_url = f"{self.to_url}{path}"
+        # First path segment only, keeps label cardinality bounded (e.g. /load_model/{name})
+        endpoint = path.strip("/").split("/")[0]
+        turn_id = tracer.current_turn_id()
+        start_time = time.perf_counter()
+        wall_start_time = time.time()
+
+        # Content-Length is kept so the body is not re-framed as chunked when its size is known
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+        has_body = "content-length" in request.headers or "transfer-encoding" in request.headers
+
         try:
-            # Forward the request with same method, body, and headers
-            body = await request.body()
-            headers = {k: v for k, v in request.headers.items() 
-                     if k.lower() not in ["host", "content-length"]}
-            
-            response = await client.request(
+            # Forward the request with same method, streamed body, and headers
+            upstream_request = self.client.build_request(
                 method=request.method,
                 url=target_url,
-                content=body,
+                content=request.stream() if has_body else None,
                 headers=headers,
                 params=request.query_params
             )
-            
-            return Response(
-                content=response.content,
-                status_code=response.status_code,
-                media_type=response.headers.get("content-type")
-            )
+            upstream_response = await self.client.send(upstream_request, stream=True)
         except Exception as e:
             logger.error(f"Error forwarding request: {e}")
             return JSONResponse(
@@ -47,24 +107,59 @@ async def forward_request(request: Request, from_path: str, to_url: str) -> Resp
                 content={"detail": "Target server not available"}
             )
 
-def create_proxy_middleware(from_path: str, to_port: int) -> Callable:
+        async def body():
+            try:
+                async for chunk in upstream_response.aiter_raw():
+                    yield chunk
+            except httpx.HTTPError as e:
+                logger.error(f"Error streaming response from {target_url}: {e}")
+            finally:
+                PROXY_REQUEST_SECONDS.observe(time.perf_counter() - start_time,
+                                              target=self.from_path, endpoint=endpoint)
+                tracer.add_span("proxy.forward", wall_start_time, time.time(), turn_id,
+                                target=self.from_path, endpoint=endpoint, status=upstream_response.status_code)
+
+        response_headers = {k: v for k, v in upstream_response.headers.items()
+                            if k.lower() not in HOP_BY_HOP_HEADERS}
+        return StreamingResponse(
+            body(),
+            status_code=upstream_response.status_code,
+            headers=response_headers,
+            background=BackgroundTask(upstream_response.aclose)
+        )
+
+    async def middleware(self, request: Request, call_next):
+        """FastAPI middleware function, forwards requests under from_path"""
+        if request.url.path.startswith(self.from_path) and request.url.path not in self.exclude_paths:
+            return await self.forward_request(request)
+        return await call_next(request)
+
+    async def aclose(self):
+        """Close pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def create_proxy_middleware(from_path: str, to_port: int, timeouts: Optional[Dict[str, float]] = None,
+                            exclude_paths: Optional[List[str]] = None) -> Callable:
     """
     Create a FastAPI middleware function that forwards requests from one path to another port.
-    
+
     Args:
         from_path (str): The path prefix to forward from (e.g. "/api/rvc")
         to_port (int): The port to forward to
-        
+        timeouts (dict): Optional overrides for the proxy timeouts
+        exclude_paths (list): Paths under from_path handled locally instead of forwarded
+
     Returns:
-        Callable: A middleware function that can be used with FastAPI
+        Callable: A middleware function that can be used with FastAPI, its
+            `proxy` attribute is the ReverseProxy to close on shutdown
     """
+    proxy = ReverseProxy(from_path, f"http://localhost:{to_port}", timeouts, exclude_paths=exclude_paths)
+
     async def proxy_middleware(request: Request, call_next):
-        if request.url.path.startswith(from_path):
-            return await forward_request(
-                request=request,
-                from_path=from_path,
-                to_url=f"http://localhost:{to_port}"
-            )
-        return await call_next(request)
-        
-    return proxy_middleware 
\ No newline at end of file
+        return await proxy.middleware(request, call_next)
+
+    proxy_middleware.proxy = proxy
+    return proxy_middleware
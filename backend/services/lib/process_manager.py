@@ -6,7 +6,6 @@ import os
 from typing import Optional, Tuple, Dict, Any
 from dataclasses import dataclass
 from .LAV_logger import logger
-from .startup_progress import startup_progress
 
 @dataclass
 class ServerProcess:
@@ -63,17 +62,17 @@ class ProcessManager:
             Tuple[bool, str]: (success, message)
         """
         start_time = time.time()
-        startup_progress.show_step(f"Starting {name} Server")
+        logger.info(f"Starting {name} Server...")
 
         try:
             if not os.path.exists(python_path):
                 msg = f"{name} server startup failed - virtual environment not found"
-                startup_progress.complete_step(f"{msg} in {time.time() - start_time:.2f}s")
+                logger.error(f"{msg} in {time.time() - start_time:.2f}s")
                 return False, msg
                 
             if not os.path.exists(script_path):
                 msg = f"{name} server startup failed - server script not found"
-                startup_progress.complete_step(f"{msg} in {time.time() - start_time:.2f}s")
+                logger.error(f"{msg} in {time.time() - start_time:.2f}s")
                 return False, msg
 
             # Create process tracking objects
@@ -118,19 +117,19 @@ class ProcessManager:
             # Wait for server to be ready with a timeout
             if ready_event.wait(timeout=timeout):
                 msg = f"{name} server started successfully"
-                startup_progress.complete_step(f"{msg} in {time.time() - start_time:.2f}s")
+                logger.info(f"{msg} in {time.time() - start_time:.2f}s")
                 return True, msg
             else:
                 # If timeout occurs, stop the server
                 self.stop_server(name)
                 msg = f"{name} server failed to start within timeout period"
-                startup_progress.complete_step(f"{msg} in {time.time() - start_time:.2f}s")
+                logger.error(f"{msg} in {time.time() - start_time:.2f}s")
                 return False, msg
                 
         except Exception as e:
             logger.error(f"Error starting {name} server: {e}")
             msg = f"{name} server startup failed with error: {str(e)}"
-            startup_progress.complete_step(f"{msg} in {time.time() - start_time:.2f}s")
+            logger.error(f"{msg} in {time.time() - start_time:.2f}s")
             return False, msg
 
     def stop_server(self, name: str) -> bool:
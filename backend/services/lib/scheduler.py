@@ -0,0 +1,214 @@
+import asyncio
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from .LAV_logger import logger
+from .metrics import SCHEDULER_WAIT_SECONDS, SCHEDULER_QUEUE_DEPTH, SCHEDULER_CANCELLED_TOTAL
+
+# Shared model resources, each call holding a slot has the model to itself
+LLM_RESOURCE = "llm"
+TTS_RESOURCE = "tts"
+
+# Concurrent holders per resource, matching the single worker thread of each model pool
+DEFAULT_SLOTS = {
+    LLM_RESOURCE: 1,
+    TTS_RESOURCE: 1,
+}
+
+# Lower runs first
+PRIORITY_CONTROL = 0
+PRIORITY_VIEWER = 1
+
+
+class Ticket:
+    """A request for a slot of a resource, waiting or granted"""
+
+    def __init__(self, scheduler: "FairScheduler", resource: str, session_id: str, priority: int, sequence: int,
+                 on_position: Optional[Callable[[int], None]] = None):
+        self.scheduler = scheduler
+        self.resource = resource
+        self.session_id = session_id
+        self.priority = priority
+        self.sequence = sequence
+        self.on_position = on_position
+        self.enqueued = time.monotonic()
+        self.granted: Optional[float] = None
+        self.position: Optional[int] = None
+        self.released = False
+        self._future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def release(self):
+        """Give the slot back, safe to call more than once"""
+        self.scheduler.release(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "resource": self.resource,
+            "session_id": self.session_id,
+            "priority": self.priority,
+            "position": self.position,
+            "waiting": round(time.monotonic() - self.enqueued, 3) if self.granted is None else None,
+            "running": self.granted is not None
+        }
+
+
+class FairScheduler:
+    """
+    Arbitrates access to the shared models between client sessions.
+
+    Each resource has a fixed number of slots. Waiting requests are granted by
+    priority first (the broadcaster's control client ahead of viewers), then by
+    the session that was served least recently, then in arrival order. A
+    client sending many requests therefore takes turns with the others instead
+    of queueing ahead of them. Waiters are told their queue position whenever
+    it changes.
+    """
+
+    def __init__(self, slots: Optional[Dict[str, int]] = None):
+        """
+        Initialize the scheduler.
+
+        Args:
+            slots: Mapping of resource name to number of concurrent holders
+        """
+        self.slots = dict(DEFAULT_SLOTS if slots is None else slots)
+        self._waiting: Dict[str, List[Ticket]] = {}
+        self._running: Dict[str, List[Ticket]] = {}
+        # Grant sequence number of the last slot each session got, per resource
+        self._last_served: Dict[tuple, int] = {}
+        self._sequence = itertools.count(1)
+
+    def _order(self, ticket: Ticket):
+        return ticket.priority, self._last_served.get((ticket.resource, ticket.session_id), 0), ticket.sequence
+
+    async def acquire(self, resource: str, session_id: str, priority: int = PRIORITY_VIEWER,
+                      on_position: Optional[Callable[[int], None]] = None) -> Ticket:
+        """
+        Wait for a slot of a resource.
+
+        Must be called on the event loop. Cancelling the caller while it waits
+        removes the request from the queue.
+
+        Args:
+            resource: Resource name, e.g. LLM_RESOURCE
+            session_id: Client session the request belongs to
+            priority: PRIORITY_CONTROL or PRIORITY_VIEWER
+            on_position: Called with the 1-based queue position whenever it changes while waiting
+
+        Returns:
+            Ticket: The granted ticket, release it when done
+        """
+        ticket = Ticket(self, resource, session_id, priority, next(self._sequence), on_position)
+        self._waiting.setdefault(resource, []).append(ticket)
+        self._dispatch(resource)
+        try:
+            await asyncio.shield(ticket._future)
+        except asyncio.CancelledError:
+            if ticket.granted is not None:
+                ticket.release()
+            else:
+                self._waiting[resource].remove(ticket)
+                SCHEDULER_CANCELLED_TOTAL.inc(resource=resource)
+                self._dispatch(resource)
+            raise
+
+        wait_time = ticket.granted - ticket.enqueued
+        SCHEDULER_WAIT_SECONDS.observe(wait_time, resource=resource)
+        if wait_time > 1.0:
+            logger.debug(f"Session {session_id} waited {wait_time:.2f}s for {resource}")
+        return ticket
+
+    def release(self, ticket: Ticket):
+        if ticket.released or ticket.granted is None:
+            return
+        ticket.released = True
+        self._running[ticket.resource].remove(ticket)
+        self._dispatch(ticket.resource)
+
+    @asynccontextmanager
+    async def slot(self, resource: str, session_id: str, priority: int = PRIORITY_VIEWER,
+                   on_position: Optional[Callable[[int], None]] = None) -> AsyncIterator[Ticket]:
+        """Hold a slot of a resource for the duration of the block"""
+        ticket = await self.acquire(resource, session_id, priority, on_position)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def set_slots(self, resource: str, count: int):
+        """Change the number of concurrent holders of a resource, waiting requests are granted right away if it grows"""
+        self.slots[resource] = count
+        self._dispatch(resource)
+
+    def _dispatch(self, resource: str):
+        waiting = self._waiting.setdefault(resource, [])
+        running = self._running.setdefault(resource, [])
+        while waiting and len(running) < self.slots.get(resource, 1):
+            waiting.sort(key=self._order)
+            ticket = waiting.pop(0)
+            ticket.granted = time.monotonic()
+            ticket.position = 0
+            self._last_served[(resource, ticket.session_id)] = ticket.sequence
+            running.append(ticket)
+            ticket._future.set_result(None)
+
+        waiting.sort(key=self._order)
+        for position, ticket in enumerate(waiting, start=1):
+            if ticket.position != position:
+                ticket.position = position
+                if ticket.on_position:
+                    try:
+                        ticket.on_position(position)
+                    except Exception as e:
+                        logger.warning(f"Queue position callback failed: {e}")
+
+    def forget(self, session_id: str):
+        """Drop the fairness history of a session that ended"""
+        for key in [key for key in self._last_served if key[1] == session_id]:
+            del self._last_served[key]
+
+    def status(self, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Running and waiting requests per resource, optionally only those of one session"""
+        status = {}
+        for resource in self.slots:
+            tickets = self._running.get(resource, []) + self._waiting.get(resource, [])
+            status[resource] = {
+                "slots": self.slots[resource],
+                "running": len(self._running.get(resource, [])),
+                "waiting": len(self._waiting.get(resource, [])),
+                "requests": [ticket.to_dict() for ticket in tickets
+                             if session_id is None or ticket.session_id == session_id]
+            }
+        return status
+
+    def queue_depths(self) -> Dict[tuple, int]:
+        return {(resource,): len(waiting) for resource, waiting in self._waiting.items()}
+
+# Create a global request scheduler instance
+request_scheduler = FairScheduler()
+SCHEDULER_QUEUE_DEPTH.set_function(request_scheduler.queue_depths)
+
+
+if __name__ == "__main__":
+    async def main():
+        scheduler = FairScheduler()
+        order = []
+
+        async def request(session_id: str, priority: int, index: int):
+            def report(position):
+                logger.info(f"{session_id}#{index} queue position {position}")
+            async with scheduler.slot(LLM_RESOURCE, session_id, priority, report):
+                order.append(f"{session_id}#{index}")
+                await asyncio.sleep(0.01)
+
+        # A viewer floods the queue, another viewer and the control client arrive later
+        tasks = [asyncio.create_task(request("viewer-a", PRIORITY_VIEWER, i)) for i in range(4)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(request("viewer-b", PRIORITY_VIEWER, i)) for i in range(2)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request("control", PRIORITY_CONTROL, 0)))
+        await asyncio.gather(*tasks)
+        logger.info(f"Grant order: {order}")
+
+    asyncio.run(main())
@@ -0,0 +1,206 @@
+import asyncio
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from .LAV_logger import logger
+
+# Service states reported by the status API
+COLD = "cold"
+WARMING = "warming"
+READY = "ready"
+ERROR = "error"
+
+
+class ServiceHandle:
+    """
+    Lazily constructed handle to a service.
+
+    The service is built on first use (or by a background warm-up) and attribute
+    access is forwarded to the instance, so a handle can stand in for the service
+    object itself.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any], warmup: Optional[Callable[[Any], None]] = None):
+        """
+        Initialize the handle.
+
+        Args:
+            name: Name of the service
+            factory: Callable that constructs the service instance
+            warmup: Optional callable run on the instance during background warm-up only
+        """
+        self._name = name
+        self._factory = factory
+        self._warmup = warmup
+        self._instance = None
+        self._state = COLD
+        self._error: Optional[str] = None
+        self._load_time: Optional[float] = None
+        self._lock = threading.RLock()
+        self._ready_event = threading.Event()
+        self._ready_callbacks: List[Callable[[Any], None]] = []
+        self._warm_thread: Optional[threading.Thread] = None
+        self._warmed = False
+
+    def get(self) -> Any:
+        """Get the service instance, constructing it on the calling thread if needed"""
+        if self._state == READY:
+            return self._instance
+
+        with self._lock:
+            if self._state == READY:
+                return self._instance
+
+            self._state = WARMING
+            self._error = None
+            start_time = time.time()
+            try:
+                instance = self._factory()
+            except Exception as e:
+                self._state = ERROR
+                self._error = str(e)
+                logger.error(f"Failed to load service {self._name}: {e}\n{traceback.format_exc()}")
+                raise
+
+            self._instance = instance
+            self._load_time = time.time() - start_time
+            self._state = READY
+            self._ready_event.set()
+            logger.info(f"Service {self._name} ready in {self._load_time:.2f}s")
+
+            # A failing callback (e.g. a saved setting that no longer applies) must not discard the built service
+            callbacks, self._ready_callbacks = self._ready_callbacks, []
+            for callback in callbacks:
+                try:
+                    callback(instance)
+                except Exception as e:
+                    logger.error(f"Ready callback of service {self._name} failed: {e}\n{traceback.format_exc()}")
+            return instance
+
+    def __getattr__(self, item):
+        # Only called for attributes the handle itself does not define
+        if item.startswith("__") or "_state" not in self.__dict__:
+            raise AttributeError(item)
+        return getattr(self.get(), item)
+
+    def is_ready(self) -> bool:
+        return self._state == READY
+
+    def when_ready(self, callback: Callable[[Any], None]):
+        """
+        Run a callback with the instance once it is constructed.
+
+        If the service is already loaded the callback runs immediately on the calling thread.
+        """
+        with self._lock:
+            if self._state != READY:
+                self._ready_callbacks.append(callback)
+                return
+        callback(self._instance)
+
+    def warm(self) -> threading.Thread:
+        """Construct and warm up the service on a background thread"""
+        with self._lock:
+            if self._warm_thread and self._warm_thread.is_alive():
+                return self._warm_thread
+
+            def run():
+                try:
+                    self.get()
+                    self.run_warmup()
+                except Exception as e:
+                    logger.warning(f"Warm-up of service {self._name} failed (non-critical): {e}")
+
+            self._warm_thread = threading.Thread(target=run, name=f"warmup-{self._name}", daemon=True)
+            self._warm_thread.start()
+            return self._warm_thread
+
+    def run_warmup(self):
+        """Construct the service and run its warm-up on the calling thread, at most once"""
+        instance = self.get()
+        with self._lock:
+            if self._warmed or not self._warmup:
+                return
+            start_time = time.time()
+            self._warmup(instance)
+            self._warmed = True
+            logger.info(f"Service {self._name} warmed up in {time.time() - start_time:.2f}s")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the service is ready, returns False on timeout"""
+        return self._ready_event.wait(timeout)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "name": self._name,
+            "state": self._state,
+            "error": self._error,
+            "load_time": self._load_time
+        }
+
+
+class ServiceRegistry:
+    """Registry of lazily constructed services"""
+
+    def __init__(self):
+        self.services: Dict[str, ServiceHandle] = {}
+
+    def register(self, name: str, factory: Callable[[], Any], warmup: Optional[Callable[[Any], None]] = None) -> ServiceHandle:
+        """
+        Register a service without constructing it.
+
+        Args:
+            name: Name of the service
+            factory: Callable that constructs the service instance
+            warmup: Optional callable run on the instance during background warm-up
+
+        Returns:
+            ServiceHandle: Handle that loads the service on first use
+        """
+        handle = ServiceHandle(name, factory, warmup)
+        self.services[name] = handle
+        return handle
+
+    def __getitem__(self, name: str) -> ServiceHandle:
+        return self.services[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.services
+
+    def warm(self, names: Iterable[str]):
+        """Start background warm-up for the given services"""
+        for name in names:
+            if name not in self.services:
+                logger.warning(f"Unknown service in warm-up list: {name}")
+                continue
+            self.services[name].warm()
+
+    async def wait_ready(self, name: str, timeout: float) -> bool:
+        """
+        Wait for a service without blocking the event loop.
+
+        Starts a background warm-up if the service is cold.
+
+        Args:
+            name: Name of the service
+            timeout: Maximum time to wait in seconds
+
+        Returns:
+            bool: True if the service is ready, False if it is still warming or failed
+        """
+        handle = self.services[name]
+        if handle.is_ready():
+            return True
+
+        warm_thread = handle.warm()
+        deadline = time.time() + timeout
+        while time.time() < deadline and warm_thread.is_alive() and not handle.is_ready():
+            await asyncio.sleep(0.1)
+        return handle.is_ready()
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {name: handle.status() for name, handle in self.services.items()}
+
+# Create a global service registry instance
+service_registry = ServiceRegistry()
@@ -0,0 +1,285 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional
+from .LAV_logger import logger
+
+# Seconds without further changes before the settings file is written
+DEFAULT_SAVE_DELAY = 1.0
+# Number of finished background tasks kept for the status API
+MAX_TASK_HISTORY = 20
+
+# Background task states
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+ERROR = "error"
+
+_MISSING = object()
+
+
+@dataclass
+class Applier:
+    """Applies a group of settings keys to the running services"""
+    name: str
+    keys: frozenset
+    fn: Callable
+    background: bool = False
+
+
+@dataclass
+class SettingsTask:
+    """A background run of an applier, e.g. switching the LLM model"""
+    id: str
+    applier: str
+    changes: Dict[str, Any]
+    status: str = PENDING
+    message: str = ""
+    progress: Optional[float] = None
+    error: Optional[str] = None
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    def report(self, message: str, progress: Optional[float] = None):
+        """Report progress, progress is a fraction between 0 and 1 when known"""
+        self.message = message
+        if progress is not None:
+            self.progress = progress
+        logger.info(f"Settings task {self.applier}: {message}")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "applier": self.applier,
+            "keys": sorted(self.changes.keys()),
+            "status": self.status,
+            "message": self.message,
+            "progress": self.progress,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished
+        }
+
+
+class SettingsEngine:
+    """
+    Settings store that applies only what changed.
+
+    Appliers are registered for the keys they handle. An update computes the
+    delta against the current settings and runs only the appliers whose keys
+    changed. Light appliers run on the calling thread, heavy ones (such as a
+    model switch) are queued to a background worker and report progress as a
+    task. Changes queued for an applier that has not started yet are merged, so
+    only the latest value is applied. Disk writes are debounced.
+    """
+
+    def __init__(self, settings_file: str, save_delay: float = DEFAULT_SAVE_DELAY):
+        """
+        Initialize the engine and load the settings file.
+
+        Args:
+            settings_file: Path of the JSON settings file
+            save_delay: Seconds without further changes before the file is written
+        """
+        self.settings_file = settings_file
+        self.save_delay = save_delay
+        self.appliers: List[Applier] = []
+        self._lock = threading.RLock()
+        self._save_timer: Optional[threading.Timer] = None
+        self._queue: Deque[SettingsTask] = deque()
+        self._pending: Dict[str, SettingsTask] = {}
+        self._tasks: "OrderedDict[str, SettingsTask]" = OrderedDict()
+        self._worker: Optional[threading.Thread] = None
+        self.settings: Dict[str, Any] = self.load_settings()
+
+    def load_settings(self) -> Dict[str, Any]:
+        if not os.path.exists(self.settings_file):
+            return {}
+        with open(self.settings_file, "r") as file:
+            return json.load(file)
+
+    def register(self, name: str, keys: Iterable[str], fn: Callable, background: bool = False):
+        """
+        Register an applier. Appliers run in registration order.
+
+        Args:
+            name: Name of the applier, shown in task status
+            keys: Settings keys the applier handles
+            fn: Called with the changed keys and values, background appliers also
+                receive the SettingsTask to report progress on
+            background: Run on the background worker instead of the calling thread
+        """
+        self.appliers.append(Applier(name, frozenset(keys), fn, background))
+
+    def diff(self, updates: Dict[str, Any]) -> Dict[str, Any]:
+        """Get the updates whose value differs from the current settings"""
+        with self._lock:
+            return {key: value for key, value in updates.items()
+                    if self.settings.get(key, _MISSING) != value}
+
+    def update(self, updates: Dict[str, Any], apply: bool = True) -> Dict[str, Any]:
+        """
+        Update settings and apply the ones that changed.
+
+        Args:
+            updates: Settings keys and their new values
+            apply: Run the affected appliers, False when the change was already applied
+
+        Returns:
+            dict: The changed keys, the appliers run inline and the IDs of queued background tasks
+        """
+        with self._lock:
+            changes = self.diff(updates)
+            if not changes:
+                return {"changed": [], "applied": [], "tasks": []}
+            self.settings.update(changes)
+            self.schedule_save()
+        result = {"changed": sorted(changes.keys()), "applied": [], "tasks": []}
+        if apply:
+            self._dispatch(changes, result)
+        return result
+
+    def remove(self, key: str):
+        """Remove a setting without running any applier"""
+        with self._lock:
+            if self.settings.pop(key, _MISSING) is not _MISSING:
+                self.schedule_save()
+
+    def apply_all(self) -> Dict[str, Any]:
+        """Run every applier with all current settings, used once on startup"""
+        with self._lock:
+            changes = dict(self.settings)
+        result = {"changed": sorted(changes.keys()), "applied": [], "tasks": []}
+        self._dispatch(changes, result)
+        return result
+
+    def _dispatch(self, changes: Dict[str, Any], result: Dict[str, Any]):
+        for applier in self.appliers:
+            applier_changes = {key: value for key, value in changes.items() if key in applier.keys}
+            if not applier_changes:
+                continue
+            if applier.background:
+                result["tasks"].append(self._enqueue(applier, applier_changes).id)
+                continue
+            try:
+                applier.fn(applier_changes)
+                result["applied"].append(applier.name)
+            except Exception as e:
+                logger.error(f"Error applying settings {sorted(applier_changes)}: {e}", exc_info=True)
+
+    def _enqueue(self, applier: Applier, changes: Dict[str, Any]) -> SettingsTask:
+        with self._lock:
+            pending = self._pending.get(applier.name)
+            if pending is not None:
+                # Not started yet, only the latest values need applying
+                pending.changes.update(changes)
+                return pending
+
+            task = SettingsTask(id=str(uuid.uuid4()), applier=applier.name, changes=dict(changes),
+                                message="Queued")
+            self._pending[applier.name] = task
+            self._queue.append(task)
+            self._tasks[task.id] = task
+            while len(self._tasks) > MAX_TASK_HISTORY:
+                oldest_id, oldest = next(iter(self._tasks.items()))
+                if oldest.status in (PENDING, RUNNING):
+                    break
+                self._tasks.pop(oldest_id)
+
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run_worker, name="settings-worker", daemon=True)
+                self._worker.start()
+            return task
+
+    def _run_worker(self):
+        appliers = {applier.name: applier for applier in self.appliers}
+        while True:
+            with self._lock:
+                if not self._queue:
+                    self._worker = None
+                    return
+                task = self._queue.popleft()
+                self._pending.pop(task.applier, None)
+                task.status = RUNNING
+                task.started = time.time()
+
+            try:
+                appliers[task.applier].fn(task.changes, task)
+                task.status = COMPLETED
+                task.progress = 1.0
+                if task.message == "Queued":
+                    task.message = "Applied"
+            except Exception as e:
+                task.status = ERROR
+                task.error = str(e)
+                logger.error(f"Settings task {task.applier} failed: {e}", exc_info=True)
+            finally:
+                task.finished = time.time()
+
+    def tasks(self) -> List[Dict[str, Any]]:
+        """Status of queued, running and recently finished background tasks"""
+        with self._lock:
+            return [task.to_dict() for task in self._tasks.values()]
+
+    def task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            task = self._tasks.get(task_id)
+            return task.to_dict() if task else None
+
+    def schedule_save(self):
+        """Write the settings file once no further change arrived for save_delay seconds"""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+            self._save_timer = threading.Timer(self.save_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Write pending changes to disk now"""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            settings = dict(self.settings)
+
+        # Write to a temporary file first so a crash never leaves a truncated settings file
+        temp_file = f"{self.settings_file}.tmp"
+        with open(temp_file, "w") as file:
+            json.dump(settings, file, indent=4)
+        os.replace(temp_file, self.settings_file)
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    settings_path = os.path.join(tempfile.mkdtemp(), "settings.json")
+    engine = SettingsEngine(settings_path, save_delay=0.2)
+
+    def apply_sampling(changes):
+        logger.info(f"Sampling applied inline: {changes}")
+
+    def apply_model(changes, task):
+        task.report(f"Loading {changes['llm.model_filename']}", 0.5)
+        time.sleep(0.5)
+
+    engine.register("llm.sampling", ["llm.temperature", "llm.top_p"], apply_sampling)
+    engine.register("llm.model", ["llm.model_filename"], apply_model, background=True)
+
+    logger.info(f"Slider change: {engine.update({'llm.temperature': 0.7})}")
+    logger.info(f"Same value again: {engine.update({'llm.temperature': 0.7})}")
+    first = engine.update({"llm.model_filename": "a.gguf"})
+    second = engine.update({"llm.model_filename": "b.gguf"})
+    third = engine.update({"llm.model_filename": "c.gguf"})
+    logger.info(f"Model switches: {first['tasks']} {second['tasks']} {third['tasks']}")
+    time.sleep(1.5)
+    for status in engine.tasks():
+        logger.info(f"{status['applier']} {status['status']}: {status['message']}")
+    with open(settings_path) as f:
+        logger.info(f"Saved: {json.load(f)}")
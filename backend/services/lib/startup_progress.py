@@ -1,22 +1,95 @@
+import json
+import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
 from .LAV_logger import logger
 
+try:
+    import psutil
+except ImportError:  # RSS is reported as None without psutil
+    psutil = None
+
+RSS_SAMPLE_INTERVAL = 0.05  # seconds
+
+
+@dataclass
+class StartupStep:
+    """A single step of the startup timeline"""
+    name: str
+    description: str
+    fn: Optional[Callable[[], Any]] = None
+    depends_on: List[str] = field(default_factory=list)
+    status: str = "pending"  # pending, running, completed, failed, skipped
+    start: Optional[float] = None
+    end: Optional[float] = None
+    rss_start: Optional[int] = None
+    rss_end: Optional[int] = None
+    peak_rss: Optional[int] = None
+    error: Optional[str] = None
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        def rel(t):
+            return round(t - origin, 3) if t is not None else None
+
+        def mb(b):
+            return round(b / (1024 * 1024), 1) if b is not None else None
+
+        return {
+            "name": self.name,
+            "description": self.description,
+            "depends_on": self.depends_on,
+            "status": self.status,
+            "start": rel(self.start),
+            "end": rel(self.end),
+            "duration": round(self.end - self.start, 3) if self.start is not None and self.end is not None else None,
+            "rss_start_mb": mb(self.rss_start),
+            "rss_end_mb": mb(self.rss_end),
+            "peak_rss_mb": mb(self.peak_rss),
+            "error": self.error
+        }
+
+
 class StartupProgress:
+    """
+    Startup progress reporting and timeline.
+
+    Serial steps are reported with show_step/complete_step. Independent steps are
+    added with add_step and run concurrently as a dependency graph. Every step is
+    recorded with its start/end time and the peak RSS observed while it ran, and
+    the timeline can be written to a JSON file for tracking startup regressions.
+    """
+
     def __init__(self):
         self.current_step = 0
-        self.total_steps = 5  # 1 import step + 5 main steps
+        self.total_steps = 3  # Serial steps: imports, service registration, settings
         self.current_message = ""
         self.step_start_time = None
-        
+        self.origin = time.time()
+        self.steps: Dict[str, StartupStep] = {}
+        self.finished_at: Optional[float] = None
+        self._current_serial_step: Optional[StartupStep] = None
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+        self._sampler_stop = threading.Event()
+
+    # *******************************
+    # Serial steps
+    # *******************************
+
     def show_step(self, text):
         self.current_step += 1
         self.current_message = text
         progress = f"[{self.current_step}/{self.total_steps}]"
-        
+
         # Show step start immediately without spinner to avoid interfering with other logs
         logger.info(f"{progress} {text}...")
         self.step_start_time = time.time()
-        
+        self._current_serial_step = self._begin(StartupStep(name=text, description=text))
+
     def complete_step(self, success_message=None):
         # Show completion via logger
         progress = f"[{self.current_step}/{self.total_steps}]"
@@ -24,11 +97,156 @@ class StartupProgress:
             logger.info(f"{progress} {success_message}")
         else:
             logger.info(f"{progress} {self.current_message} ✓")
-            
-    def show_immediate(self, text):
-        """Show a step immediately and increment counter - for import step"""
-        self.current_step += 1
-        logger.info(f"[{self.current_step}/{self.total_steps}] {text}...")
+        if self._current_serial_step:
+            self._finish(self._current_serial_step, "completed")
+            self._current_serial_step = None
+
+    # *******************************
+    # Dependency graph
+    # *******************************
+
+    def add_step(self, name: str, fn: Callable[[], Any], depends_on: Optional[List[str]] = None,
+                 description: Optional[str] = None):
+        """
+        Add a step to the startup graph.
+
+        Args:
+            name: Unique name of the step
+            fn: Callable that performs the step, raising marks the step as failed
+            depends_on: Names of steps that must complete first
+            description: Human readable description for logs
+        """
+        self.steps[name] = StartupStep(name=name, description=description or name, fn=fn,
+                                       depends_on=list(depends_on or []))
+
+    def run_graph(self, max_workers: int = 8, timeline_path: Optional[str] = None):
+        """
+        Run all pending graph steps, starting each one as soon as its dependencies complete.
+
+        Steps whose dependencies failed, are unknown or can never complete (cycles) are skipped.
+
+        Args:
+            max_workers: Maximum number of steps running at once
+            timeline_path: Optional path to write the timeline JSON to when finished
+        """
+        pending = {name: step for name, step in self.steps.items() if step.status == "pending" and step.fn}
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="startup") as executor:
+            while pending or running:
+                for name, step in list(pending.items()):
+                    dep_status = [self.steps[d].status if d in self.steps else "failed" for d in step.depends_on]
+                    if any(s in ("failed", "skipped") for s in dep_status):
+                        step.status = "skipped"
+                        step.error = "Dependency did not complete"
+                        logger.warning(f"[startup] {step.description} skipped, dependency did not complete")
+                        del pending[name]
+                    elif all(s == "completed" for s in dep_status):
+                        running[executor.submit(self._run_step, step)] = name
+                        del pending[name]
+
+                if not running:
+                    # Nothing running and nothing became runnable: a dependency cycle, or a dependency
+                    # that never completes (added without fn, or run through the serial API)
+                    for step in pending.values():
+                        step.status = "skipped"
+                        step.error = "Dependency can never complete"
+                        logger.warning(f"[startup] {step.description} skipped, waiting on {step.depends_on} "
+                                       f"which can never complete")
+                    pending.clear()
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del running[future]
+
+        self.finished_at = time.time()
+        logger.info(f"[startup] All startup steps finished in {self.finished_at - self.origin:.2f}s")
+        self._sampler_stop.set()
+        if timeline_path:
+            self.write_timeline(timeline_path)
+
+    def run_graph_in_background(self, max_workers: int = 8, timeline_path: Optional[str] = None) -> threading.Thread:
+        """Run the startup graph on a background thread"""
+        thread = threading.Thread(target=self.run_graph, args=(max_workers, timeline_path),
+                                  name="startup-graph", daemon=True)
+        thread.start()
+        return thread
+
+    def _run_step(self, step: StartupStep):
+        self._begin(step)
+        logger.info(f"[startup] {step.description}...")
+        try:
+            step.fn()
+            self._finish(step, "completed")
+            logger.info(f"[startup] {step.description} completed in {step.end - step.start:.2f}s")
+        except Exception as e:
+            step.error = str(e)
+            self._finish(step, "failed")
+            logger.error(f"[startup] {step.description} failed in {step.end - step.start:.2f}s: {e}")
+
+    # *******************************
+    # Timeline
+    # *******************************
+
+    def timeline(self) -> Dict[str, Any]:
+        """Get the startup timeline as a JSON serializable dict"""
+        steps = sorted(self.steps.values(), key=lambda s: (s.start is None, s.start or 0))
+        peaks = [s.peak_rss for s in steps if s.peak_rss is not None]
+        return {
+            "started_at": datetime.fromtimestamp(self.origin).isoformat(),
+            "finished": self.finished_at is not None,
+            "total_time": round(self.finished_at - self.origin, 3) if self.finished_at else None,
+            "peak_rss_mb": round(max(peaks) / (1024 * 1024), 1) if peaks else None,
+            "steps": [s.to_dict(self.origin) for s in steps]
+        }
+
+    def write_timeline(self, path: str):
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(self.timeline(), f, indent=2)
+            logger.info(f"[startup] Timeline written to {path}")
+        except OSError as e:
+            logger.error(f"Failed to write startup timeline: {e}")
+
+    def _begin(self, step: StartupStep) -> StartupStep:
+        self._ensure_sampler()
+        with self._lock:
+            self.steps[step.name] = step
+            step.status = "running"
+            step.start = time.time()
+            step.rss_start = self._rss()
+            step.peak_rss = step.rss_start
+        return step
+
+    def _finish(self, step: StartupStep, status: str):
+        with self._lock:
+            step.end = time.time()
+            step.rss_end = self._rss()
+            if step.rss_end is not None:
+                step.peak_rss = max(step.peak_rss or 0, step.rss_end)
+            step.status = status
+
+    def _rss(self) -> Optional[int]:
+        if psutil is None:
+            return None
+        return psutil.Process(os.getpid()).memory_info().rss
+
+    def _ensure_sampler(self):
+        """Sample RSS in the background so each running step records its peak"""
+        if psutil is None or (self._sampler and self._sampler.is_alive()):
+            return
+
+        def sample():
+            while not self._sampler_stop.wait(RSS_SAMPLE_INTERVAL):
+                rss = self._rss()
+                with self._lock:
+                    for step in self.steps.values():
+                        if step.status == "running":
+                            step.peak_rss = max(step.peak_rss or 0, rss)
+
+        self._sampler_stop.clear()
+        self._sampler = threading.Thread(target=sample, name="startup-rss", daemon=True)
+        self._sampler.start()
 
 # Create singleton instance
-startup_progress = StartupProgress() 
\ No newline at end of file
+startup_progress = StartupProgress()
@@ -0,0 +1,218 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+from fastapi import Request
+
+# Number of most recent turns whose spans are kept in memory
+MAX_TRACED_TURNS = 100
+# Header used by clients to attach HTTP requests (completion, TTS, RVC) to a turn
+TURN_ID_HEADER = "X-Turn-ID"
+
+_current_turn: ContextVar[Optional[str]] = ContextVar("current_turn", default=None)
+
+
+@dataclass
+class Span:
+    """A timed section of a turn, times are unix timestamps in seconds"""
+    name: str
+    turn_id: str
+    start: float
+    end: float
+    thread_id: int
+    thread_name: str
+    args: Dict[str, Any] = field(default_factory=dict)
+
+
+class Tracer:
+    """
+    Per-turn tracing.
+
+    A turn ID identifies one user utterance from VAD through ASR, memory, LLM,
+    TTS and the RVC hop. The current turn is held in a context variable, so it
+    follows asyncio tasks and calls made through the inference executor. Spans
+    outside of a turn are not recorded, which keeps tracing free when unused.
+    """
+
+    def __init__(self, max_turns: int = MAX_TRACED_TURNS):
+        self.max_turns = max_turns
+        self._turns: "OrderedDict[str, List[Span]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def new_turn_id(self) -> str:
+        return str(uuid.uuid4())
+
+    def current_turn_id(self) -> Optional[str]:
+        return _current_turn.get()
+
+    @contextmanager
+    def turn(self, turn_id: Optional[str] = None):
+        """
+        Make a turn current for the enclosed block.
+
+        Args:
+            turn_id: ID of the turn, a new one is generated when omitted
+
+        Yields:
+            str: The turn ID
+        """
+        turn_id = turn_id or self.new_turn_id()
+        token = _current_turn.set(turn_id)
+        try:
+            yield turn_id
+        finally:
+            _current_turn.reset(token)
+
+    @contextmanager
+    def span(self, name: str, turn_id: Optional[str] = None, **args):
+        """
+        Record the enclosed block as a span of the current (or given) turn.
+
+        Args:
+            name: Name of the span, e.g. "memory.query"
+            turn_id: Turn to attach to, defaults to the current turn
+            **args: Extra values shown with the span
+        """
+        turn_id = turn_id or _current_turn.get()
+        if turn_id is None:
+            yield
+            return
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.time(), turn_id, **args)
+
+    def add_span(self, name: str, start: float, end: float, turn_id: Optional[str] = None, **args):
+        """Record a span from already measured unix timestamps"""
+        turn_id = turn_id or _current_turn.get()
+        if turn_id is None:
+            return
+        thread = threading.current_thread()
+        span = Span(name, turn_id, start, end, thread.ident, thread.name, args)
+        with self._lock:
+            spans = self._turns.get(turn_id)
+            if spans is None:
+                spans = self._turns[turn_id] = []
+                while len(self._turns) > self.max_turns:
+                    self._turns.popitem(last=False)
+            spans.append(span)
+
+    def turns(self) -> List[Dict[str, Any]]:
+        """Summary of the recorded turns, most recent last"""
+        with self._lock:
+            turns = [(turn_id, list(spans)) for turn_id, spans in self._turns.items()]
+        summary = []
+        for turn_id, spans in turns:
+            start = min(s.start for s in spans)
+            end = max(s.end for s in spans)
+            summary.append({
+                "turn_id": turn_id,
+                "start": start,
+                "duration": round(end - start, 4),
+                "spans": len(spans)
+            })
+        return summary
+
+    def has_turn(self, turn_id: str) -> bool:
+        with self._lock:
+            return turn_id in self._turns
+
+    def _spans(self, turn_ids: Optional[List[str]]) -> List[Span]:
+        with self._lock:
+            if turn_ids is None:
+                turn_ids = list(self._turns.keys())
+            return [span for turn_id in turn_ids for span in self._turns.get(turn_id, [])]
+
+    def chrome_trace(self, turn_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Export spans in the Chrome trace event format (chrome://tracing, Perfetto).
+
+        Args:
+            turn_ids: Turns to export, all recorded turns when omitted
+        """
+        spans = self._spans(turn_ids)
+        events = []
+        threads = {}
+        for span in spans:
+            threads[span.thread_id] = span.thread_name
+            events.append({
+                "name": span.name,
+                "cat": span.name.split(".")[0],
+                "ph": "X",
+                "ts": round(span.start * 1_000_000),
+                "dur": max(round((span.end - span.start) * 1_000_000), 0),
+                "pid": 1,
+                "tid": span.thread_id,
+                "args": {"turn_id": span.turn_id, **span.args}
+            })
+        for thread_id, thread_name in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": thread_id,
+                           "args": {"name": thread_name}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def otlp_trace(self, turn_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Export spans as OpenTelemetry (OTLP/JSON) resource spans, one trace per turn.
+
+        Args:
+            turn_ids: Turns to export, all recorded turns when omitted
+        """
+        def attribute(key, value):
+            if isinstance(value, bool):
+                return {"key": key, "value": {"boolValue": value}}
+            if isinstance(value, int):
+                return {"key": key, "value": {"intValue": str(value)}}
+            if isinstance(value, float):
+                return {"key": key, "value": {"doubleValue": value}}
+            return {"key": key, "value": {"stringValue": str(value)}}
+
+        otlp_spans = []
+        for span in self._spans(turn_ids):
+            otlp_spans.append({
+                "traceId": uuid.uuid5(uuid.NAMESPACE_OID, span.turn_id).hex,
+                "spanId": uuid.uuid4().hex[:16],
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(int(span.start * 1_000_000_000)),
+                "endTimeUnixNano": str(int(span.end * 1_000_000_000)),
+                "attributes": [attribute("turn_id", span.turn_id), attribute("thread.name", span.thread_name)]
+                              + [attribute(k, v) for k, v in span.args.items()]
+            })
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [attribute("service.name", "lav-backend")]},
+                "scopeSpans": [{"scope": {"name": "lav.tracing"}, "spans": otlp_spans}]
+            }]
+        }
+
+    def clear(self):
+        with self._lock:
+            self._turns.clear()
+
+
+def create_turn_middleware(header: str = TURN_ID_HEADER) -> Callable:
+    """
+    Create a FastAPI middleware function that makes the turn named in a request header current.
+
+    Args:
+        header (str): Name of the header carrying the turn ID
+
+    Returns:
+        Callable: A middleware function that can be used with FastAPI
+    """
+    async def turn_middleware(request: Request, call_next):
+        turn_id = request.headers.get(header)
+        if not turn_id:
+            return await call_next(request)
+        with tracer.turn(turn_id):
+            return await call_next(request)
+
+    return turn_middleware
+
+# Create a global tracer instance
+tracer = Tracer()
@@ -0,0 +1,277 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+from fastapi import Request
+from .LAV_logger import logger
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+DEFAULT_MAX_UPLOAD_SIZE = 1024 * 1024 * 1024
+# Form fields are kept in memory, files never are
+MAX_FIELD_SIZE = 1024 * 1024
+# Parsed file data is written once this much is pending, bounding memory per upload
+WRITE_BUFFER_SIZE = 1024 * 1024
+# Number of finished uploads kept for the progress API
+MAX_UPLOAD_HISTORY = 50
+UPLOAD_ID_HEADER = "X-Upload-ID"
+TEMP_SUFFIX = ".part"
+
+# Upload states
+RECEIVING = "receiving"
+PROCESSING = "processing"
+COMPLETED = "completed"
+ERROR = "error"
+
+
+class UploadError(Exception):
+    """Raised for uploads that are rejected, status_code is the HTTP status to answer with"""
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class UploadedFile:
+    """A file part written to a temporary file"""
+    field_name: str
+    filename: str
+    path: str
+    size: int = 0
+    sha256: str = ""
+    _handle: Optional[BinaryIO] = None
+    _hash: Any = None
+
+
+@dataclass
+class UploadProgress:
+    """Progress of one upload, total is None when the client sent no Content-Length"""
+    id: str
+    total: Optional[int]
+    received: int = 0
+    status: str = RECEIVING
+    error: Optional[str] = None
+    started: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        elapsed = (self.finished or time.time()) - self.started
+        return {
+            "id": self.id,
+            "status": self.status,
+            "received": self.received,
+            "total": self.total,
+            "progress": round(self.received / self.total * 100, 1) if self.total else None,
+            "speed": self.received / elapsed if elapsed > 0 else 0,
+            "error": self.error
+        }
+
+
+@dataclass
+class StreamedUpload:
+    """Result of receiving a multipart request, files are removed by cleanup() unless moved away"""
+    progress: UploadProgress
+    fields: Dict[str, str] = field(default_factory=dict)
+    files: List[UploadedFile] = field(default_factory=list)
+
+    def file(self, field_name: str) -> Optional[UploadedFile]:
+        return next((f for f in self.files if f.field_name == field_name), None)
+
+    def cleanup(self):
+        for uploaded in self.files:
+            try:
+                os.remove(uploaded.path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove temporary upload {uploaded.path}: {e}")
+
+
+class UploadManager:
+    """
+    Streams multipart uploads to disk in constant memory.
+
+    The request body is parsed incrementally as it arrives and file parts are
+    written to temporary files next to their destination, so callers can move
+    them into place with an atomic os.replace. Disk writes run on a worker
+    thread, the size cap is enforced while receiving, and progress is kept per
+    upload ID for the progress API.
+    """
+
+    def __init__(self):
+        self._uploads: "OrderedDict[str, UploadProgress]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, upload_id: str) -> Optional[UploadProgress]:
+        with self._lock:
+            return self._uploads.get(upload_id)
+
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {upload_id: progress.to_dict() for upload_id, progress in self._uploads.items()}
+
+    def _register(self, upload_id: str, total: Optional[int]) -> UploadProgress:
+        progress = UploadProgress(id=upload_id, total=total)
+        with self._lock:
+            self._uploads[upload_id] = progress
+            while len(self._uploads) > MAX_UPLOAD_HISTORY:
+                self._uploads.popitem(last=False)
+        return progress
+
+    def finish(self, upload: StreamedUpload, error: Optional[str] = None):
+        """Mark an upload as completed (or failed) once the caller has processed it"""
+        upload.progress.status = ERROR if error else COMPLETED
+        upload.progress.error = error
+        upload.progress.finished = time.time()
+
+    async def receive(self, request: Request, temp_dir: str, max_size: int = DEFAULT_MAX_UPLOAD_SIZE,
+                      upload_id: Optional[str] = None) -> StreamedUpload:
+        """
+        Receive a multipart/form-data request body.
+
+        Args:
+            request: The incoming request, its body must not have been read yet
+            temp_dir: Directory for the temporary files, on the same filesystem as their destination
+            max_size: Maximum request body size in bytes
+            upload_id: ID to report progress under, defaults to the X-Upload-ID header or a new ID
+
+        Returns:
+            StreamedUpload: Form fields and temporary files, with status "processing"
+
+        Raises:
+            UploadError: If the request is not multipart, too large or malformed
+        """
+        upload_id = upload_id or request.headers.get(UPLOAD_ID_HEADER) or str(uuid.uuid4())
+        content_length = request.headers.get("content-length")
+        total = int(content_length) if content_length and content_length.isdigit() else None
+        upload = StreamedUpload(progress=self._register(upload_id, total))
+
+        try:
+            content_type, params = parse_options_header(request.headers.get("content-type", ""))
+            if content_type != b"multipart/form-data" or b"boundary" not in params:
+                raise UploadError("Expected a multipart/form-data request", 400)
+            if total is not None and total > max_size:
+                raise UploadError(f"Upload exceeds the maximum size of {max_size} bytes", 413)
+
+            os.makedirs(temp_dir, exist_ok=True)
+            await self._parse(request, params[b"boundary"], temp_dir, max_size, upload)
+            upload.progress.status = PROCESSING
+            return upload
+        except BaseException as e:
+            await asyncio.to_thread(self._close_files, upload)
+            upload.cleanup()
+            self.finish(upload, str(e) or "Upload cancelled")
+            if isinstance(e, UploadError):
+                raise
+            if isinstance(e, Exception):
+                raise UploadError(f"Failed to receive upload: {e}", 400) from e
+            raise
+
+    async def _parse(self, request: Request, boundary: bytes, temp_dir: str, max_size: int, upload: StreamedUpload):
+        # Parser callbacks only record operations, they are applied off the event loop after each body chunk
+        operations: List[Tuple[str, Any, Any]] = []
+        pending_bytes = 0
+        part: Dict[str, Any] = {}
+        header_field = bytearray()
+        header_value = bytearray()
+
+        def on_part_begin():
+            part.clear()
+            part["headers"] = {}
+
+        def on_header_field(data: bytes, start: int, end: int):
+            header_field.extend(data[start:end])
+
+        def on_header_value(data: bytes, start: int, end: int):
+            header_value.extend(data[start:end])
+
+        def on_header_end():
+            part["headers"][bytes(header_field).lower()] = bytes(header_value)
+            header_field.clear()
+            header_value.clear()
+
+        def on_headers_finished():
+            _, options = parse_options_header(part["headers"].get(b"content-disposition", b""))
+            name = options.get(b"name", b"").decode("utf-8", errors="replace")
+            if b"filename" in options:
+                path = os.path.join(temp_dir, f".upload-{uuid.uuid4().hex}{TEMP_SUFFIX}")
+                uploaded = UploadedFile(name, options[b"filename"].decode("utf-8", errors="replace"), path)
+                upload.files.append(uploaded)
+                part["file"] = uploaded
+                operations.append(("open", uploaded, None))
+            else:
+                part["name"] = name
+                part["value"] = bytearray()
+
+        def on_part_data(data: bytes, start: int, end: int):
+            nonlocal pending_bytes
+            if "file" in part:
+                operations.append(("write", part["file"], data[start:end]))
+                pending_bytes += end - start
+            else:
+                part["value"].extend(data[start:end])
+                if len(part["value"]) > MAX_FIELD_SIZE:
+                    raise UploadError(f"Form field {part['name']} is too large", 413)
+
+        def on_part_end():
+            if "file" in part:
+                operations.append(("close", part["file"], None))
+            elif "name" in part:
+                upload.fields[part["name"]] = part["value"].decode("utf-8", errors="replace")
+
+        parser = MultipartParser(boundary, {
+            "on_part_begin": on_part_begin,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+        })
+
+        async for chunk in request.stream():
+            upload.progress.received += len(chunk)
+            if upload.progress.received > max_size:
+                raise UploadError(f"Upload exceeds the maximum size of {max_size} bytes", 413)
+            parser.write(chunk)
+            if pending_bytes >= WRITE_BUFFER_SIZE or any(op[0] != "write" for op in operations):
+                batch, operations[:] = list(operations), []
+                pending_bytes = 0
+                await asyncio.to_thread(self._apply, batch)
+        parser.finalize()
+        await asyncio.to_thread(self._apply, list(operations))
+
+        unclosed = [f.filename for f in upload.files if f._handle is not None]
+        if unclosed:
+            raise UploadError(f"Upload ended in the middle of {unclosed[0]}", 400)
+
+    def _apply(self, operations: List[Tuple[str, UploadedFile, Optional[bytes]]]):
+        for operation, uploaded, data in operations:
+            if operation == "open":
+                uploaded._handle = open(uploaded.path, "wb")
+                uploaded._hash = hashlib.sha256()
+            elif operation == "write":
+                uploaded._handle.write(data)
+                uploaded._hash.update(data)
+                uploaded.size += len(data)
+            else:
+                uploaded._handle.close()
+                uploaded._handle = None
+                uploaded.sha256 = uploaded._hash.hexdigest()
+
+    def _close_files(self, upload: StreamedUpload):
+        for uploaded in upload.files:
+            if uploaded._handle is not None:
+                uploaded._handle.close()
+                uploaded._handle = None
+
+# Create a global upload manager instance
+upload_manager = UploadManager()
@@ -191,8 +191,8 @@ export class ChatManager {
             // Add base instructions
             const instructionsSection = `[INSTRUCTIONS]\n${this.systemPrompt}\n\n`;
             
-            // Combine all sections
-            systemPromptWithContext = visionSection + ocrSection + contextSection + instructionsSection;
+            // Combine all sections, the fixed instructions go first so the backend can reuse their cached prefill
+            systemPromptWithContext = instructionsSection + visionSection + ocrSection + contextSection;
 
             // Set the retrieved context and full system prompt
             this.setRetrievedContext(contextText);
@@ -365,7 +365,7 @@ export class ChatManager {
         const contextSection = contextText.trim() ? 
             `[RETRIEVED MEMORY]\n${contextText}\n\n` : '';
         const instructionsSection = `[INSTRUCTIONS]\n${this.systemPrompt}\n\n`;
-        const systemPromptWithContext = visionSection + ocrSection + contextSection + instructionsSection;
+        const systemPromptWithContext = instructionsSection + visionSection + ocrSection + contextSection;
 
         // Send completion request with history up to the user message
         const response = await fetch('/api/completion', {